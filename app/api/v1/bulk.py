@@ -0,0 +1,34 @@
+import csv
+import io
+import json
+from typing import List
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError, parse_obj_as
+from pydantic.error_wrappers import ErrorWrapper
+
+CSV_MEDIA_TYPE = 'text/csv'
+
+
+class BulkUpsertSchema(BaseModel):
+    created: int
+    updated: int
+
+
+def bulk_payload(schema):
+    """Dependency that reads a list of schema items from a JSON array or, with Content-Type text/csv,
+    from a CSV file with a header row."""
+
+    async def parse_bulk_payload(request: Request) -> List[schema]:
+        body = await request.body()
+        try:
+            if request.headers.get('Content-Type', '').startswith(CSV_MEDIA_TYPE):
+                items = list(csv.DictReader(io.StringIO(body.decode('utf-8-sig'))))
+            else:
+                items = json.loads(body)
+            return parse_obj_as(List[schema], items)
+        except (UnicodeDecodeError, json.JSONDecodeError, ValidationError) as error:
+            raise RequestValidationError([ErrorWrapper(error, ('body',))])
+
+    return parse_bulk_payload
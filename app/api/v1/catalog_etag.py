@@ -0,0 +1,69 @@
+import os
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.table_version import get_table_versions, get_table_versions_async
+
+CATALOG_CACHE_CONTROL = os.environ.get('CATALOG_CACHE_CONTROL', 'no-cache')
+
+
+def get_etag(name: str, versions: Iterable[int]):
+    # Derived from the table versions in the database only, so every process answers with the same ETag
+    return '"{}-{}"'.format(name, '.'.join(str(version) for version in versions))
+
+
+def get_catalog_etag(model, db: Session):
+    return get_etag(model.__tablename__, get_table_versions((model,), db))
+
+
+def get_row_etag(entity):
+    # The version of a versioned catalog row, sent back in If-Match so a write only applies to the row that was read
+    return '"{}"'.format(entity.version)
+
+
+def get_if_match_version(if_match: Optional[str]) -> Optional[int]:
+    # None without a version, the write then applies to the row as loaded by the request
+    if if_match is None or if_match.strip() == '*':
+        return None
+    try:
+        return int(if_match.strip().strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail='Invalid If-Match')
+
+
+def get_cache_headers(etag: str):
+    return {'ETag': etag, 'Cache-Control': CATALOG_CACHE_CONTROL}
+
+
+def is_not_modified(etag: str, request: Request):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is None:
+        return False
+    etags = [client_etag.strip().removeprefix('W/') for client_etag in if_none_match.split(',')]
+    return etag in etags or '*' in etags
+
+
+def not_modified_response(etag: str, request: Request, response: Response) -> Optional[Response]:
+    headers = get_cache_headers(etag)
+    if is_not_modified(etag, request):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+def catalog_not_modified(model, request: Request, response: Response, db: Session) -> Optional[Response]:
+    """Returns a 304 response if the client's list is current, otherwise sets the ETag on the response.
+
+    The version is read with the session the list is read with, a list from a replica gets the replica's ETag.
+    """
+    return not_modified_response(get_catalog_etag(model, db), request, response)
+
+
+async def catalog_not_modified_async(model, request: Request, response: Response,
+                                     db: AsyncSession) -> Optional[Response]:
+    etag = get_etag(model.__tablename__, await get_table_versions_async((model,), db))
+    return not_modified_response(etag, request, response)
@@ -0,0 +1,16 @@
+import uuid
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models import Beverage
+
+
+async def get_beverage_by_id(beverage_id: uuid.UUID, db: AsyncSession):
+    entity = await db.scalar(select(Beverage).where(Beverage.id == beverage_id))
+    return entity
+
+
+async def get_all_beverages(db: AsyncSession):
+    entities = (await db.scalars(select(Beverage))).all()
+    logging.info('Retrieved all beverages, count: {}'.format(len(entities)))
+    return entities
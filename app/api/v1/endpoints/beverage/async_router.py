@@ -0,0 +1,33 @@
+import uuid
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.api.v1.endpoints.beverage.async_crud as beverage_async_crud
+from app.api.v1.endpoints.beverage.schemas import BeverageListItemSchema, BeverageSchema
+from app.api.v1.catalog_etag import catalog_not_modified_async, get_row_etag
+from app.database.connection import get_async_db
+from app.database.models import Beverage
+
+router = APIRouter()
+
+
+@router.get('', response_model=List[BeverageListItemSchema], tags=['beverage'])
+async def get_all_beverages(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch all beverages')
+    not_modified = await catalog_not_modified_async(Beverage, request, response, db)
+    if not_modified:
+        return not_modified
+    return await beverage_async_crud.get_all_beverages(db)
+
+
+@router.get('/{beverage_id}', response_model=BeverageSchema, tags=['beverage'])
+async def get_beverage(beverage_id: uuid.UUID, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch beverage with ID {}'.format(beverage_id))
+    beverage = await beverage_async_crud.get_beverage_by_id(beverage_id, db)
+
+    if not beverage:
+        logging.error('Beverage with ID {} not found'.format(beverage_id))
+        raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(beverage)
+    return beverage
@@ -1,9 +1,13 @@
 import logging
 import uuid
+from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
 from app.api.v1.endpoints.beverage.schemas import BeverageCreateSchema
+from app.database.catalog_cache import catalog_cache
+from app.database.versioning import commit_if_unchanged
+from app.database.upsert import upsert_by_name
 from app.database.models import Beverage
 
 
@@ -11,12 +15,21 @@ def create_beverage(schema: BeverageCreateSchema, db: Session):
     entity = Beverage(**schema.dict())
     db.add(entity)
     db.commit()
+    catalog_cache.invalidate(Beverage)
     logging.info('Beverage created with name {}'.format(entity.name))
     return entity
 
 
+def upsert_beverages(schemas: List[BeverageCreateSchema], db: Session):
+    created, updated = upsert_by_name(Beverage, schemas, db)
+    db.commit()
+    catalog_cache.invalidate(Beverage)
+    logging.info('Beverages upserted, created: {}, updated: {}'.format(created, updated))
+    return created, updated
+
+
 def get_beverage_by_id(beverage_id: uuid.UUID, db: Session):
-    entity = db.query(Beverage).filter(Beverage.id == beverage_id).first()
+    entity = catalog_cache.get(Beverage, 'id', beverage_id, db)
     if entity:
         logging.info('Beverage retrieved with id {}'.format(beverage_id))
     else:
@@ -24,8 +37,14 @@ def get_beverage_by_id(beverage_id: uuid.UUID, db: Session):
     return entity
 
 
+def get_beverages_by_ids(beverage_ids: List[uuid.UUID], db: Session):
+    entities = db.query(Beverage).filter(Beverage.id.in_(beverage_ids)).all()
+    logging.info('Retrieved {} of {} beverages by id'.format(len(entities), len(beverage_ids)))
+    return entities
+
+
 def get_beverage_by_name(beverage_name: str, db: Session):
-    entity = db.query(Beverage).filter(Beverage.name == beverage_name).first()
+    entity = catalog_cache.get(Beverage, 'name', beverage_name, db)
     return entity
 
 
@@ -35,19 +54,22 @@ def get_all_beverages(db: Session):
     return db.query(Beverage).all()
 
 
-def update_beverage(beverage: Beverage, changed_beverage: BeverageCreateSchema, db: Session):
-    for key, value in changed_beverage.dict().items():
-        setattr(beverage, key, value)
+def update_beverage(beverage: Beverage, changed_beverage: BeverageCreateSchema, db: Session,
+                    version: Optional[int] = None):
+    def apply_changes():
+        for key, value in changed_beverage.dict().items():
+            setattr(beverage, key, value)
 
-    db.commit()
+    commit_if_unchanged(beverage, apply_changes, db, version)
+    catalog_cache.invalidate(Beverage)
     db.refresh(beverage)
     logging.info('Beverage updated with id {}'.format(beverage.id))
     return beverage
 
 
-def delete_beverage_by_id(beverage_id: uuid.UUID, db: Session):
+def delete_beverage_by_id(beverage_id: uuid.UUID, db: Session, version: Optional[int] = None):
     entity = get_beverage_by_id(beverage_id, db)
     if entity:
-        db.delete(entity)
-        db.commit()
+        commit_if_unchanged(entity, lambda: db.delete(entity), db, version)
+        catalog_cache.invalidate(Beverage)
         logging.info('Beverage deleted with id {}'.format(beverage_id))
@@ -1,14 +1,18 @@
 import logging
 import uuid
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 import app.api.v1.endpoints.beverage.crud as beverage_crud
 from app.api.v1.endpoints.beverage.schemas import BeverageSchema, BeverageCreateSchema, BeverageListItemSchema
-from app.database.connection import SessionLocal
+from app.api.v1.bulk import BulkUpsertSchema, bulk_payload
+from app.api.v1.catalog_etag import catalog_not_modified, get_if_match_version, get_row_etag
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.database.models import Beverage
 
 
 def get_db():
@@ -19,12 +23,23 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 router = APIRouter()
 
 
 @router.get('', response_model=List[BeverageListItemSchema], tags=['beverage'])
-def get_all_beverages(db: Session = Depends(get_db)):
+def get_all_beverages(request: Request, response: Response, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve all beverages')
+    not_modified = catalog_not_modified(Beverage, request, response, db)
+    if not_modified:
+        return not_modified
     beverages = beverage_crud.get_all_beverages(db)
     return beverages
 
@@ -44,21 +59,35 @@ def create_beverage(beverage: BeverageCreateSchema,
     return new_beverage
 
 
+@router.post('/bulk', response_model=BulkUpsertSchema, tags=['beverage'])
+def upsert_beverages(
+        beverages: List[BeverageCreateSchema] = Depends(bulk_payload(BeverageCreateSchema)),
+        db: Session = Depends(get_db),
+):
+    logging.info('Received request to upsert {} beverages'.format(len(beverages)))
+    created, updated = beverage_crud.upsert_beverages(beverages, db)
+    return BulkUpsertSchema(created=created, updated=updated)
+
+
 @router.put('/{beverage_id}', response_model=BeverageSchema, tags=['beverage'])
 def update_beverage(
         beverage_id: uuid.UUID,
         changed_beverage: BeverageCreateSchema,
         request: Request,
         response: Response,
+        if_match: Optional[str] = Header(None),
         db: Session = Depends(get_db),
 ):
     beverage_found = beverage_crud.get_beverage_by_id(beverage_id, db)
 
     if beverage_found:
         if beverage_found.name == changed_beverage.name:
-            beverage_crud.update_beverage(beverage_found, changed_beverage, db)
+            try:
+                beverage_crud.update_beverage(beverage_found, changed_beverage, db, get_if_match_version(if_match))
+            except StaleDataError:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
             logging.info('Beverage with id {} updated successfully'.format(beverage_id))
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers={'ETag': get_row_etag(beverage_found)})
         else:
             beverage_name_found = beverage_crud.get_beverage_by_name(changed_beverage.name, db)
             if beverage_name_found:
@@ -80,7 +109,8 @@ def update_beverage(
 @router.get('/{beverage_id}', response_model=BeverageSchema, tags=['beverage'])
 def get_beverage(
         beverage_id: uuid.UUID,
-        db: Session = Depends(get_db),
+        response: Response,
+        db: Session = Depends(get_read_db),
 ):
     beverage = beverage_crud.get_beverage_by_id(beverage_id, db)
 
@@ -88,12 +118,14 @@ def get_beverage(
         logging.warning('Beverage with id {} not found'.format(beverage_id))
         raise HTTPException(status_code=404, detail='Item not found')
 
+    response.headers['ETag'] = get_row_etag(beverage)
     return beverage
 
 
 @router.delete('/{beverage_id}', response_model=None, tags=['beverage'])
 def delete_beverage(
         beverage_id: uuid.UUID,
+        if_match: Optional[str] = Header(None),
         db: Session = Depends(get_db)):
     beverage = beverage_crud.get_beverage_by_id(beverage_id, db)
 
@@ -101,6 +133,9 @@ def delete_beverage(
         logging.warning('Attempted to delete beverage with id {} but beverage not found'.format(beverage_id))
         raise HTTPException(status_code=404, detail='Item not found')
 
-    beverage_crud.delete_beverage_by_id(beverage_id, db)
+    try:
+        beverage_crud.delete_beverage_by_id(beverage_id, db, get_if_match_version(if_match))
+    except StaleDataError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
     logging.info('Beverage with id {} deleted successfully'.format(beverage_id))
     return Response(status_code=status.HTTP_204_NO_CONTENT)
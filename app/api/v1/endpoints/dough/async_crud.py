@@ -0,0 +1,16 @@
+import uuid
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models import Dough
+
+
+async def get_dough_by_id(dough_id: uuid.UUID, db: AsyncSession):
+    entity = await db.scalar(select(Dough).where(Dough.id == dough_id))
+    return entity
+
+
+async def get_all_doughs(db: AsyncSession):
+    entities = (await db.scalars(select(Dough))).all()
+    logging.info('Retrieved all doughs, count: {}'.format(len(entities)))
+    return entities
@@ -0,0 +1,33 @@
+import uuid
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.api.v1.endpoints.dough.async_crud as dough_async_crud
+from app.api.v1.endpoints.dough.schemas import DoughListItemSchema, DoughSchema
+from app.api.v1.catalog_etag import catalog_not_modified_async, get_row_etag
+from app.database.connection import get_async_db
+from app.database.models import Dough
+
+router = APIRouter()
+
+
+@router.get('', response_model=List[DoughListItemSchema], tags=['dough'])
+async def get_all_doughs(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch all doughs')
+    not_modified = await catalog_not_modified_async(Dough, request, response, db)
+    if not_modified:
+        return not_modified
+    return await dough_async_crud.get_all_doughs(db)
+
+
+@router.get('/{dough_id}', response_model=DoughSchema, tags=['dough'])
+async def get_dough(dough_id: uuid.UUID, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch dough with ID {}'.format(dough_id))
+    dough = await dough_async_crud.get_dough_by_id(dough_id, db)
+
+    if not dough:
+        logging.error('Dough with ID {} not found'.format(dough_id))
+        raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(dough)
+    return dough
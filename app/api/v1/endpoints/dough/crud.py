@@ -1,7 +1,11 @@
 import uuid
+from typing import List, Optional
 import logging
 from sqlalchemy.orm import Session
 from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
+from app.database.catalog_cache import catalog_cache
+from app.database.versioning import commit_if_unchanged
+from app.database.upsert import upsert_by_name
 from app.database.models import Dough
 
 
@@ -9,17 +13,26 @@ def create_dough(schema: DoughCreateSchema, db: Session):
     entity = Dough(**schema.dict())
     db.add(entity)
     db.commit()
+    catalog_cache.invalidate(Dough)
     logging.info('Dough created with name {}'.format(entity.name))
     return entity
 
 
+def upsert_doughs(schemas: List[DoughCreateSchema], db: Session):
+    created, updated = upsert_by_name(Dough, schemas, db)
+    db.commit()
+    catalog_cache.invalidate(Dough)
+    logging.info('Doughs upserted, created: {}, updated: {}'.format(created, updated))
+    return created, updated
+
+
 def get_dough_by_id(dough_id: uuid.UUID, db: Session):
-    entity = db.query(Dough).filter(Dough.id == dough_id).first()
+    entity = catalog_cache.get(Dough, 'id', dough_id, db)
     return entity
 
 
 def get_dough_by_name(dough_name: str, db: Session):
-    entity = db.query(Dough).filter(Dough.name == dough_name).first()
+    entity = catalog_cache.get(Dough, 'name', dough_name, db)
     return entity
 
 
@@ -27,18 +40,20 @@ def get_all_doughs(db: Session):
     return db.query(Dough).all()
 
 
-def update_dough(dough: Dough, changed_dough: DoughCreateSchema, db: Session):
-    for key, value in changed_dough.dict().items():
-        setattr(dough, key, value)
+def update_dough(dough: Dough, changed_dough: DoughCreateSchema, db: Session, version: Optional[int] = None):
+    def apply_changes():
+        for key, value in changed_dough.dict().items():
+            setattr(dough, key, value)
 
-    db.commit()
+    commit_if_unchanged(dough, apply_changes, db, version)
+    catalog_cache.invalidate(Dough)
     db.refresh(dough)
     return dough
 
 
-def delete_dough_by_id(dough_id: uuid.UUID, db: Session):
+def delete_dough_by_id(dough_id: uuid.UUID, db: Session, version: Optional[int] = None):
     entity = get_dough_by_id(dough_id, db)
     if entity:
-        db.delete(entity)
-        db.commit()
+        commit_if_unchanged(entity, lambda: db.delete(entity), db, version)
+        catalog_cache.invalidate(Dough)
         logging.info('Dough deleted with ID {}'.format(dough_id))
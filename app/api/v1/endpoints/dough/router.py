@@ -1,12 +1,16 @@
 import uuid
 import logging
-from typing import List
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 import app.api.v1.endpoints.dough.crud as dough_crud
 from app.api.v1.endpoints.dough.schemas import DoughSchema, DoughCreateSchema, DoughListItemSchema
-from app.database.connection import SessionLocal
+from app.api.v1.bulk import BulkUpsertSchema, bulk_payload
+from app.api.v1.catalog_etag import catalog_not_modified, get_if_match_version, get_row_etag
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.database.models import Dough
 
 router = APIRouter()
 
@@ -19,9 +23,20 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @router.get('', response_model=List[DoughListItemSchema], tags=['dough'])
-def get_all_doughs(db: Session = Depends(get_db)):
+def get_all_doughs(request: Request, response: Response, db: Session = Depends(get_read_db)):
     logging.info('Received request to fetch all doughs')
+    not_modified = catalog_not_modified(Dough, request, response, db)
+    if not_modified:
+        return not_modified
     return dough_crud.get_all_doughs(db)
 
 
@@ -39,12 +54,23 @@ def create_dough(dough: DoughCreateSchema, request: Request, db: Session = Depen
     return new_dough
 
 
+@router.post('/bulk', response_model=BulkUpsertSchema, tags=['dough'])
+def upsert_doughs(
+        doughs: List[DoughCreateSchema] = Depends(bulk_payload(DoughCreateSchema)),
+        db: Session = Depends(get_db),
+):
+    logging.info('Received request to upsert {} doughs'.format(len(doughs)))
+    created, updated = dough_crud.upsert_doughs(doughs, db)
+    return BulkUpsertSchema(created=created, updated=updated)
+
+
 @router.put('/{dough_id}', response_model=DoughSchema, tags=['dough'])
 def update_dough(
         dough_id: uuid.UUID,
         changed_dough: DoughCreateSchema,
         request: Request,
         response: Response,
+        if_match: Optional[str] = Header(None),
         db: Session = Depends(get_db),
 ):
     logging.info('Received request to update dough with ID {}: {}'.format(dough_id, changed_dough))
@@ -53,9 +79,12 @@ def update_dough(
 
     if dough_found:
         if dough_found.name == changed_dough.name:
-            dough_crud.update_dough(dough_found, changed_dough, db)
+            try:
+                dough_crud.update_dough(dough_found, changed_dough, db, get_if_match_version(if_match))
+            except StaleDataError:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
             logging.info('Dough with ID {} updated successfully'.format(dough_id))
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers={'ETag': get_row_etag(dough_found)})
         else:
             dough_name_found = dough_crud.get_dough_by_name(changed_dough.name, db)
             if dough_name_found:
@@ -76,18 +105,19 @@ def update_dough(
 
 
 @router.get('/{dough_id}', response_model=DoughSchema, tags=['dough'])
-def get_dough(dough_id: uuid.UUID, db: Session = Depends(get_db)):
+def get_dough(dough_id: uuid.UUID, response: Response, db: Session = Depends(get_read_db)):
     logging.info('Received request to fetch dough with ID {}'.format(dough_id))
     dough = dough_crud.get_dough_by_id(dough_id, db)
 
     if not dough:
         logging.error('Dough with ID {} not found'.format(dough_id))
         raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(dough)
     return dough
 
 
 @router.delete('/{dough_id}', response_model=None, tags=['dough'])
-def delete_dough(dough_id: uuid.UUID, db: Session = Depends(get_db)):
+def delete_dough(dough_id: uuid.UUID, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     logging.info('Received request to delete dough with ID {}'.format(dough_id))
     dough = dough_crud.get_dough_by_id(dough_id, db)
 
@@ -95,6 +125,9 @@ def delete_dough(dough_id: uuid.UUID, db: Session = Depends(get_db)):
         logging.error('Dough with ID {} not found'.format(dough_id))
         raise HTTPException(status_code=404, detail='Item not found')
 
-    dough_crud.delete_dough_by_id(dough_id, db)
+    try:
+        dough_crud.delete_dough_by_id(dough_id, db, get_if_match_version(if_match))
+    except StaleDataError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
     logging.info('Dough with ID {} deleted successfully'.format(dough_id))
     return Response(status_code=status.HTTP_204_NO_CONTENT)
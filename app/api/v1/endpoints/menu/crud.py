@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.v1.catalog_etag import get_etag
+from app.api.v1.endpoints.beverage.schemas import BeverageListItemSchema
+from app.api.v1.endpoints.dough.schemas import DoughListItemSchema
+from app.api.v1.endpoints.menu.schemas import MenuPizzaTypeSchema, MenuSauceSchema, MenuSchema, MenuToppingSchema
+from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeSchema
+from app.api.v1.endpoints.sauce.schemas import SauceListItemSchema
+from app.api.v1.endpoints.topping.schemas import ToppingListItemSchema
+from app.database.models import (
+    Beverage,
+    Dough,
+    PizzaType,
+    PizzaTypeSauceQuantity,
+    PizzaTypeToppingQuantity,
+    Sauce,
+    Topping,
+)
+from app.database.table_version import get_table_versions
+
+# Every table the menu is built from, the quantities are the recipes
+MENU_MODELS = (PizzaType, Dough, Topping, Sauce, Beverage, PizzaTypeToppingQuantity, PizzaTypeSauceQuantity)
+
+_menu_lock = threading.Lock()
+# The serialized menu as (ETag, body), rebuilt once the ETag changes
+_menu: Tuple[str, bytes] = ('', b'')
+
+
+def get_menu_etag(db: Session):
+    # Changes with every catalog write and every recipe change of any process
+    return get_etag('menu', get_table_versions(MENU_MODELS, db))
+
+
+def get_menu(db: Session, etag: Optional[str] = None) -> Tuple[str, bytes]:
+    # The ETag is read again unless the caller already read it with db
+    global _menu
+    etag = etag or get_menu_etag(db)
+    with _menu_lock:
+        if _menu[0] == etag:
+            return _menu
+
+    # A menu built while the catalog changes is stored under the old ETag and rebuilt by the next request
+    menu = (etag, build_menu(db).json().encode())
+    with _menu_lock:
+        _menu = menu
+    logging.info('Menu built with ETag {}'.format(etag))
+    return menu
+
+
+def build_menu(db: Session) -> MenuSchema:
+    toppings = defaultdict(list)
+    for pizza_type_id, quantity, topping in db.execute(
+            select(PizzaTypeToppingQuantity.pizza_type_id, PizzaTypeToppingQuantity.quantity, Topping)
+            .join(Topping, PizzaTypeToppingQuantity.topping_id == Topping.id)
+            .order_by(Topping.name)):
+        toppings[pizza_type_id].append(
+            MenuToppingSchema(quantity=quantity, **ToppingListItemSchema.from_orm(topping).dict()))
+
+    sauces = defaultdict(list)
+    for pizza_type_id, quantity, sauce in db.execute(
+            select(PizzaTypeSauceQuantity.pizza_type_id, PizzaTypeSauceQuantity.quantity, Sauce)
+            .join(Sauce, PizzaTypeSauceQuantity.sauce_id == Sauce.id)
+            .order_by(Sauce.name)):
+        sauces[pizza_type_id].append(MenuSauceSchema(quantity=quantity, **SauceListItemSchema.from_orm(sauce).dict()))
+
+    pizza_types = [
+        MenuPizzaTypeSchema(
+            **PizzaTypeSchema.from_orm(pizza_type).dict(),
+            dough=DoughListItemSchema.from_orm(dough),
+            toppings=toppings[pizza_type.id],
+            sauces=sauces[pizza_type.id],
+        )
+        for pizza_type, dough in db.execute(
+            select(PizzaType, Dough).join(Dough, PizzaType.dough_id == Dough.id).order_by(PizzaType.name))
+    ]
+    beverages = [BeverageListItemSchema.from_orm(beverage)
+                 for beverage in db.scalars(select(Beverage).order_by(Beverage.name))]
+    return MenuSchema(pizza_types=pizza_types, beverages=beverages)
@@ -0,0 +1,43 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter, Depends, Request, Response, status
+from sqlalchemy.orm import Session
+
+import app.api.v1.endpoints.menu.crud as menu_crud
+import app.api.v1.endpoints.order.stock_logic.stock_ingredients_crud as stock_ingredients_crud
+from app.api.v1.catalog_etag import get_cache_headers, is_not_modified
+from app.api.v1.endpoints.menu.schemas import MenuSchema, PizzaTypeAvailabilitySchema
+from app.database.connection import SessionLocal
+
+router = APIRouter()
+
+
+def get_db():
+    # Read from the primary, the menu cached by this process follows the newest table versions
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.get('', response_model=MenuSchema, tags=['menu'])
+def get_menu(request: Request, db: Session = Depends(get_db)):
+    logging.info('Received request to fetch the menu')
+    headers = get_cache_headers(menu_crud.get_menu_etag(db))
+    if is_not_modified(headers['ETag'], request):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    etag, body = menu_crud.get_menu(db, headers['ETag'])
+    # The body is already serialized, the response model only documents it
+    return Response(content=body, media_type='application/json', headers=get_cache_headers(etag))
+
+
+@router.get('/availability', response_model=List[PizzaTypeAvailabilitySchema], tags=['menu'])
+def get_availability(db: Session = Depends(get_db)):
+    logging.info('Received request to fetch the producible count of all pizza types')
+    # Never cached, the counts change with every order
+    return [PizzaTypeAvailabilitySchema(pizza_type_id=pizza_type_id, producible=producible)
+            for pizza_type_id, producible
+            in stock_ingredients_crud.get_producible_counts_of_pizza_types(db).items()]
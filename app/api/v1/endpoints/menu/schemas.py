@@ -0,0 +1,34 @@
+import uuid
+from typing import List
+
+from pydantic import BaseModel
+
+from app.api.v1.endpoints.beverage.schemas import BeverageListItemSchema
+from app.api.v1.endpoints.dough.schemas import DoughListItemSchema
+from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeSchema
+from app.api.v1.endpoints.sauce.schemas import SauceListItemSchema
+from app.api.v1.endpoints.topping.schemas import ToppingListItemSchema
+
+
+class MenuToppingSchema(ToppingListItemSchema):
+    quantity: int
+
+
+class MenuSauceSchema(SauceListItemSchema):
+    quantity: int
+
+
+class MenuPizzaTypeSchema(PizzaTypeSchema):
+    dough: DoughListItemSchema
+    toppings: List[MenuToppingSchema]
+    sauces: List[MenuSauceSchema]
+
+
+class MenuSchema(BaseModel):
+    pizza_types: List[MenuPizzaTypeSchema]
+    beverages: List[BeverageListItemSchema]
+
+
+class PizzaTypeAvailabilitySchema(BaseModel):
+    pizza_type_id: uuid.UUID
+    producible: int
@@ -0,0 +1,38 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter
+
+from app.api.v1.endpoints.metrics.schemas import PoolMetricsSchema
+from app.database.connection import async_db_engine, db_engine, replica_db_engine, POOL_OPTIONS
+
+router = APIRouter()
+
+
+@router.get('/pool', response_model=List[PoolMetricsSchema], tags=['metrics'])
+def get_pool_metrics():
+    logging.info('Received request to fetch connection pool metrics')
+    metrics = [get_metrics_of_pool('sync', db_engine.pool)]
+    if replica_db_engine is not None:
+        metrics.append(get_metrics_of_pool('replica', replica_db_engine.pool))
+    if async_db_engine is not None:
+        metrics.append(get_metrics_of_pool('async', async_db_engine.pool))
+    return metrics
+
+
+def get_metrics_of_pool(engine: str, pool):
+    wait_stats = pool.wait_stats
+    return PoolMetricsSchema(
+        engine=engine,
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        idle=pool.checkedin(),
+        # The pool counts up from -size, it only overflows above zero
+        overflow=max(pool.overflow(), 0),
+        max_overflow=POOL_OPTIONS['max_overflow'],
+        waits=wait_stats.count,
+        timeouts=wait_stats.timeouts,
+        wait_seconds_total=wait_stats.total_seconds,
+        wait_seconds_max=wait_stats.max_seconds,
+        wait_seconds_average=wait_stats.total_seconds / wait_stats.count if wait_stats.count else 0.0,
+    )
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class PoolMetricsSchema(BaseModel):
+    engine: str
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    waits: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    wait_seconds_average: float
@@ -1,42 +1,207 @@
+import base64
+import datetime
+import decimal
 import uuid
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import logging
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session, selectinload
 
+import app.api.v1.endpoints.order.stock_logic.stock_beverage_crud as stock_beverage_crud
+import app.api.v1.endpoints.order.stock_logic.stock_ingredients_crud as stock_ingredients_crud
+import app.api.v1.endpoints.order.stock_logic.stock_reservation_crud as stock_reservation_crud
 from app.api.v1.endpoints.order.address.crud import create_address
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas
 from app.api.v1.endpoints.order.schemas import \
     JoinedPizzaPizzaTypeSchema, OrderBeverageQuantityCreateSchema, OrderCreateSchema
-from app.database.models import Order, Pizza, PizzaType, OrderBeverageQuantity, Beverage, OrderStatus
+from app.database.models import Address, Order, Pizza, PizzaType, OrderBeverageQuantity, Beverage, OrderStatus
+from app.exceptions.stock_error import OutOfStockError
+
+# Relationships serialized by OrderSchema, loaded with one query per list instead of one lazy load per order
+ORDER_SCHEMA_OPTIONS = (selectinload(Order.address),)
+
+EXPORT_CHUNK_SIZE = 1000
 
 
 def create_order(schema: OrderCreateSchema, db: Session):
     address = create_address(schema.address, db)
-    order = Order(user_id=schema.user_id, order_status=OrderStatus.TRANSMITTED)
+    order = Order(user_id=schema.user_id, order_status=OrderStatus.TRANSMITTED,
+                  reserved_until=stock_reservation_crud.get_reservation_deadline())
     order.address = address
     db.add(order)
     db.commit()
     return order
 
 
+def copy_order(schema: OrderCreateSchema, copy_order: Order, db: Session):
+    logging.info('Copying order ID: %s', copy_order.id)
+    order = Order(user_id=schema.user_id, order_status=OrderStatus.TRANSMITTED,
+                  reserved_until=stock_reservation_crud.get_reservation_deadline())
+    order.address = Address(**schema.address.dict())
+    db.add(order)
+    db.flush()
+
+    pizza_type_counts = dict(db.execute(
+        select(Pizza.pizza_type_id, func.count())
+        .where(Pizza.order_id == copy_order.id)
+        .group_by(Pizza.pizza_type_id)).all())
+    beverage_quantities = dict(db.execute(
+        select(OrderBeverageQuantity.beverage_id, OrderBeverageQuantity.quantity)
+        .where(OrderBeverageQuantity.order_id == copy_order.id)).all())
+
+    # Order, items and stock holds share one transaction, a conflict leaves no trace
+    deltas = stock_ingredients_crud.get_stock_deltas_of_pizza_types(pizza_type_counts, db)
+    stock_beverage_crud.get_stock_deltas_of_beverages(beverage_quantities, deltas)
+    try:
+        apply_stock_deltas(deltas, db)
+    except OutOfStockError:
+        db.rollback()
+        raise
+    stock_reservation_crud.store_holds(order.id, deltas, db)
+
+    insert_pizzas(order.id, pizza_type_counts, db)
+    insert_beverage_quantities(order.id, beverage_quantities, db)
+    update_totals_of_orders(db, order_ids=[order.id])
+    db.commit()
+    return order
+
+
+def checkout_order(schema: OrderCreateSchema, pizza_type_counts: List[Tuple[PizzaType, int]],
+                   beverage_quantities: List[Tuple[Beverage, int]], db: Session):
+    logging.info('Checking out order for user_id %s', schema.user_id)
+    pizza_counts = {pizza_type.id: count for pizza_type, count in pizza_type_counts}
+    quantities = {beverage.id: quantity for beverage, quantity in beverage_quantities}
+
+    order = Order(user_id=schema.user_id, order_status=OrderStatus.TRANSMITTED,
+                  reserved_until=stock_reservation_crud.get_reservation_deadline(),
+                  pizza_count=sum(pizza_counts.values()),
+                  beverage_count=sum(quantities.values()))
+    order.address = Address(**schema.address.dict())
+    db.add(order)
+    db.flush()
+
+    # Stock of all pizzas and beverages is held together, a conflict leaves no trace
+    deltas = stock_ingredients_crud.get_stock_deltas_of_pizza_types(pizza_counts, db)
+    stock_beverage_crud.get_stock_deltas_of_beverages(quantities, deltas)
+    try:
+        apply_stock_deltas(deltas, db)
+    except OutOfStockError:
+        db.rollback()
+        raise
+    stock_reservation_crud.store_holds(order.id, deltas, db)
+
+    pizzas = insert_pizzas(order.id, pizza_counts, db)
+    beverages = insert_beverage_quantities(order.id, quantities, db)
+    change_totals_of_order(order.id, db, price=get_price_of_items(pizzas, beverages))
+    db.commit()
+    return order, pizzas, beverages
+
+
 def get_order_by_id(order_id: uuid.UUID, db: Session):
-    entity = db.query(Order).filter(Order.id == order_id).first()
+    entity = db.query(Order).options(*ORDER_SCHEMA_OPTIONS).filter(Order.id == order_id).first()
     return entity
 
 
-def get_all_orders(db: Session):
-    entities = db.query(Order).all()
+def get_all_orders(db: Session, limit: Optional[int] = None,
+                   after: Optional[Tuple[datetime.datetime, uuid.UUID]] = None):
+    entities = get_page_of_orders(db.query(Order).options(*ORDER_SCHEMA_OPTIONS), limit, after)
     return entities
 
 
-def get_orders_by_status(status: OrderStatus, db: Session):
-    query = db.query(Order)
+def get_orders_by_status(status: OrderStatus, db: Session, limit: Optional[int] = None,
+                         after: Optional[Tuple[datetime.datetime, uuid.UUID]] = None):
+    query = db.query(Order).options(*ORDER_SCHEMA_OPTIONS)
     if status:
         query = query.filter(Order.order_status == status)
-    orders = query.order_by(Order.order_datetime).all()
+    orders = get_page_of_orders(query, limit, after)
     return orders
 
 
+def get_page_of_orders(query, limit: Optional[int], after: Optional[Tuple[datetime.datetime, uuid.UUID]]):
+    # Keyset pagination on (order_datetime, id): every page is an index range scan, independent of its position
+    if after:
+        query = query.filter(tuple_(Order.order_datetime, Order.id) > tuple_(*after))
+    query = query.order_by(Order.order_datetime, Order.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def encode_order_cursor(order: Order):
+    token = '{}|{}'.format(order.order_datetime.isoformat(), order.id)
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def decode_order_cursor(cursor: str):
+    # Raises ValueError for cursors that were not created by encode_order_cursor
+    order_datetime, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.datetime.fromisoformat(order_datetime), uuid.UUID(order_id)
+
+
+def stream_orders_for_export(
+        db: Session,
+        status: Optional[OrderStatus] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        with_items: bool = False,
+        with_prices: bool = False,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+):
+    query = select(Order.id, Order.order_datetime, Order.order_status, Order.user_id,
+                   Order.total_price, Order.pizza_count, Order.beverage_count)
+    if status:
+        query = query.where(Order.order_status == status)
+    if start:
+        query = query.where(Order.order_datetime >= start)
+    if end:
+        query = query.where(Order.order_datetime < end)
+    # yield_per reads the rows through a server side cursor, so only one chunk is held in memory at a time
+    query = query.order_by(Order.order_datetime, Order.id).execution_options(yield_per=chunk_size)
+
+    for chunk in db.execute(query).partitions():
+        pizzas: Dict[uuid.UUID, Dict[str, int]] = {}
+        beverages: Dict[uuid.UUID, Dict[str, int]] = {}
+        if with_items:
+            order_ids = [order.id for order in chunk]
+            pizzas = get_pizza_counts_of_orders(order_ids, db)
+            beverages = get_beverage_quantities_of_orders(order_ids, db)
+
+        for order in chunk:
+            row = {
+                'id': str(order.id),
+                'order_datetime': order.order_datetime.isoformat(),
+                'order_status': order.order_status.value,
+                'user_id': str(order.user_id),
+            }
+            if with_prices:
+                row['price'] = str(order.total_price)
+                row['pizza_count'] = order.pizza_count
+                row['beverage_count'] = order.beverage_count
+            if with_items:
+                row['pizzas'] = pizzas.get(order.id, {})
+                row['beverages'] = beverages.get(order.id, {})
+            yield row
+
+
+def get_pizza_counts_of_orders(order_ids: List[uuid.UUID], db: Session):
+    counts: Dict[uuid.UUID, Dict[str, int]] = {}
+    for order_id, pizza_type_id, count in db.execute(
+            select(Pizza.order_id, Pizza.pizza_type_id, func.count())
+            .where(Pizza.order_id.in_(order_ids))
+            .group_by(Pizza.order_id, Pizza.pizza_type_id)):
+        counts.setdefault(order_id, {})[str(pizza_type_id)] = count
+    return counts
+
+
+def get_beverage_quantities_of_orders(order_ids: List[uuid.UUID], db: Session):
+    quantities: Dict[uuid.UUID, Dict[str, int]] = {}
+    for order_id, beverage_id, quantity in db.execute(
+            select(OrderBeverageQuantity.order_id, OrderBeverageQuantity.beverage_id, OrderBeverageQuantity.quantity)
+            .where(OrderBeverageQuantity.order_id.in_(order_ids))):
+        quantities.setdefault(order_id, {})[str(beverage_id)] = quantity
+    return quantities
+
+
 def delete_order_by_id(order_id: uuid.UUID, db: Session):
     entity = get_order_by_id(order_id, db)
     if entity:
@@ -45,6 +210,13 @@ def delete_order_by_id(order_id: uuid.UUID, db: Session):
 
 
 def update_order_status(order: Order, changed_order: OrderStatus, db: Session):
+    # Leaving TRANSMITTED confirms the held stock, nothing changes if it was given back and is gone meanwhile
+    if changed_order != OrderStatus.TRANSMITTED:
+        try:
+            stock_reservation_crud.confirm_holds(order.id, db)
+        except OutOfStockError:
+            db.rollback()
+            raise
     setattr(order, 'order_status', changed_order)
 
     db.commit()
@@ -58,6 +230,8 @@ def create_pizza(pizza_type: PizzaType,
     entity = Pizza()
     if pizza_type:
         entity.pizza_type_id = pizza_type.id
+        # The price is read by the INSERT, the pizza type may come from the catalog cache
+        entity.unit_price = select(PizzaType.price).where(PizzaType.id == pizza_type.id).scalar_subquery()
     db.add(entity)
     db.commit()
     return entity
@@ -67,12 +241,65 @@ def add_pizza_to_order(order: Order, pizza_type: PizzaType,
                        db: Session):
     logging.info('Adding pizza to order ID: %s', order.id)
     pizza = create_pizza(pizza_type, db)
+    change_totals_of_order(order.id, db, price=pizza.unit_price, pizza_count=1)
     order.pizzas.append(pizza)
     db.commit()
     db.refresh(order)
     return pizza
 
 
+def add_pizzas_to_order(order: Order, pizza_type_counts: List[Tuple[PizzaType, int]], db: Session):
+    logging.info('Adding %s pizzas to order ID: %s', sum(count for _, count in pizza_type_counts), order.id)
+    counts = {pizza_type.id: count for pizza_type, count in pizza_type_counts}
+
+    # Stock holds for the combined demand, the pizzas and the totals are changed in one transaction
+    try:
+        stock_reservation_crud.hold_stock(order.id, stock_ingredients_crud.get_stock_deltas_of_pizza_types(counts, db),
+                                          db)
+    except OutOfStockError:
+        db.rollback()
+        raise
+    pizzas = insert_pizzas(order.id, counts, db)
+    change_totals_of_order(order.id, db, price=get_price_of_items(pizzas), pizza_count=len(pizzas))
+    db.commit()
+    return pizzas
+
+
+def insert_pizzas(order_id: uuid.UUID, pizza_type_counts: Dict[uuid.UUID, int], db: Session):
+    # One multi-row INSERT at the current prices, committed by the caller
+    prices = get_prices_by_id(PizzaType, pizza_type_counts, db)
+    pizzas = [{'id': uuid.uuid4(), 'pizza_type_id': pizza_type_id, 'order_id': order_id,
+               'unit_price': prices[pizza_type_id]}
+              for pizza_type_id, count in pizza_type_counts.items()
+              for _ in range(count)]
+    if pizzas:
+        db.execute(insert(Pizza), pizzas)
+    return pizzas
+
+
+def insert_beverage_quantities(order_id: uuid.UUID, beverage_quantities: Dict[uuid.UUID, int], db: Session):
+    # One multi-row INSERT at the current prices, committed by the caller
+    prices = get_prices_by_id(Beverage, beverage_quantities, db)
+    quantities = [{'order_id': order_id, 'beverage_id': beverage_id, 'quantity': quantity,
+                   'unit_price': prices[beverage_id]}
+                  for beverage_id, quantity in beverage_quantities.items()]
+    if quantities:
+        db.execute(insert(OrderBeverageQuantity), quantities)
+    return quantities
+
+
+def get_prices_by_id(model, ids, db: Session) -> Dict[uuid.UUID, decimal.Decimal]:
+    # Read from the database, cached catalog entities may carry an outdated price
+    if not ids:
+        return {}
+    return dict(db.execute(select(model.id, model.price).where(model.id.in_(ids))).all())
+
+
+def get_price_of_items(pizzas: List[dict] = (), beverage_quantities: List[dict] = ()) -> decimal.Decimal:
+    return sum((pizza['unit_price'] for pizza in pizzas), decimal.Decimal(0)) \
+        + sum((beverage['unit_price'] * beverage['quantity'] for beverage in beverage_quantities), decimal.Decimal(0))
+
+
 def get_pizza_by_id(pizza_id: uuid.UUID, db):
     logging.info('Fetching pizza with ID: %s', pizza_id)
     entity = db.query(Pizza).filter(Pizza.id == pizza_id).first()
@@ -94,6 +321,7 @@ def get_all_pizzas_of_order(order: Order, db: Session):
 def delete_pizza_from_order(order: Order, pizza_id: uuid.UUID, db: Session):
     entity = db.query(Pizza).filter(Pizza.order_id == order.id, Pizza.id == pizza_id).first()
     if entity:
+        change_totals_of_order(order.id, db, price=-entity.unit_price, pizza_count=-1)
         db.delete(entity)
         db.commit()
         return True
@@ -107,6 +335,8 @@ def create_beverage_quantity(
         db: Session,
 ):
     entity = OrderBeverageQuantity(**schema.dict())
+    entity.unit_price = db.scalar(select(Beverage.price).where(Beverage.id == schema.beverage_id))
+    change_totals_of_order(order.id, db, price=entity.unit_price * schema.quantity, beverage_count=schema.quantity)
     order.beverages.append(entity)
     db.commit()
     db.refresh(order)
@@ -138,6 +368,10 @@ def update_beverage_quantity_of_order(order_id: uuid.UUID, beverage_id: uuid.UUI
     order_beverage = db.query(OrderBeverageQuantity).filter(order_id == OrderBeverageQuantity.order_id,
                                                             beverage_id == OrderBeverageQuantity.beverage_id).first()
     if order_beverage:
+        change_amount = new_quantity - order_beverage.quantity
+        # The quantity keeps the price it was added at
+        change_totals_of_order(order_id, db, price=order_beverage.unit_price * change_amount,
+                               beverage_count=change_amount)
         setattr(order_beverage, 'quantity', new_quantity)
         db.commit()
         db.refresh(order_beverage)
@@ -149,6 +383,8 @@ def delete_beverage_from_order(order_id: uuid.UUID, beverage_id: uuid.UUID, db:
     entity = db.query(OrderBeverageQuantity).filter(order_id == OrderBeverageQuantity.order_id,
                                                     beverage_id == OrderBeverageQuantity.beverage_id).first()
     if entity:
+        change_totals_of_order(order_id, db, price=-entity.unit_price * entity.quantity,
+                               beverage_count=-entity.quantity)
         db.delete(entity)
         db.commit()
         return True
@@ -156,26 +392,95 @@ def delete_beverage_from_order(order_id: uuid.UUID, beverage_id: uuid.UUID, db:
         return False
 
 
-def get_price_of_order(
+def get_prices_of_orders(
+        db: Session,
+        order_ids: Optional[List[uuid.UUID]] = None,
+        status: Optional[OrderStatus] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime.datetime, uuid.UUID]] = None,
+):
+    # Paged like the order lists, order_datetime and id of the rows make the cursor
+    query = select(Order.id.label('order_id'), Order.total_price.label('price'), Order.order_datetime, Order.id)
+    if order_ids is not None:
+        query = query.where(Order.id.in_(order_ids))
+    if status:
+        query = query.where(Order.order_status == status)
+    if after:
+        query = query.where(tuple_(Order.order_datetime, Order.id) > tuple_(*after))
+    query = query.order_by(Order.order_datetime, Order.id)
+    if limit:
+        query = query.limit(limit)
+    return db.execute(query).all()
+
+
+def change_totals_of_order(
         order_id: uuid.UUID,
         db: Session,
+        price: decimal.Decimal = decimal.Decimal(0),
+        pizza_count: int = 0,
+        beverage_count: int = 0,
 ):
-    price_beverage: float = 0
-    for row in db.query(Beverage.price, OrderBeverageQuantity.quantity) \
-            .join(OrderBeverageQuantity) \
-            .join(Order) \
-            .filter(Order.id == order_id):
-        price_beverage += (row.price * row.quantity)
-
-    price_pizza = db.query(func.sum(PizzaType.price)) \
-        .join(Pizza) \
-        .join(Order) \
-        .filter(Order.id == order_id).first()[0]
-
-    # If order has no pizzas, only beverage
-    if price_pizza is None:
-        return price_beverage
-
-    # if order has pizza and beverage, return the price of pizza + beverage
-    if price_pizza is not None:
-        return price_pizza + price_beverage
+    # Relative update, so concurrent changes of the same order are not lost. Committed by the caller.
+    db.execute(update(Order)
+               .where(Order.id == order_id)
+               .values(total_price=Order.total_price + price,
+                       pizza_count=Order.pizza_count + pizza_count,
+                       beverage_count=Order.beverage_count + beverage_count)
+               .execution_options(synchronize_session=False))
+
+
+def compute_totals_of_orders(order_ids: Optional[List[uuid.UUID]] = None):
+    # From the prices the items were added at, so price changes of the catalog never count as drift
+    pizza_totals = select(Pizza.order_id,
+                          func.sum(Pizza.unit_price).label('price'),
+                          func.count().label('count')) \
+        .group_by(Pizza.order_id)
+    beverage_totals = select(OrderBeverageQuantity.order_id,
+                             func.sum(OrderBeverageQuantity.unit_price * OrderBeverageQuantity.quantity).label('price'),
+                             func.sum(OrderBeverageQuantity.quantity).label('count')) \
+        .group_by(OrderBeverageQuantity.order_id)
+    query = select(Order.id.label('order_id'))
+    if order_ids is not None:
+        pizza_totals = pizza_totals.where(Pizza.order_id.in_(order_ids))
+        beverage_totals = beverage_totals.where(OrderBeverageQuantity.order_id.in_(order_ids))
+        query = query.where(Order.id.in_(order_ids))
+
+    pizza_totals_subquery = pizza_totals.subquery()
+    beverage_totals_subquery = beverage_totals.subquery()
+    return query \
+        .add_columns((func.coalesce(pizza_totals_subquery.c.price, 0)
+                      + func.coalesce(beverage_totals_subquery.c.price, 0)).label('total_price'),
+                     func.coalesce(pizza_totals_subquery.c.count, 0).label('pizza_count'),
+                     func.coalesce(beverage_totals_subquery.c.count, 0).label('beverage_count')) \
+        .outerjoin(pizza_totals_subquery, pizza_totals_subquery.c.order_id == Order.id) \
+        .outerjoin(beverage_totals_subquery, beverage_totals_subquery.c.order_id == Order.id) \
+        .subquery()
+
+
+def get_drift_of_order_totals(db: Session):
+    computed = compute_totals_of_orders()
+    query = select(Order.id.label('order_id'),
+                   Order.total_price, computed.c.total_price.label('computed_total_price'),
+                   Order.pizza_count, computed.c.pizza_count.label('computed_pizza_count'),
+                   Order.beverage_count, computed.c.beverage_count.label('computed_beverage_count')) \
+        .join(computed, computed.c.order_id == Order.id) \
+        .where(_totals_differ(computed))
+    return db.execute(query).all()
+
+
+def update_totals_of_orders(db: Session, order_ids: Optional[List[uuid.UUID]] = None):
+    # Overwrites the stored totals with the recomputed ones in one statement. Committed by the caller.
+    computed = compute_totals_of_orders(order_ids)
+    result = db.execute(update(Order)
+                        .where(Order.id == computed.c.order_id, _totals_differ(computed))
+                        .values(total_price=computed.c.total_price,
+                                pizza_count=computed.c.pizza_count,
+                                beverage_count=computed.c.beverage_count)
+                        .execution_options(synchronize_session=False))
+    return result.rowcount
+
+
+def _totals_differ(computed):
+    return or_(Order.total_price != computed.c.total_price,
+               Order.pizza_count != computed.c.pizza_count,
+               Order.beverage_count != computed.c.beverage_count)
@@ -1,26 +1,39 @@
+import csv
+import datetime
+import io
+import json
 import uuid
-from typing import List, Optional, TypeVar
+from collections import defaultdict
+from typing import Dict, List, Optional, TypeVar
 import logging
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 import app.api.v1.endpoints.beverage.crud as beverage_crud
 import app.api.v1.endpoints.order.crud as order_crud
-import app.api.v1.endpoints.order.stock_logic.stock_beverage_crud as stock_beverage_crud
-import app.api.v1.endpoints.order.stock_logic.stock_ingredients_crud as stock_ingredients_crud
+import app.api.v1.endpoints.order.stock_logic.stock_reservation_crud as stock_reservation_crud
 import app.api.v1.endpoints.pizza_type.crud as pizza_type_crud
 import app.api.v1.endpoints.user.crud as user_crud
 from app.api.v1.endpoints.order.schemas \
     import OrderSchema, PizzaCreateSchema, JoinedPizzaPizzaTypeSchema, \
     PizzaWithoutPizzaTypeSchema, OrderBeverageQuantityCreateSchema, JoinedOrderBeverageQuantitySchema, \
-    OrderPriceSchema, OrderBeverageQuantityBaseSchema, OrderCreateSchema
+    OrderPriceSchema, OrderBeverageQuantityBaseSchema, OrderCreateSchema, OrderPriceListItemSchema, \
+    PizzaBatchItemCreateSchema, PizzaSchema, OrderCheckoutCreateSchema, OrderCheckoutSchema
 from app.api.v1.endpoints.user.schemas import UserSchema
-from app.database.connection import SessionLocal
-from app.api.v1.endpoints.order.schemas import OrderStatus
+from app.api.v1.idempotency import IdempotentRoute, idempotent
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.api.v1.endpoints.order.schemas import OrderExportFormat, OrderStatus
+from app.exceptions.stock_error import OutOfStockError, ReservationExpiredError
 from fastapi import Query
 
-router = APIRouter()
+# Retried creations with the same Idempotency-Key get the first response, see idempotency
+router = APIRouter(route_class=IdempotentRoute)
+
+ORDER_PAGE_SIZE = 100
+MAX_ORDER_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+MAX_PIZZAS_PER_BATCH = 100
 
 
 def get_db():
@@ -31,73 +44,186 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @router.get('', response_model=List[OrderSchema], tags=['order'])
 def get_all_orders(
-        db: Session = Depends(get_db),
+        response: Response,
+        limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: Session = Depends(get_read_db),
 ):
-    orders = order_crud.get_all_orders(db)
-    return orders
+    orders = order_crud.get_all_orders(db, limit=limit + 1, after=decode_cursor(cursor))
+    return paginate(orders, limit, response)
 
 
 @router.get('/filter', response_model=List[OrderSchema], tags=['order'])
 def get_orders_by_status(
+        response: Response,
         status: OrderStatus = Query(None),
-        db: Session = Depends(get_db),
+        limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: Session = Depends(get_read_db),
 ):
-    orders = order_crud.get_orders_by_status(status, db)
+    orders = order_crud.get_orders_by_status(status, db, limit=limit + 1, after=decode_cursor(cursor))
+    return paginate(orders, limit, response)
+
+
+def decode_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return order_crud.decode_order_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Invalid cursor')
+
+
+def paginate(orders: List, limit: int, response: Response):
+    # One extra order was fetched to find out whether there is a next page
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = order_crud.encode_order_cursor(orders[-1])
     return orders
 
 
+@router.get('/prices', response_model=List[OrderPriceListItemSchema], tags=['order'])
+def get_prices_of_orders(
+        response: Response,
+        order_id: Optional[List[uuid.UUID]] = Query(None),
+        status: OrderStatus = Query(None),
+        limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        db: Session = Depends(get_read_db),
+):
+    logging.info(f'Fetching prices for orders {order_id} with status {status}')
+    prices = order_crud.get_prices_of_orders(db, order_ids=order_id, status=status, limit=limit + 1,
+                                             after=decode_cursor(cursor))
+    return paginate(prices, limit, response)
+
+
+@router.get('/export', response_class=StreamingResponse, tags=['order'])
+def export_orders(
+        export_format: OrderExportFormat = Query(OrderExportFormat.NDJSON, alias='format'),
+        status: OrderStatus = Query(None),
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        with_items: bool = False,
+        with_prices: bool = False,
+        db: Session = Depends(get_read_db),
+):
+    logging.info(f'Exporting orders with status {status} from {start} to {end} as {export_format.value}')
+    rows = order_crud.stream_orders_for_export(db, status=status, start=start, end=end,
+                                               with_items=with_items, with_prices=with_prices)
+    if export_format == OrderExportFormat.CSV:
+        return StreamingResponse(export_rows_as_csv(rows, with_items, with_prices), media_type='text/csv')
+    return StreamingResponse(export_rows_as_ndjson(rows), media_type='application/x-ndjson')
+
+
+def export_rows_as_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export_rows_as_csv(rows, with_items: bool, with_prices: bool):
+    fieldnames = ['id', 'order_datetime', 'order_status', 'user_id']
+    if with_prices:
+        fieldnames += ['price', 'pizza_count', 'beverage_count']
+    if with_items:
+        fieldnames += ['pizzas', 'beverages']
+
+    # The buffer only ever holds the current line
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        if with_items:
+            row['pizzas'] = json.dumps(row['pizzas'])
+            row['beverages'] = json.dumps(row['beverages'])
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # An export without orders still contains the header
+    yield buffer.getvalue()
+
+
 @router.post('', response_model=OrderSchema, status_code=status.HTTP_201_CREATED, tags=['order'])
+@idempotent
 def create_order(order: OrderCreateSchema, db: Session = Depends(get_db),
                  copy_order_id: Optional[uuid.UUID] = None):
     logging.info(f'Creating order for user_id {order.user_id}')
     if user_crud.get_user_by_id(order.user_id, db) is None:
         raise HTTPException(status_code=404)
 
-    # Create Order
-    new_order = order_crud.create_order(order, db)
-
     # Check if Copy Order is specified
     if copy_order_id is None:
+        new_order = order_crud.create_order(order, db)
         return new_order
 
     # Check Copy Order
     copy_order = order_crud.get_order_by_id(copy_order_id, db)
     if not copy_order:
-        order_crud.delete_order_by_id(new_order.id, db)
         raise HTTPException(status_code=404)
 
-    # Copy Pizzas
-    for pizza in copy_order.pizzas:
-        pizza_type = pizza.pizza_type
-        if not stock_ingredients_crud.ingredients_are_available(pizza_type):
-            # Not enough Stock
-            order_crud.delete_order_by_id(new_order.id, db)
-            raise HTTPException(status_code=409, detail='Conflict')
-
-        order_crud.add_pizza_to_order(new_order, pizza_type, db)
-        stock_ingredients_crud.reduce_stock_of_ingredients(pizza_type, db)
-
-    # Copy Beverages
-    for beverage_quantity in copy_order.beverages:
-        schema = OrderBeverageQuantityCreateSchema(
-            **{'quantity': beverage_quantity.quantity, 'beverage_id': beverage_quantity.beverage_id})
-        if not stock_beverage_crud.change_stock_of_beverage(beverage_quantity.beverage_id,
-                                                            -beverage_quantity.quantity, db):
-            # Not enough Stock
-            order_crud.delete_order_by_id(new_order.id, db)
-            raise HTTPException(status_code=409, detail='Conflict')
-
-        order_crud.create_beverage_quantity(new_order, schema, db)
+    # Copy Pizzas and Beverages, nothing is stored if the stock is insufficient
+    try:
+        new_order = order_crud.copy_order(order, copy_order, db)
+    except OutOfStockError:
+        raise HTTPException(status_code=409, detail='Conflict')
 
     return new_order
 
 
+@router.post('/checkout', response_model=OrderCheckoutSchema, status_code=status.HTTP_201_CREATED, tags=['order'])
+def checkout_order(checkout: OrderCheckoutCreateSchema, db: Session = Depends(get_db)):
+    logging.info(f'Checking out order for user_id {checkout.user_id}')
+    if user_crud.get_user_by_id(checkout.user_id, db) is None:
+        raise HTTPException(status_code=404)
+
+    # Check if Counts and Quantities are valid
+    pizza_counts: Dict[uuid.UUID, int] = defaultdict(int)
+    for pizza in checkout.pizzas:
+        if pizza.count <= 0:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        pizza_counts[pizza.pizza_type_id] += pizza.count
+    beverage_quantities: Dict[uuid.UUID, int] = defaultdict(int)
+    for beverage in checkout.beverages:
+        if beverage.quantity <= 0:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        beverage_quantities[beverage.beverage_id] += beverage.quantity
+    if sum(pizza_counts.values()) > MAX_PIZZAS_PER_BATCH:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    # Check if all Pizza Types and Beverages exist, one query per table
+    pizza_types = pizza_type_crud.get_pizza_types_by_ids(list(pizza_counts), db) if pizza_counts else []
+    beverages = beverage_crud.get_beverages_by_ids(list(beverage_quantities), db) if beverage_quantities else []
+    if len(pizza_types) != len(pizza_counts) or len(beverages) != len(beverage_quantities):
+        raise HTTPException(status_code=404)
+
+    try:
+        new_order, pizzas, order_beverages = order_crud.checkout_order(
+            checkout,
+            [(pizza_type, pizza_counts[pizza_type.id]) for pizza_type in pizza_types],
+            [(beverage, beverage_quantities[beverage.id]) for beverage in beverages],
+            db)
+    except OutOfStockError as error:
+        logging.info(error.message)
+        raise HTTPException(status_code=409, detail='Conflict')
+
+    return OrderCheckoutSchema(**OrderSchema.from_orm(new_order).dict(),
+                               price=new_order.total_price, pizzas=pizzas, beverages=order_beverages)
+
+
 @router.get('/{order_id}', response_model=OrderSchema, tags=['order'])
 def get_order(
         order_id: uuid.UUID,
-        db: Session = Depends(get_db)):
+        db: Session = Depends(get_read_db)):
     logging.info(f'Fetching order with id {order_id}')
     order = order_crud.get_order_by_id(order_id, db)
     if not order:
@@ -116,19 +242,14 @@ def delete_order(
     if not order:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-    ordered_pizzas = order.pizzas
-    if ordered_pizzas:
-        for pizza in ordered_pizzas:
-            stock_ingredients_crud.increase_stock_of_ingredients(pizza.pizza_type, db)
-    order_beverages = order_crud.get_joined_beverage_quantities_by_order(order_id, db)
-    if order_beverages:
-        for order_beverage in order_beverages:
-            stock_beverage_crud.change_stock_of_beverage(order_beverage.beverage.id, order_beverage.quantity, db)
+    # The stock of all items is given back in bulk and committed together with the deletion
+    stock_reservation_crud.release_stock_of_order(order_id, db)
     order_crud.delete_order_by_id(order_id, db)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post('/{order_id}/pizzas', response_model=PizzaWithoutPizzaTypeSchema, tags=['order'])
+@idempotent
 def add_pizza_to_order(
         order_id: uuid.UUID,
         schema: PizzaCreateSchema,
@@ -142,17 +263,57 @@ def add_pizza_to_order(
     pizza_type = pizza_type_crud.get_pizza_type_by_id(schema.pizza_type_id, db)
     if not pizza_type:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
-    if not stock_ingredients_crud.ingredients_are_available(pizza_type):
+    try:
+        stock_reservation_crud.hold_stock_of_pizza(order.id, pizza_type, db)
+    except ReservationExpiredError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+    except OutOfStockError as error:
+        logging.info(error.message)
         return Response(status_code=status.HTTP_409_CONFLICT)
-    stock_ingredients_crud.reduce_stock_of_ingredients(pizza_type, db)
     pizza = order_crud.add_pizza_to_order(order, pizza_type, db)
     return pizza
 
 
+@router.post('/{order_id}/pizzas/batch', response_model=List[PizzaSchema], status_code=status.HTTP_201_CREATED,
+             tags=['order'])
+def add_pizzas_to_order(
+        order_id: uuid.UUID,
+        schema: List[PizzaBatchItemCreateSchema],
+        db: Session = Depends(get_db),
+):
+    logging.info(f'Adding pizza batch to order with id {order_id}')
+    order = order_crud.get_order_by_id(order_id, db)
+    if not order:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    # Check if Counts are valid
+    counts: Dict[uuid.UUID, int] = defaultdict(int)
+    for item in schema:
+        if item.count <= 0:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        counts[item.pizza_type_id] += item.count
+    if not counts or sum(counts.values()) > MAX_PIZZAS_PER_BATCH:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    pizza_types = pizza_type_crud.get_pizza_types_by_ids(list(counts), db)
+    if len(pizza_types) != len(counts):
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    try:
+        pizzas = order_crud.add_pizzas_to_order(
+            order, [(pizza_type, counts[pizza_type.id]) for pizza_type in pizza_types], db)
+    except ReservationExpiredError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+    except OutOfStockError as error:
+        logging.info(error.message)
+        return Response(status_code=status.HTTP_409_CONFLICT)
+    return pizzas
+
+
 @router.get('/{order_id}/pizzas', response_model=List[JoinedPizzaPizzaTypeSchema], tags=['order'])
 def get_pizzas_from_order(
         order_id: uuid.UUID,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
 ):
     logging.info(f'Fetching pizzas from order with id {order_id}')
     order = order_crud.get_order_by_id(order_id, db)
@@ -178,7 +339,7 @@ def delete_pizza_from_order(
     if not pizza_entity:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-    stock_ingredients_crud.increase_stock_of_ingredients(pizza_entity.pizza_type, db)
+    stock_reservation_crud.release_stock_of_pizza(order.id, pizza_entity.pizza_type, db)
 
     if not order_crud.delete_pizza_from_order(order, pizza.id, db):
         return Response(status_code=status.HTTP_404_NOT_FOUND)
@@ -201,7 +362,7 @@ MyPyEitherItem = TypeVar(
 )
 def get_order_beverages(
         order_id: uuid.UUID,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         join: bool = False,
 ):
     logging.info(f'Fetching beverages from order with id {order_id}')
@@ -224,6 +385,7 @@ def get_order_beverages(
     status_code=status.HTTP_201_CREATED,
     tags=['order'],
 )
+@idempotent
 def create_order_beverage(
         order_id: uuid.UUID,
         beverage_quantity: OrderBeverageQuantityCreateSchema,
@@ -248,9 +410,13 @@ def create_order_beverage(
         url = request.url_for('get_order_beverages', order_id=beverage_quantity_found.order_id)
         return RedirectResponse(url=url, status_code=status.HTTP_303_SEE_OTHER)
     # Change Stock of Beverage if enough is available
-    if not stock_beverage_crud.beverage_is_available(beverage_quantity.beverage_id, beverage_quantity.quantity, db):
+    try:
+        changed = stock_reservation_crud.change_stock_of_beverage_in_order(
+            order_id, beverage_quantity.beverage_id, -beverage_quantity.quantity, db)
+    except ReservationExpiredError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+    if not changed:
         raise HTTPException(status_code=409, detail='Conflict')
-    stock_beverage_crud.change_stock_of_beverage(beverage_quantity.beverage_id, -beverage_quantity.quantity, db)
     new_beverage_quantity = order_crud.create_beverage_quantity(order, beverage_quantity, db)
     return new_beverage_quantity
 
@@ -269,7 +435,14 @@ def update_order_status(
     if order_status not in ['TRANSMITTED', 'PREPARING', 'IN_DELIVERY', 'COMPLETED']:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-    order_crud.update_order_status(order, order_status, db)
+    # Confirming the order keeps its held stock, which fails if the stock was given back and is gone meanwhile
+    try:
+        order_crud.update_order_status(order, order_status, db)
+    except ReservationExpiredError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+    except OutOfStockError as error:
+        logging.info(error.message)
+        raise HTTPException(status_code=409, detail='Conflict')
     return None
 
 
@@ -299,7 +472,12 @@ def update_beverage_of_order(
     new_quantity = beverage_quantity.quantity
     old_quantity = order_beverage_quantity.quantity
     # Change Stock if enough is available: change Amount is Previous - New
-    if not stock_beverage_crud.change_stock_of_beverage(beverage_id, old_quantity - new_quantity, db):
+    try:
+        changed = stock_reservation_crud.change_stock_of_beverage_in_order(
+            order_id, beverage_id, old_quantity - new_quantity, db)
+    except ReservationExpiredError as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+    if not changed:
         raise HTTPException(status_code=409, detail='Conflict')
     # Update
     new_order_beverage_quantity = order_crud.update_beverage_quantity_of_order(
@@ -329,7 +507,7 @@ def delete_beverage_from_order(
         raise HTTPException(status_code=404)
     # Increase Stock by the quantity of the deleted order
     order_quantity = order_beverage.quantity
-    stock_beverage_crud.change_stock_of_beverage(beverage_id, order_quantity, db)
+    stock_reservation_crud.change_stock_of_beverage_in_order(order_id, beverage_id, order_quantity, db)
     # Delete OrderBeverageQuantity
     order_crud.delete_beverage_from_order(order_id, beverage_id, db)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -343,17 +521,15 @@ def delete_beverage_from_order(
 )
 def get_price_of_order(
         order_id: uuid.UUID,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
 ):
     logging.info(f'Fetching price for order with id {order_id}')
     order = order_crud.get_order_by_id(order_id, db)
     if not order:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-    price = order_crud.get_price_of_order(order_id, db)
-
     return OrderPriceSchema(**{
-        'price': price,
+        'price': order.total_price,
     })
 
 
@@ -364,7 +540,7 @@ def get_price_of_order(
             )
 def get_user_of_order(
         order_id: uuid.UUID,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
 ):
     logging.info(f'Fetching user for order with id {order_id}')
     order = order_crud.get_order_by_id(order_id, db)
@@ -1,6 +1,8 @@
 import datetime
+import decimal
 import uuid
 from enum import Enum
+from typing import List
 
 from pydantic import BaseModel
 
@@ -16,6 +18,11 @@ class OrderStatus(str, Enum):
     COMPLETED = 'COMPLETED'
 
 
+class OrderExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
 class OrderBaseSchema(BaseModel):
     class Config:
         orm_mode = True
@@ -34,7 +41,11 @@ class OrderSchema(OrderCreateSchema):
 
 
 class OrderPriceSchema(OrderBaseSchema):
-    price: float
+    price: decimal.Decimal
+
+
+class OrderPriceListItemSchema(OrderPriceSchema):
+    order_id: uuid.UUID
 
 
 class PizzaBaseSchema(BaseModel):
@@ -50,6 +61,10 @@ class PizzaSchema(PizzaCreateSchema):
     id: uuid.UUID
 
 
+class PizzaBatchItemCreateSchema(PizzaCreateSchema):
+    count: int
+
+
 class PizzaWithoutPizzaTypeSchema(PizzaBaseSchema):
     id: uuid.UUID
 
@@ -80,3 +95,14 @@ class JoinedOrderBeverageQuantitySchema(OrderBaseSchema, BeverageBaseSchema):
 class OrderUpdateOrderStatusSchema(OrderBaseSchema):
     id: uuid.UUID
     order_status: OrderStatus
+
+
+class OrderCheckoutCreateSchema(OrderCreateSchema):
+    pizzas: List[PizzaBatchItemCreateSchema] = []
+    beverages: List[OrderBeverageQuantityCreateSchema] = []
+
+
+class OrderCheckoutSchema(OrderSchema):
+    price: decimal.Decimal
+    pizzas: List[PizzaSchema]
+    beverages: List[OrderBeverageQuantityCreateSchema]
@@ -1,31 +1,13 @@
 import uuid
+from typing import Dict, Optional
 
-from sqlalchemy.orm import Session
-
-import app.api.v1.endpoints.beverage.crud as beverage_crud
+from app.api.v1.endpoints.order.stock_logic.stock_engine import StockDeltas, new_stock_deltas
 from app.database.models import Beverage
 
 
-def beverage_is_available(beverage_id: uuid.UUID, amount: int, db: Session):
-    # Get Beverage
-    beverage = beverage_crud.get_beverage_by_id(beverage_id, db)
-    # Check if Beverage exists
-    if beverage:
-        # If there is enough stock return true. Stock CAN be zero
-        return beverage.stock >= amount
-    else:
-        return False
-
-
-def change_stock_of_beverage(beverage_id: uuid.UUID, change_amount: int, db: Session):
-    # Get Beverage
-    beverage = db.query(Beverage).filter(Beverage.id == beverage_id).first()
-
-    # Check if Beverage exists and if Stock is not getting smaller than zero
-    if beverage and beverage.stock + change_amount >= 0:
-        setattr(beverage, 'stock', beverage.stock + change_amount)
-        db.commit()
-        db.refresh(beverage)
-        return True
-
-    return False
+def get_stock_deltas_of_beverages(beverage_quantities: Dict[uuid.UUID, int], deltas: Optional[StockDeltas] = None):
+    if deltas is None:
+        deltas = new_stock_deltas()
+    for beverage_id, amount in beverage_quantities.items():
+        deltas[Beverage][beverage_id] -= amount
+    return deltas
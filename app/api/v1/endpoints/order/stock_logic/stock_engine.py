@@ -0,0 +1,65 @@
+import uuid
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, Set, Tuple
+
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+import app.api.v1.endpoints.order.stock_logic.stock_stripes as stock_stripes
+from app.exceptions.stock_error import OutOfStockError
+
+# Signed stock changes per ingredient model (Dough, Topping, Sauce, Beverage) and ingredient id
+StockDeltas = DefaultDict[type, DefaultDict[uuid.UUID, int]]
+
+
+def new_stock_deltas() -> StockDeltas:
+    return defaultdict(lambda: defaultdict(int))
+
+
+def apply_stock_deltas(deltas: StockDeltas, db: Session) -> Dict[type, Set[uuid.UUID]]:
+    # One guarded UPDATE per table: a row is only changed if its stock stays >= 0 (IN_STOCK).
+    # Nothing is committed here, the caller rolls back on OutOfStockError.
+    # An unknown id fails like a short one, whatever the sign of its delta. Returns the ids of the changed rows.
+    shortages: List[Tuple[str, uuid.UUID]] = []
+    changed_ids: Dict[type, Set[uuid.UUID]] = {}
+    for model, amounts in deltas.items():
+        changes: Dict[uuid.UUID, int] = {ingredient_id: delta for ingredient_id, delta in amounts.items() if delta}
+        if not changes:
+            continue
+
+        # Striped ingredients take their stock from one stripe, their own row is left alone
+        striped_ids: Set[uuid.UUID] = set()
+        if stock_stripes.STOCK_STRIPES:
+            for ingredient_id in stock_stripes.get_striped_ids(model, changes, db):
+                change = changes.pop(ingredient_id)
+                if stock_stripes.apply_striped_delta(model, ingredient_id, change, db):
+                    striped_ids.add(ingredient_id)
+                else:
+                    shortages.append((model.__tablename__, ingredient_id))
+        changed_ids[model] = striped_ids
+        if not changes:
+            continue
+
+        delta = case(changes, value=model.id)
+        values = {'stock': model.stock + delta}
+        version = model.__mapper__.version_id_col
+        if version is not None:
+            # Entities loaded before this UPDATE are outdated now, flushing them must fail
+            values[version.name] = version + 1
+        result = db.execute(update(model)
+                            .where(model.id.in_(changes), model.stock + delta >= 0)
+                            .values(**values)
+                            .returning(model.id)
+                            .execution_options(synchronize_session=False))
+        updated_ids = set(result.scalars())
+        changed_ids[model] |= updated_ids
+
+        shortages.extend((model.__tablename__, ingredient_id) for ingredient_id in changes
+                         if ingredient_id not in updated_ids)
+
+    if shortages:
+        raise OutOfStockError('Not enough stock of {}'.format(
+            ', '.join('{} with id {}'.format(table, ingredient_id) for table, ingredient_id in shortages)),
+            shortages)
+
+    return changed_ids
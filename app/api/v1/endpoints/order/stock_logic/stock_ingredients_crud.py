@@ -1,39 +1,55 @@
-from sqlalchemy.orm import Session
-
-from app.database.models import PizzaType
-
-
-def ingredients_are_available(pizza_type: PizzaType):
-    if pizza_type.dough.stock == 0:
-        return False
-
-    for topping_quantity in pizza_type.toppings:
-        if topping_quantity.topping.stock < topping_quantity.quantity:
-            return False
-
-    for sauce_quantity in pizza_type.sauces:
-        if sauce_quantity.sauce.stock < sauce_quantity.quantity:
-            return False
+import uuid
+from typing import Dict, Optional
 
-    return True
-
-
-def reduce_stock_of_ingredients(pizza_type: PizzaType, db: Session):
-    pizza_type.dough.stock -= 1
-    for topping_quantity in pizza_type.toppings:
-        topping_quantity.topping.stock -= topping_quantity.quantity
-    for sauce_quantity in pizza_type.sauces:
-        sauce_quantity.sauce.stock -= sauce_quantity.quantity
-
-    db.commit()
-
-
-def increase_stock_of_ingredients(pizza_type: PizzaType, db: Session):
-    pizza_type.dough.stock += 1
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
 
-    for topping_quantity in pizza_type.toppings:
-        topping_quantity.topping.stock += topping_quantity.quantity
-    for sauce_quantity in pizza_type.sauces:
-        sauce_quantity.sauce.stock += sauce_quantity.quantity
+from app.api.v1.endpoints.order.stock_logic.stock_engine import StockDeltas, new_stock_deltas
+from app.api.v1.endpoints.pizza_type.recipe import get_recipe_of_pizza_type
+from app.database.models import (
+    Dough,
+    PizzaType,
+    PizzaTypeSauceQuantity,
+    PizzaTypeToppingQuantity,
+    Sauce,
+    Topping,
+    get_stock_column,
+)
+
+
+def get_producible_counts_of_pizza_types(db: Session) -> Dict[uuid.UUID, int]:
+    # Every ingredient limits its pizza types to stock // quantity, a pizza type is limited by its scarcest one.
+    # One statement for all pizza types, so the counts always reflect the current stock of every process.
+    limits = union_all(
+        select(PizzaType.id.label('pizza_type_id'), get_stock_column(Dough).label('limit'))
+        .join(Dough, PizzaType.dough_id == Dough.id),
+        select(PizzaTypeToppingQuantity.pizza_type_id,
+               get_stock_column(Topping) // PizzaTypeToppingQuantity.quantity)
+        .join(Topping, PizzaTypeToppingQuantity.topping_id == Topping.id)
+        .where(PizzaTypeToppingQuantity.quantity > 0),
+        select(PizzaTypeSauceQuantity.pizza_type_id,
+               get_stock_column(Sauce) // PizzaTypeSauceQuantity.quantity)
+        .join(Sauce, PizzaTypeSauceQuantity.sauce_id == Sauce.id)
+        .where(PizzaTypeSauceQuantity.quantity > 0),
+    ).subquery()
+    return dict(db.execute(select(limits.c.pizza_type_id, func.min(limits.c.limit))
+                           .group_by(limits.c.pizza_type_id)).all())
+
+
+def get_stock_deltas_of_pizza_type(pizza_type: PizzaType, count: int, db: Session):
+    deltas = new_stock_deltas()
+    for model, ingredient_id, quantity in get_recipe_of_pizza_type(pizza_type.id, db) or ():
+        deltas[model][ingredient_id] += quantity * count
+    return deltas
+
+
+def get_stock_deltas_of_pizza_types(pizza_type_counts: Dict[uuid.UUID, int], db: Session,
+                                    deltas: Optional[StockDeltas] = None):
+    # Sum up the demand of all pizzas per ingredient, so every table is updated once
+    if deltas is None:
+        deltas = new_stock_deltas()
+    for pizza_type_id, count in pizza_type_counts.items():
+        for model, ingredient_id, quantity in get_recipe_of_pizza_type(pizza_type_id, db) or ():
+            deltas[model][ingredient_id] -= quantity * count
+    return deltas
 
-    db.commit()
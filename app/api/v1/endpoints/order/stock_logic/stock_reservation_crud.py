@@ -0,0 +1,244 @@
+import datetime
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import app.api.v1.endpoints.order.stock_logic.stock_beverage_crud as stock_beverage_crud
+import app.api.v1.endpoints.order.stock_logic.stock_ingredients_crud as stock_ingredients_crud
+from app.api.v1.endpoints.order.stock_logic.stock_engine import StockDeltas, apply_stock_deltas, new_stock_deltas
+from app.database.models import (
+    Beverage,
+    Dough,
+    Order,
+    OrderBeverageQuantity,
+    Pizza,
+    PizzaType,
+    Sauce,
+    StockReservation,
+    Topping,
+)
+from app.exceptions.stock_error import OutOfStockError, ReservationExpiredError
+
+# The stock of a TRANSMITTED order is taken when an item is added and recorded as a hold of the order.
+# Holds expire at Order.reserved_until, then release_expired_holds gives their stock back in bulk.
+# Confirming the order drops its holds, its stock stays taken for good and reserved_until becomes NULL.
+
+# Seconds the stock of a TRANSMITTED order stays held after the last item was added
+STOCK_RESERVATION_TTL = float(os.environ.get('STOCK_RESERVATION_TTL', '900'))
+# Orders released by one sweep
+STOCK_RESERVATION_SWEEP_SIZE = int(os.environ.get('STOCK_RESERVATION_SWEEP_SIZE', '500'))
+
+INGREDIENT_MODELS = {model.__tablename__: model for model in (Dough, Topping, Sauce, Beverage)}
+
+
+def get_reservation_deadline():
+    # Computed by the database, so every process uses the same clock
+    return func.now() + datetime.timedelta(seconds=STOCK_RESERVATION_TTL)
+
+
+def hold_stock(order_id: uuid.UUID, deltas: StockDeltas, db: Session):
+    # Takes the stock of deltas (negative amounts) for the order, as holds while the order is not confirmed.
+    # Nothing is committed here, the caller rolls back on OutOfStockError.
+    order = _lock_order(order_id, db)
+    if order is None or order.reserved_until is None:
+        apply_stock_deltas(deltas, db)
+        return
+
+    if (order.pizza_count or order.beverage_count) and not _get_holds(order_id, db):
+        # The sweeper gave back the stock of the items already in the order, it is taken again before the new ones
+        store_holds(order_id, _take_stock_of_order_again(order_id, db), db)
+    apply_stock_deltas(deltas, db)
+    store_holds(order_id, deltas, db)
+
+
+def store_holds(order_id: uuid.UUID, deltas: StockDeltas, db: Session):
+    # Adds the taken stock to the holds of the order and extends them. Committed by the caller.
+    holds = [{'order_id': order_id, 'ingredient_table': model.__tablename__, 'ingredient_id': ingredient_id,
+              'quantity': -delta}
+             for model, amounts in deltas.items()
+             for ingredient_id, delta in amounts.items() if delta < 0]
+    if holds:
+        statement = insert(StockReservation.__table__).values(holds)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['order_id', 'ingredient_table', 'ingredient_id'],
+            set_={'quantity': StockReservation.__table__.c.quantity + statement.excluded.quantity}))
+    db.execute(update(Order)
+               .where(Order.id == order_id)
+               .values(reserved_until=get_reservation_deadline())
+               .execution_options(synchronize_session=False))
+
+
+def release_stock(order_id: uuid.UUID, deltas: StockDeltas, db: Session):
+    # Gives back the stock of deltas (positive amounts) when items leave the order. An unconfirmed order only
+    # gets back what it still holds, the rest was given back by the sweeper already. Committed by the caller.
+    order = _lock_order(order_id, db)
+    if order is not None and order.reserved_until is not None:
+        deltas = _release_holds(order_id, deltas, db)
+    apply_stock_deltas(deltas, db)
+
+
+def release_stock_of_order(order_id: uuid.UUID, db: Session):
+    # Gives back the stock of all items with one UPDATE per ingredient table, before the order is deleted.
+    # Committed by the caller.
+    order = _lock_order(order_id, db)
+    if order is None:
+        return
+    if order.reserved_until is not None:
+        deltas = _delete_holds(StockReservation.order_id == order_id, db)
+    else:
+        deltas = _negate(get_stock_deltas_of_order(order_id, db))
+    apply_stock_deltas(deltas, db)
+
+
+def confirm_holds(order_id: uuid.UUID, db: Session):
+    # Turns the holds of the order into real decrements: the stock stays taken and the holds are dropped.
+    # If the sweeper gave the stock back already it is taken again, which raises ReservationExpiredError once it is
+    # gone. Committed by the caller.
+    order = _lock_order(order_id, db)
+    if order is None or order.reserved_until is None:
+        return
+
+    dropped = db.execute(delete(StockReservation)
+                         .where(StockReservation.order_id == order_id)
+                         .returning(StockReservation.ingredient_id)
+                         .execution_options(synchronize_session=False)).all()
+    if not dropped and (order.pizza_count or order.beverage_count):
+        _take_stock_of_order_again(order_id, db)
+    db.execute(update(Order)
+               .where(Order.id == order_id)
+               .values(reserved_until=None)
+               .execution_options(synchronize_session=False))
+
+
+def release_expired_holds(db: Session, limit: int = STOCK_RESERVATION_SWEEP_SIZE) -> List[uuid.UUID]:
+    # Gives back the stock of up to limit orders whose holds expired, with one UPDATE per ingredient table.
+    # Orders locked by a concurrent change are skipped until the next sweep. Committed by the caller.
+    order_ids = db.scalars(select(Order.id)
+                           .where(Order.reserved_until < func.now(),
+                                  Order.id.in_(select(StockReservation.order_id)))
+                           .order_by(Order.reserved_until)
+                           .limit(limit)
+                           .with_for_update(skip_locked=True)).all()
+    if order_ids:
+        apply_stock_deltas(_delete_holds(StockReservation.order_id.in_(order_ids), db), db)
+    return order_ids
+
+
+def hold_stock_of_pizza(order_id: uuid.UUID, pizza_type: PizzaType, db: Session):
+    _change_and_commit(hold_stock, order_id,
+                       stock_ingredients_crud.get_stock_deltas_of_pizza_type(pizza_type, -1, db), db)
+
+
+def release_stock_of_pizza(order_id: uuid.UUID, pizza_type: PizzaType, db: Session):
+    _change_and_commit(release_stock, order_id,
+                       stock_ingredients_crud.get_stock_deltas_of_pizza_type(pizza_type, 1, db), db)
+
+
+def change_stock_of_beverage_in_order(order_id: uuid.UUID, beverage_id: uuid.UUID, change_amount: int,
+                                      db: Session):
+    deltas = new_stock_deltas()
+    deltas[Beverage][beverage_id] += change_amount
+
+    # The update only happens if the Stock is not getting smaller than zero
+    try:
+        _change_and_commit(hold_stock if change_amount < 0 else release_stock, order_id, deltas, db)
+    except ReservationExpiredError:
+        raise
+    except OutOfStockError:
+        return False
+    return True
+
+
+def get_stock_deltas_of_order(order_id: uuid.UUID, db: Session, deltas: Optional[StockDeltas] = None):
+    # The demand of all items of the order as negative amounts
+    pizza_type_counts = dict(db.execute(
+        select(Pizza.pizza_type_id, func.count())
+        .where(Pizza.order_id == order_id)
+        .group_by(Pizza.pizza_type_id)).all())
+    beverage_quantities = dict(db.execute(
+        select(OrderBeverageQuantity.beverage_id, OrderBeverageQuantity.quantity)
+        .where(OrderBeverageQuantity.order_id == order_id)).all())
+    deltas = stock_ingredients_crud.get_stock_deltas_of_pizza_types(pizza_type_counts, db, deltas)
+    return stock_beverage_crud.get_stock_deltas_of_beverages(beverage_quantities, deltas)
+
+
+def _lock_order(order_id: uuid.UUID, db: Session):
+    # Serializes the stock changes of one order with each other and with the sweeper
+    return db.execute(select(Order.reserved_until, Order.pizza_count, Order.beverage_count)
+                      .where(Order.id == order_id)
+                      .with_for_update()).first()
+
+
+def _take_stock_of_order_again(order_id: uuid.UUID, db: Session) -> StockDeltas:
+    # Takes the stock of all items of an order whose holds were given back by the sweeper
+    deltas = get_stock_deltas_of_order(order_id, db)
+    try:
+        apply_stock_deltas(deltas, db)
+    except OutOfStockError as error:
+        raise ReservationExpiredError(error.shortages)
+    return deltas
+
+
+def _get_holds(order_id: uuid.UUID, db: Session) -> Dict[Tuple[type, uuid.UUID], int]:
+    return {(INGREDIENT_MODELS[table], ingredient_id): quantity
+            for table, ingredient_id, quantity in db.execute(
+                select(StockReservation.ingredient_table, StockReservation.ingredient_id, StockReservation.quantity)
+                .where(StockReservation.order_id == order_id))}
+
+
+def _release_holds(order_id: uuid.UUID, deltas: StockDeltas, db: Session) -> StockDeltas:
+    holds = _get_holds(order_id, db)
+    released = new_stock_deltas()
+    for model, amounts in deltas.items():
+        for ingredient_id, amount in amounts.items():
+            held = holds.get((model, ingredient_id), 0)
+            if amount > 0 and held:
+                released[model][ingredient_id] = min(amount, held)
+                holds[(model, ingredient_id)] = held - released[model][ingredient_id]
+
+    emptied = [(model.__tablename__, ingredient_id) for (model, ingredient_id), held in holds.items() if not held]
+    if emptied:
+        db.execute(delete(StockReservation)
+                   .where(StockReservation.order_id == order_id,
+                          tuple_(StockReservation.ingredient_table, StockReservation.ingredient_id).in_(emptied))
+                   .execution_options(synchronize_session=False))
+    changed = [{'order_id': order_id, 'ingredient_table': model.__tablename__, 'ingredient_id': ingredient_id,
+                'quantity': holds[(model, ingredient_id)]}
+               for model, amounts in released.items()
+               for ingredient_id in amounts if holds[(model, ingredient_id)]]
+    if changed:
+        db.execute(update(StockReservation), changed)
+    return released
+
+
+def _delete_holds(where, db: Session) -> StockDeltas:
+    # Deletes the matching holds and returns their stock as positive amounts
+    deltas = new_stock_deltas()
+    for table, ingredient_id, quantity in db.execute(
+            delete(StockReservation)
+            .where(where)
+            .returning(StockReservation.ingredient_table, StockReservation.ingredient_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)):
+        deltas[INGREDIENT_MODELS[table]][ingredient_id] += quantity
+    return deltas
+
+
+def _negate(deltas: StockDeltas) -> StockDeltas:
+    negated = new_stock_deltas()
+    for model, amounts in deltas.items():
+        for ingredient_id, delta in amounts.items():
+            negated[model][ingredient_id] = -delta
+    return negated
+
+
+def _change_and_commit(change, order_id: uuid.UUID, deltas: StockDeltas, db: Session):
+    try:
+        change(order_id, deltas, db)
+    except OutOfStockError:
+        db.rollback()
+        raise
+    db.commit()
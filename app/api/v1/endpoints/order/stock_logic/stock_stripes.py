@@ -0,0 +1,161 @@
+import uuid
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.database import models
+from app.database.models import STRIPED_MODELS, StockStripe
+
+# Stripes of a hot ingredient, 0 turns striping off. Without stripes every order updates the ingredient's own row
+# and concurrent orders queue on its lock, with K stripes up to K of them take stock at the same time.
+# Set in the models, they only map the stock of the stripes with striping on.
+STOCK_STRIPES = models.STOCK_STRIPES
+
+STRIPED_TABLES = {model.__tablename__: model for model in STRIPED_MODELS}
+
+
+def get_striped_ids(model, ingredient_ids: Iterable[uuid.UUID], db: Session) -> Set[uuid.UUID]:
+    return set(db.scalars(select(StockStripe.ingredient_id)
+                          .where(StockStripe.ingredient_table == model.__tablename__,
+                                 StockStripe.ingredient_id.in_(ingredient_ids))
+                          .distinct()))
+
+
+def get_striped_ingredients(db: Session) -> List[Tuple[type, uuid.UUID]]:
+    return [(STRIPED_TABLES[table], ingredient_id) for table, ingredient_id in db.execute(
+        select(StockStripe.ingredient_table, StockStripe.ingredient_id).distinct())]
+
+
+def apply_striped_delta(model, ingredient_id: uuid.UUID, delta: int, db: Session) -> bool:
+    # Returns False if the row and all stripes together have less stock than the delta takes.
+    # Nothing is committed here.
+    return _change_stripe(model, ingredient_id, delta, db, skip_locked=True) \
+        or _change_stripe(model, ingredient_id, delta, db, skip_locked=False) \
+        or _change_all_stripes(model, ingredient_id, delta, db)
+
+
+def stripe_stock(model, ingredient_id: uuid.UUID, stripes: int, db: Session):
+    # Creates the stripes 0 .. stripes - 1 without stock, the stock of surplus stripes goes back to the row.
+    # Committed by the caller, rebalance_stripes moves the stock into the new stripes.
+    surplus_stripes = delete(StockStripe.__table__) \
+        .where(*_stripes_of(model, ingredient_id), StockStripe.stripe >= stripes) \
+        .returning(StockStripe.stock) \
+        .cte()
+    surplus = db.scalar(select(func.sum(surplus_stripes.c.stock)))
+    if surplus:
+        _change_stock_of_row(model, ingredient_id, surplus, db)
+    if stripes:
+        db.execute(insert(StockStripe.__table__)
+                   .values([{'ingredient_table': model.__tablename__, 'ingredient_id': ingredient_id,
+                             'stripe': stripe, 'stock': 0} for stripe in range(stripes)])
+                   .on_conflict_do_nothing())
+
+
+def unstripe_stock(model, ingredient_id: uuid.UUID, db: Session):
+    # Gives the stock of all stripes back to the row. Committed by the caller.
+    stripe_stock(model, ingredient_id, 0, db)
+
+
+def rebalance_stripes(model, ingredient_id: uuid.UUID, db: Session) -> bool:
+    # Spreads the stock of the row and the stripes evenly over the stripes. Locked stripes are left alone,
+    # so a rebalance never waits for an order. Committed by the caller.
+    stripes = db.execute(select(StockStripe.stripe, StockStripe.stock)
+                         .where(*_stripes_of(model, ingredient_id))
+                         .order_by(StockStripe.stripe)
+                         .with_for_update(skip_locked=True)).all()
+    if not stripes:
+        return False
+    row_stock = db.scalar(select(model.stock).where(model.id == ingredient_id).with_for_update(skip_locked=True))
+
+    share, rest = divmod(sum(stripe.stock for stripe in stripes) + (row_stock or 0), len(stripes))
+    db.execute(update(StockStripe), [{'ingredient_table': model.__tablename__, 'ingredient_id': ingredient_id,
+                                      'stripe': stripe.stripe, 'stock': share + (index < rest)}
+                                     for index, stripe in enumerate(stripes)])
+    if row_stock:
+        _change_stock_of_row(model, ingredient_id, -row_stock, db)
+    return True
+
+
+def drop_stripes_of_deleted_ingredients(db: Session) -> int:
+    # Deleting an ingredient leaves its stripes behind, one DELETE per table. Committed by the caller.
+    dropped = 0
+    for table, model in STRIPED_TABLES.items():
+        dropped += db.execute(delete(StockStripe)
+                              .where(StockStripe.ingredient_table == table,
+                                     StockStripe.ingredient_id.not_in(select(model.id)))
+                              .execution_options(synchronize_session=False)).rowcount
+    return dropped
+
+
+def _stripes_of(model, ingredient_id: uuid.UUID):
+    return StockStripe.ingredient_table == model.__tablename__, StockStripe.ingredient_id == ingredient_id
+
+
+def _change_stripe(model, ingredient_id: uuid.UUID, delta: int, db: Session, skip_locked: bool) -> bool:
+    # A random stripe with enough stock, preferably one that no other transaction holds. Once all are held,
+    # the order only queues on one of them, so K stripes serve K orders at a time.
+    stripe = select(StockStripe.stripe) \
+        .where(*_stripes_of(model, ingredient_id), StockStripe.stock + delta >= 0) \
+        .order_by(func.random()) \
+        .limit(1)
+    if skip_locked:
+        stripe = stripe.with_for_update(skip_locked=True)
+    # A stripe that fails the recheck after a concurrent change stays locked, rolling back the savepoint unlocks it
+    # before the next attempt waits, otherwise two orders could wait for each other's stray locks
+    savepoint = db.begin_nested()
+    result = db.execute(update(StockStripe)
+                        .where(*_stripes_of(model, ingredient_id), StockStripe.stripe == stripe.scalar_subquery(),
+                               StockStripe.stock + delta >= 0)
+                        .values(stock=StockStripe.stock + delta)
+                        .execution_options(synchronize_session=False))
+    if result.rowcount == 1:
+        savepoint.commit()
+        return True
+    savepoint.rollback()
+    return False
+
+
+def _change_all_stripes(model, ingredient_id: uuid.UUID, delta: int, db: Session) -> bool:
+    # Waits for the row and all stripes and takes the stock wherever it is, rare once the stripes are rebalanced
+    row_stock = db.scalar(select(model.stock).where(model.id == ingredient_id).with_for_update())
+    if row_stock is None:
+        return False
+    if delta > 0:
+        _change_stock_of_row(model, ingredient_id, delta, db)
+        return True
+
+    stripes = db.execute(select(StockStripe.stripe, StockStripe.stock)
+                         .where(*_stripes_of(model, ingredient_id))
+                         .order_by(StockStripe.stripe)
+                         .with_for_update()).all()
+    missing = -delta
+    if row_stock + sum(stripe.stock for stripe in stripes) < missing:
+        return False
+
+    if row_stock:
+        _change_stock_of_row(model, ingredient_id, -min(row_stock, missing), db)
+        missing -= min(row_stock, missing)
+    changed = []
+    for stripe in stripes:
+        if not missing:
+            break
+        taken = min(stripe.stock, missing)
+        missing -= taken
+        changed.append({'ingredient_table': model.__tablename__, 'ingredient_id': ingredient_id,
+                        'stripe': stripe.stripe, 'stock': stripe.stock - taken})
+    if changed:
+        db.execute(update(StockStripe), changed)
+    return True
+
+
+def _change_stock_of_row(model, ingredient_id: uuid.UUID, delta: int, db: Session):
+    values = {'stock': model.stock + delta}
+    version = model.__mapper__.version_id_col
+    if version is not None:
+        values[version.name] = version + 1
+    db.execute(update(model)
+               .where(model.id == ingredient_id)
+               .values(**values)
+               .execution_options(synchronize_session=False))
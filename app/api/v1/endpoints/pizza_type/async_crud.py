@@ -0,0 +1,16 @@
+import uuid
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.models import PizzaType
+
+
+async def get_pizza_type_by_id(pizza_type_id: uuid.UUID, db: AsyncSession):
+    entity = await db.scalar(select(PizzaType).where(PizzaType.id == pizza_type_id))
+    return entity
+
+
+async def get_all_pizza_types(db: AsyncSession):
+    entities = (await db.scalars(select(PizzaType))).all()
+    logging.info('Retrieved all pizza types, count: {}'.format(len(entities)))
+    return entities
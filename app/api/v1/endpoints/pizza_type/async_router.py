@@ -0,0 +1,32 @@
+import uuid
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.api.v1.endpoints.pizza_type.async_crud as pizza_type_async_crud
+from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeSchema
+from app.api.v1.catalog_etag import catalog_not_modified_async
+from app.database.connection import get_async_db
+from app.database.models import PizzaType
+
+router = APIRouter()
+
+
+@router.get('', response_model=List[PizzaTypeSchema], tags=['pizza_type'])
+async def get_all_pizza_types(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch all pizza types')
+    not_modified = await catalog_not_modified_async(PizzaType, request, response, db)
+    if not_modified:
+        return not_modified
+    return await pizza_type_async_crud.get_all_pizza_types(db)
+
+
+@router.get('/{pizza_type_id}', response_model=PizzaTypeSchema, tags=['pizza_type'])
+async def get_pizza_type(pizza_type_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch pizza type with ID {}'.format(pizza_type_id))
+    pizza_type = await pizza_type_async_crud.get_pizza_type_by_id(pizza_type_id, db)
+
+    if not pizza_type:
+        logging.error('Pizza type with ID {} not found'.format(pizza_type_id))
+        raise HTTPException(status_code=404)
+    return pizza_type
@@ -1,10 +1,13 @@
 import logging
 import uuid
+from typing import List
 from sqlalchemy.orm import Session
 from app.api.v1.endpoints.pizza_type.schemas import \
     PizzaTypeCreateSchema, \
     PizzaTypeToppingQuantityCreateSchema, \
     PizzaTypeSauceQuantityCreateSchema
+from app.api.v1.endpoints.pizza_type.recipe import rebuild_recipe_of_pizza_type, recipe_cache
+from app.database.catalog_cache import catalog_cache
 from app.database.models import PizzaType, PizzaTypeToppingQuantity, PizzaTypeSauceQuantity
 
 
@@ -12,18 +15,25 @@ def create_pizza_type(schema: PizzaTypeCreateSchema, db: Session):
     entity = PizzaType(**schema.dict())
     db.add(entity)
     db.commit()
+    catalog_cache.invalidate(PizzaType)
     logging.info('Pizza type created with name {}'.format(entity.name))
     return entity
 
 
 def get_pizza_type_by_id(pizza_type_id: uuid.UUID, db: Session):
-    entity = db.query(PizzaType).filter(PizzaType.id == pizza_type_id).first()
+    entity = catalog_cache.get(PizzaType, 'id', pizza_type_id, db)
     logging.info('Pizza type retrieved with id {}'.format(pizza_type_id))
     return entity
 
 
+def get_pizza_types_by_ids(pizza_type_ids: List[uuid.UUID], db: Session):
+    entities = db.query(PizzaType).filter(PizzaType.id.in_(pizza_type_ids)).all()
+    logging.info('Retrieved {} of {} pizza types by id'.format(len(entities), len(pizza_type_ids)))
+    return entities
+
+
 def get_pizza_type_by_name(pizza_type_name: str, db: Session):
-    entity = db.query(PizzaType).filter(PizzaType.name == pizza_type_name).first()
+    entity = catalog_cache.get(PizzaType, 'name', pizza_type_name, db)
     logging.info('Pizza type retrieved with name {}'.format(pizza_type_name))
     return entity
 
@@ -38,6 +48,8 @@ def update_pizza_type(pizza_type: PizzaType, changed_pizza_type: PizzaTypeCreate
     for key, value in changed_pizza_type.dict().items():
         setattr(pizza_type, key, value)
     db.commit()
+    catalog_cache.invalidate(PizzaType)
+    recipe_cache.invalidate(pizza_type.id)
     db.refresh(pizza_type)
     logging.info('Pizza type updated with id {}'.format(pizza_type.id))
     return pizza_type
@@ -48,6 +60,8 @@ def delete_pizza_type_by_id(pizza_type_id: uuid.UUID, db: Session):
     if entity:
         db.delete(entity)
         db.commit()
+        catalog_cache.invalidate(PizzaType)
+        recipe_cache.invalidate(pizza_type_id)
         logging.info('Pizza type deleted with id {}'.format(pizza_type_id))
     else:
         logging.warning('Attempted to delete pizza type with id {} but pizza type not found'.format(pizza_type_id))
@@ -57,6 +71,7 @@ def create_topping_quantity(pizza_type: PizzaType, schema: PizzaTypeToppingQuant
     entity = PizzaTypeToppingQuantity(**schema.dict())
     pizza_type.toppings.append(entity)
     db.commit()
+    rebuild_recipe_of_pizza_type(pizza_type.id, db)
     db.refresh(pizza_type)
     logging.info('Topping quantity created for pizza type with id {}'.format(pizza_type.id))
     return entity
@@ -88,6 +103,7 @@ def create_sauce_quantity(
     entity = PizzaTypeSauceQuantity(**schema.dict())
     pizza_type.sauces.append(entity)
     db.commit()
+    rebuild_recipe_of_pizza_type(pizza_type.id, db)
     logging.info(f'Created new sauce quantity with ID: {entity.sauce_id} for pizza type {pizza_type.name}')
     db.refresh(pizza_type)
     return entity
@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database.catalog_cache import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL
+from app.database.models import Dough, PizzaType, PizzaTypeSauceQuantity, PizzaTypeToppingQuantity, Sauce, Topping
+from app.database.table_version import get_transaction_table_version
+
+# Ingredients of one pizza as (ingredient model, ingredient id, quantity), the dough counts once
+Recipe = Tuple[Tuple[type, uuid.UUID, int], ...]
+
+
+# Tables a recipe is compiled from, the dough is a column of the pizza type
+RECIPE_MODELS = (PizzaType, PizzaTypeToppingQuantity, PizzaTypeSauceQuantity)
+
+
+class RecipeCache:
+    """Compiled recipes by pizza type id, stored with the versions of the recipe tables they were compiled at.
+
+    A recipe is only served while the session's transaction sees the same versions, so stock changes never use a
+    recipe that another process changed since.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._recipes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pizza_type_id: uuid.UUID, db: Session) -> Optional[Recipe]:
+        versions = tuple(get_transaction_table_version(model, db) for model in RECIPE_MODELS)
+        with self._lock:
+            entry = self._recipes.get(pizza_type_id)
+            if entry and entry[1] == versions and entry[2] > time.monotonic():
+                self._recipes.move_to_end(pizza_type_id)
+                return entry[0]
+
+        recipe = compile_recipe(pizza_type_id, db)
+        if recipe is None:
+            return None
+        with self._lock:
+            self._recipes[pizza_type_id] = (recipe, versions, time.monotonic() + self.ttl)
+            self._recipes.move_to_end(pizza_type_id)
+            while len(self._recipes) > self.max_size:
+                self._recipes.popitem(last=False)
+        return recipe
+
+    def invalidate(self, pizza_type_id: uuid.UUID):
+        # The recipe is outdated by the write anyway, dropping it frees its slot
+        with self._lock:
+            self._recipes.pop(pizza_type_id, None)
+
+
+def compile_recipe(pizza_type_id: uuid.UUID, db: Session) -> Optional[Recipe]:
+    dough_id = db.scalar(select(PizzaType.dough_id).where(PizzaType.id == pizza_type_id))
+    if dough_id is None:
+        return None
+
+    toppings = db.execute(select(PizzaTypeToppingQuantity.topping_id, PizzaTypeToppingQuantity.quantity)
+                          .where(PizzaTypeToppingQuantity.pizza_type_id == pizza_type_id)).all()
+    sauces = db.execute(select(PizzaTypeSauceQuantity.sauce_id, PizzaTypeSauceQuantity.quantity)
+                        .where(PizzaTypeSauceQuantity.pizza_type_id == pizza_type_id)).all()
+    return ((Dough, dough_id, 1),) \
+        + tuple((Topping, topping_id, quantity) for topping_id, quantity in sorted(toppings)) \
+        + tuple((Sauce, sauce_id, quantity) for sauce_id, quantity in sorted(sauces))
+
+
+recipe_cache = RecipeCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+
+def get_recipe_of_pizza_type(pizza_type_id: uuid.UUID, db: Session) -> Optional[Recipe]:
+    return recipe_cache.get(pizza_type_id, db)
+
+
+def rebuild_recipe_of_pizza_type(pizza_type_id: uuid.UUID, db: Session) -> Optional[Recipe]:
+    recipe_cache.invalidate(pizza_type_id)
+    return recipe_cache.get(pizza_type_id, db)
@@ -1,7 +1,7 @@
 import logging
 import uuid
 from typing import List, TypeVar
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 import app.api.v1.endpoints.dough.crud as dough_crud
@@ -13,7 +13,9 @@ from app.api.v1.endpoints.pizza_type.schemas import (JoinedPizzaTypeQuantitySche
                                                      PizzaTypeCreateSchema, PizzaTypeToppingQuantityCreateSchema,
                                                      PizzaTypeSauceQuantityCreateSchema,
                                                      )
-from app.database.connection import SessionLocal
+from app.api.v1.catalog_etag import catalog_not_modified
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.database.models import PizzaType
 
 WITH_ID_NOT_FOUND = 'Pizza type with id {} not found'
 
@@ -28,9 +30,20 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @router.get('', response_model=List[PizzaTypeSchema], tags=['pizza_type'])
-def get_all_pizza_types(db: Session = Depends(get_db)):
+def get_all_pizza_types(request: Request, response: Response, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve all pizza types')
+    not_modified = catalog_not_modified(PizzaType, request, response, db)
+    if not_modified:
+        return not_modified
     pizza_types = pizza_type_crud.get_all_pizza_types(db)
     return pizza_types
 
@@ -83,7 +96,7 @@ def update_pizza_type(pizza_type_id: uuid.UUID, changed_pizza_type: PizzaTypeCre
 
 
 @router.get('/{pizza_type_id}', response_model=PizzaTypeSchema, tags=['pizza_type'])
-def get_pizza_type(pizza_type_id: uuid.UUID, db: Session = Depends(get_db)):
+def get_pizza_type(pizza_type_id: uuid.UUID, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve pizza type with id {}'.format(pizza_type_id))
     pizza_type = pizza_type_crud.get_pizza_type_by_id(pizza_type_id, db)
     if not pizza_type:
@@ -109,7 +122,7 @@ MyPyEitherItem = TypeVar('MyPyEitherItem', List[PizzaTypeToppingQuantityCreateSc
 
 
 @router.get('/{pizza_type_id}/toppings', response_model=MyPyEitherItem, tags=['pizza_type'])
-def get_pizza_type_toppings(pizza_type_id: uuid.UUID, response: Response, db: Session = Depends(get_db),
+def get_pizza_type_toppings(pizza_type_id: uuid.UUID, response: Response, db: Session = Depends(get_read_db),
                             join: bool = False):
     logging.info('GET request to retrieve toppings for pizza type id {}'.format(pizza_type_id))
     pizza_type = pizza_type_crud.get_pizza_type_by_id(pizza_type_id, db)
@@ -146,7 +159,7 @@ def create_pizza_type_topping(pizza_type_id: uuid.UUID, topping_quantity: PizzaT
 
 
 @router.get('/{pizza_type_id}/dough', response_model=DoughSchema, tags=['pizza_type'])
-def get_pizza_type_dough(pizza_type_id: uuid.UUID, response: Response, db: Session = Depends(get_db)):
+def get_pizza_type_dough(pizza_type_id: uuid.UUID, response: Response, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve dough for pizza type id {}'.format(pizza_type_id))
     pizza_type = pizza_type_crud.get_pizza_type_by_id(pizza_type_id, db)
     if not pizza_type:
@@ -164,7 +177,7 @@ def get_pizza_type_dough(pizza_type_id: uuid.UUID, response: Response, db: Sessi
 def get_pizza_type_sauces(
         pizza_type_id: uuid.UUID,
         response: Response,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         join: bool = False,
 ):
     pizza_type = pizza_type_crud.get_pizza_type_by_id(pizza_type_id, db)
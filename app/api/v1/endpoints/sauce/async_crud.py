@@ -0,0 +1,17 @@
+import uuid
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.endpoints.sauce.crud import SAUCE_LIST_COLUMNS
+from app.database.models import Sauce
+
+
+async def get_sauce_by_id(sauce_id: uuid.UUID, db: AsyncSession):
+    entity = await db.scalar(select(Sauce).where(Sauce.id == sauce_id))
+    return entity
+
+
+async def get_all_sauces(db: AsyncSession):
+    rows = (await db.execute(select(*SAUCE_LIST_COLUMNS))).all()
+    logging.info('Retrieved all sauces, count: {}'.format(len(rows)))
+    return rows
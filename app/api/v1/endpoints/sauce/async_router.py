@@ -0,0 +1,34 @@
+import uuid
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.api.v1.endpoints.sauce.async_crud as sauce_async_crud
+from app.api.v1.endpoints.sauce.schemas import SauceListItemSchema, SauceSchema
+from app.api.v1.catalog_etag import catalog_not_modified_async, get_row_etag
+from app.api.v1.row_json import rows_response
+from app.database.connection import get_async_db
+from app.database.models import Sauce
+
+router = APIRouter()
+
+
+@router.get('', response_model=List[SauceListItemSchema], tags=['sauce'])
+async def get_all_sauces(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch all sauces')
+    not_modified = await catalog_not_modified_async(Sauce, request, response, db)
+    if not_modified:
+        return not_modified
+    return rows_response(await sauce_async_crud.get_all_sauces(db), response)
+
+
+@router.get('/{sauce_id}', response_model=SauceSchema, tags=['sauce'])
+async def get_sauce(sauce_id: uuid.UUID, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch sauce with ID {}'.format(sauce_id))
+    sauce = await sauce_async_crud.get_sauce_by_id(sauce_id, db)
+
+    if not sauce:
+        logging.error('Sauce with ID {} not found'.format(sauce_id))
+        raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(sauce)
+    return sauce
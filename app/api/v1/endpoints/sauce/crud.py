@@ -1,9 +1,25 @@
+import json
 import logging
+import threading
 import uuid
+from typing import List, Optional, Tuple
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from app.api.v1.catalog_etag import get_etag
+from app.api.v1.row_json import encode_column_value
+from app.database.catalog_cache import catalog_cache
+from app.database.versioning import commit_if_unchanged
+from app.database.table_version import get_table_versions
+from app.database.upsert import upsert_by_name
 from app.database.models import Sauce
 from app.api.v1.endpoints.sauce.schemas import SauceCreateSchema, SauceListItemSchema, SauceSpiciness
 
+SAUCE_LIST_COLUMNS = tuple(getattr(Sauce, field) for field in SauceListItemSchema.__fields__)
+
+_grouped_lock = threading.Lock()
+# The sauces grouped by spiciness as (ETag, body), rebuilt once the ETag changes
+_grouped_sauces: Tuple[str, bytes] = ('', b'')
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -12,14 +28,23 @@ def create_sauce(schema: SauceCreateSchema, db: Session):
     entity = Sauce(**schema.dict())
     db.add(entity)
     db.commit()
+    catalog_cache.invalidate(Sauce)
     db.refresh(entity)
     logger.info('Sauce created with name {}'.format(entity.name))
     return entity
 
 
+def upsert_sauces(schemas: List[SauceCreateSchema], db: Session):
+    created, updated = upsert_by_name(Sauce, schemas, db)
+    db.commit()
+    catalog_cache.invalidate(Sauce)
+    logger.info('Sauces upserted, created: {}, updated: {}'.format(created, updated))
+    return created, updated
+
+
 def get_sauce_by_id(sauce_id: uuid.UUID, db: Session):
     logger.info('Fetching sauce by ID: {}'.format(sauce_id))
-    entity = db.query(Sauce).filter(Sauce.id == sauce_id).first()
+    entity = catalog_cache.get(Sauce, 'id', sauce_id, db)
     if entity:
         logger.info('Sauce found: {}'.format(entity.name))
     else:
@@ -29,7 +54,7 @@ def get_sauce_by_id(sauce_id: uuid.UUID, db: Session):
 
 def get_sauce_by_name(sauce_name: str, db: Session):
     logger.info('Fetching sauce by name: {}'.format(sauce_name))
-    entity = db.query(Sauce).filter(Sauce.name == sauce_name).first()
+    entity = catalog_cache.get(Sauce, 'name', sauce_name, db)
     if entity:
         logger.info('Sauce found: {}'.format(entity.name))
     else:
@@ -38,40 +63,32 @@ def get_sauce_by_name(sauce_name: str, db: Session):
 
 
 def get_all_sauces(db: Session):
-    logger.info('Fetching all sauces')
-    entities = db.query(Sauce).all()
-    logger.info('Found {} sauces'.format(len(entities)))
-    if entities:
-        return_entities = []
-        for entity in entities:
-            list_item_entity = SauceListItemSchema(
-                id=entity.id,
-                name=entity.name,
-                price=entity.price,
-                description=entity.description,
-                spiciness=entity.spiciness,
-            )
-            return_entities.append(list_item_entity)
-        return return_entities
-    return entities
-
-
-def update_sauce(sauce: Sauce, changed_sauce: SauceCreateSchema, db: Session):
+    # Plain rows of the listed columns, nothing is tracked in the session
+    rows = db.execute(select(*SAUCE_LIST_COLUMNS)).all()
+    logger.info('Found {} sauces'.format(len(rows)))
+    return rows
+
+
+def update_sauce(sauce: Sauce, changed_sauce: SauceCreateSchema, db: Session, version: Optional[int] = None):
     logger.info('Updating sauce : {}'.format(sauce.name))
-    for key, value in changed_sauce.dict().items():
-        setattr(sauce, key, value)
-    db.commit()
+
+    def apply_changes():
+        for key, value in changed_sauce.dict().items():
+            setattr(sauce, key, value)
+
+    commit_if_unchanged(sauce, apply_changes, db, version)
+    catalog_cache.invalidate(Sauce)
     db.refresh(sauce)
     logger.info('Sauce updated: {}'.format(sauce.name))
     return sauce
 
 
-def delete_sauce_by_id(sauce_id: uuid.UUID, db: Session):
+def delete_sauce_by_id(sauce_id: uuid.UUID, db: Session, version: Optional[int] = None):
     logger.info('Deleting sauce with ID: {}'.format(sauce_id))
     entity = get_sauce_by_id(sauce_id, db)
     if entity:
-        db.delete(entity)
-        db.commit()
+        commit_if_unchanged(entity, lambda: db.delete(entity), db, version)
+        catalog_cache.invalidate(Sauce)
         logger.info('Sauce with ID {} deleted'.format(sauce_id))
         return True
     else:
@@ -80,10 +97,29 @@ def delete_sauce_by_id(sauce_id: uuid.UUID, db: Session):
 
 
 def get_sauces_by_spiciness_level(sauce_spiciness: SauceSpiciness, db: Session):
-    logger.info('Fetching sauces with Spiciness level: {}'.format(sauce_spiciness))
-    entities = db.query(Sauce).filter(Sauce.spiciness == sauce_spiciness).all()
-    if entities:
-        logger.info('Found {} sauces with Spiciness level {}'.format(len(entities), sauce_spiciness))
-        return entities
-    logger.warning('No sauces found with Spiciness level {}'.format(sauce_spiciness))
-    return []
+    rows = db.execute(select(*SAUCE_LIST_COLUMNS).where(Sauce.spiciness == sauce_spiciness)).all()
+    logger.info('Found {} sauces with Spiciness level {}'.format(len(rows), sauce_spiciness))
+    return rows
+
+
+def get_grouped_sauces_etag(db: Session):
+    return get_etag('sauces-by-spiciness', get_table_versions((Sauce,), db))
+
+
+def get_sauces_grouped_by_spiciness(db: Session, etag: Optional[str] = None) -> Tuple[str, bytes]:
+    # The ETag is read again unless the caller already read it with db
+    global _grouped_sauces
+    etag = etag or get_grouped_sauces_etag(db)
+    with _grouped_lock:
+        if _grouped_sauces[0] == etag:
+            return _grouped_sauces
+
+    # Every level is present, levels without sauces get an empty list
+    groups = {spiciness.value: [] for spiciness in SauceSpiciness}
+    for row in db.execute(select(*SAUCE_LIST_COLUMNS).order_by(Sauce.spiciness, Sauce.name)):
+        groups[row.spiciness.value].append(row._asdict())
+    grouped_sauces = (etag, json.dumps(groups, default=encode_column_value).encode())
+    with _grouped_lock:
+        _grouped_sauces = grouped_sauces
+    logger.info('Sauces grouped by spiciness with ETag {}'.format(etag))
+    return grouped_sauces
@@ -1,14 +1,20 @@
 import uuid
-from typing import List
+from typing import Dict, List, Optional
 import logging
 
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 import app.api.v1.endpoints.sauce.crud as sauce_crud
 from app.api.v1.endpoints.sauce.schemas import SauceSchema, SauceCreateSchema, SauceListItemSchema, SauceSpiciness
-from app.database.connection import SessionLocal
+from app.api.v1.bulk import BulkUpsertSchema, bulk_payload
+from app.api.v1.catalog_etag import catalog_not_modified, get_cache_headers, get_if_match_version, get_row_etag, \
+    is_not_modified
+from app.api.v1.row_json import rows_response
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.database.models import Sauce
 
 router = APIRouter()
 
@@ -25,17 +31,29 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @router.get('', response_model=List[SauceListItemSchema], tags=['sauce'])
-def get_all_sauces(db: Session = Depends(get_db)):
+def get_all_sauces(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = catalog_not_modified(Sauce, request, response, db)
+    if not_modified:
+        return not_modified
     sauces = sauce_crud.get_all_sauces(db)
-    return sauces
+    return rows_response(sauces, response)
 
 
 @router.get('/{sauce_id}', response_model=SauceSchema, tags=['sauce'])
-def get_sauce(sauce_id: uuid.UUID, db: Session = Depends(get_db)):
+def get_sauce(sauce_id: uuid.UUID, response: Response, db: Session = Depends(get_read_db)):
     sauce = sauce_crud.get_sauce_by_id(sauce_id, db)
     if not sauce:
         raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(sauce)
     return sauce
 
 
@@ -50,18 +68,32 @@ def create_sauce(sauce: SauceCreateSchema, request: Request, db: Session = Depen
     return new_sauce
 
 
+@router.post('/bulk', response_model=BulkUpsertSchema, tags=['sauce'])
+def upsert_sauces(
+        sauces: List[SauceCreateSchema] = Depends(bulk_payload(SauceCreateSchema)),
+        db: Session = Depends(get_db),
+):
+    logging.info('Received request to upsert {} sauces'.format(len(sauces)))
+    created, updated = sauce_crud.upsert_sauces(sauces, db)
+    return BulkUpsertSchema(created=created, updated=updated)
+
+
 @router.put('/{sauce_id}', response_model=SauceSchema, tags=['sauce'])
 def update_sauce(sauce_id: uuid.UUID,
                  changed_sauce: SauceCreateSchema,
                  request: Request,
                  response: Response,
+                 if_match: Optional[str] = Header(None),
                  db: Session = Depends(get_db)):
     sauce_found = sauce_crud.get_sauce_by_id(sauce_id, db)
 
     if sauce_found:
         if sauce_found.name == changed_sauce.name:
-            sauce_crud.update_sauce(sauce_found, changed_sauce, db)
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+            try:
+                sauce_crud.update_sauce(sauce_found, changed_sauce, db, get_if_match_version(if_match))
+            except StaleDataError:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers={'ETag': get_row_etag(sauce_found)})
         else:
             sauce_name_found = sauce_crud.get_sauce_by_name(changed_sauce.name, db)
             if sauce_name_found:
@@ -77,17 +109,31 @@ def update_sauce(sauce_id: uuid.UUID,
 
 
 @router.delete('/{sauce_id}', response_class=Response, tags=['sauce'])
-def delete_sauce(sauce_id: uuid.UUID, db: Session = Depends(get_db)):
+def delete_sauce(sauce_id: uuid.UUID, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     sauce = sauce_crud.get_sauce_by_id(sauce_id, db)
     if not sauce:
         raise HTTPException(status_code=404, detail='Item not found')
 
-    sauce_crud.delete_sauce_by_id(sauce_id, db)
+    try:
+        sauce_crud.delete_sauce_by_id(sauce_id, db, get_if_match_version(if_match))
+    except StaleDataError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+@router.get('/spiciness/grouped', response_model=Dict[SauceSpiciness, List[SauceListItemSchema]], tags=['sauce'])
+def get_sauces_grouped_by_spiciness(request: Request, db: Session = Depends(get_read_db)):
+    logger.info('Received request to fetch all sauces grouped by spiciness')
+    headers = get_cache_headers(sauce_crud.get_grouped_sauces_etag(db))
+    if is_not_modified(headers['ETag'], request):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    etag, body = sauce_crud.get_sauces_grouped_by_spiciness(db, headers['ETag'])
+    return Response(content=body, media_type='application/json', headers=get_cache_headers(etag))
+
+
 @router.get('/spiciness/{spiciness}', response_model=List[SauceListItemSchema], tags=['sauce'])
-def get_sauces_by_spiciness(spiciness: SauceSpiciness, db: Session = Depends(get_db)):
+def get_sauces_by_spiciness(spiciness: SauceSpiciness, db: Session = Depends(get_read_db)):
     sauces = sauce_crud.get_sauces_by_spiciness_level(spiciness, db)
     if not sauces:
         raise HTTPException(status_code=404, detail='No sauces found with the specified Scoville level')
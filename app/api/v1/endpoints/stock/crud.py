@@ -0,0 +1,47 @@
+import logging
+import uuid
+from typing import List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas, new_stock_deltas
+from app.api.v1.endpoints.stock.schemas import StockDeltasSchema
+from app.database.models import Beverage, Dough, Sauce, Topping
+from app.exceptions.stock_error import OutOfStockError
+
+
+def change_stock_of_ingredients(schema: StockDeltasSchema, db: Session) -> List[Tuple[str, uuid.UUID]]:
+    """Applies all stock changes with one UPDATE per table, either all of them or none.
+
+    Returns (table name, id) of every unknown ingredient, raises OutOfStockError if a stock would drop below 0.
+    """
+    deltas = new_stock_deltas()
+    for model, changes in ((Dough, schema.doughs), (Topping, schema.toppings),
+                           (Sauce, schema.sauces), (Beverage, schema.beverages)):
+        for change in changes:
+            deltas[model][change.id] += change.delta
+
+    try:
+        changed_ids = apply_stock_deltas(deltas, db)
+    except OutOfStockError as error:
+        db.rollback()
+        # Unknown ingredients fail like short ones, a query tells them apart
+        unknown = get_unknown_ingredients(error.shortages, db)
+        if unknown:
+            return unknown
+        raise
+
+    db.commit()
+    logging.info('Stock changed of {} ingredients'.format(sum(len(ids) for ids in changed_ids.values())))
+    return []
+
+
+def get_unknown_ingredients(ingredients: List[Tuple[str, uuid.UUID]], db: Session):
+    unknown = []
+    for model in (Dough, Topping, Sauce, Beverage):
+        ids = {ingredient_id for table, ingredient_id in ingredients if table == model.__tablename__}
+        if ids:
+            unknown.extend((model.__tablename__, ingredient_id)
+                           for ingredient_id in ids - set(db.scalars(select(model.id).where(model.id.in_(ids)))))
+    return unknown
@@ -0,0 +1,36 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+
+import app.api.v1.endpoints.stock.crud as stock_crud
+from app.api.v1.endpoints.stock.schemas import StockDeltasSchema
+from app.database.connection import SessionLocal
+from app.exceptions.stock_error import OutOfStockError
+
+router = APIRouter()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.patch('', status_code=status.HTTP_204_NO_CONTENT, tags=['stock'])
+def change_stock(stock_deltas: StockDeltasSchema, db: Session = Depends(get_db)):
+    logging.info('Received request to change the stock: {}'.format(stock_deltas))
+    try:
+        unknown = stock_crud.change_stock_of_ingredients(stock_deltas, db)
+    except OutOfStockError as error:
+        logging.info(error.message)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=', '.join('{} with id {} not found'.format(table, ingredient_id)
+                             for table, ingredient_id in unknown))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,17 @@
+import uuid
+from typing import List
+
+from pydantic import BaseModel
+
+
+class StockDeltaSchema(BaseModel):
+    id: uuid.UUID
+    # Signed change of the stock, negative values take stock out
+    delta: int
+
+
+class StockDeltasSchema(BaseModel):
+    doughs: List[StockDeltaSchema] = []
+    toppings: List[StockDeltaSchema] = []
+    sauces: List[StockDeltaSchema] = []
+    beverages: List[StockDeltaSchema] = []
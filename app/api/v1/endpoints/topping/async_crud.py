@@ -0,0 +1,17 @@
+import uuid
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.endpoints.topping.crud import TOPPING_LIST_COLUMNS
+from app.database.models import Topping
+
+
+async def get_topping_by_id(topping_id: uuid.UUID, db: AsyncSession):
+    entity = await db.scalar(select(Topping).where(Topping.id == topping_id))
+    return entity
+
+
+async def get_all_toppings(db: AsyncSession):
+    rows = (await db.execute(select(*TOPPING_LIST_COLUMNS))).all()
+    logging.info('Retrieved all toppings, count: {}'.format(len(rows)))
+    return rows
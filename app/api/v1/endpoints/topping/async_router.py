@@ -0,0 +1,34 @@
+import uuid
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import app.api.v1.endpoints.topping.async_crud as topping_async_crud
+from app.api.v1.endpoints.topping.schemas import ToppingListItemSchema, ToppingSchema
+from app.api.v1.catalog_etag import catalog_not_modified_async, get_row_etag
+from app.api.v1.row_json import rows_response
+from app.database.connection import get_async_db
+from app.database.models import Topping
+
+router = APIRouter()
+
+
+@router.get('', response_model=List[ToppingListItemSchema], tags=['topping'])
+async def get_all_toppings(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch all toppings')
+    not_modified = await catalog_not_modified_async(Topping, request, response, db)
+    if not_modified:
+        return not_modified
+    return rows_response(await topping_async_crud.get_all_toppings(db), response)
+
+
+@router.get('/{topping_id}', response_model=ToppingSchema, tags=['topping'])
+async def get_topping(topping_id: uuid.UUID, response: Response, db: AsyncSession = Depends(get_async_db)):
+    logging.info('Received request to fetch topping with ID {}'.format(topping_id))
+    topping = await topping_async_crud.get_topping_by_id(topping_id, db)
+
+    if not topping:
+        logging.error('Topping with ID {} not found'.format(topping_id))
+        raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(topping)
+    return topping
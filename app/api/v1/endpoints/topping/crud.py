@@ -1,20 +1,36 @@
 import logging
 import uuid
+from typing import List, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.api.v1.endpoints.topping.schemas import ToppingCreateSchema, ToppingListItemSchema
+from app.database.catalog_cache import catalog_cache
+from app.database.versioning import commit_if_unchanged
+from app.database.upsert import upsert_by_name
 from app.database.models import Topping
 
+TOPPING_LIST_COLUMNS = tuple(getattr(Topping, field) for field in ToppingListItemSchema.__fields__)
+
 
 def create_topping(schema: ToppingCreateSchema, db: Session):
     entity = Topping(**schema.dict())
     db.add(entity)
     db.commit()
+    catalog_cache.invalidate(Topping)
     logging.info('Topping created with name {}'.format(entity.name))
     return entity
 
 
+def upsert_toppings(schemas: List[ToppingCreateSchema], db: Session):
+    created, updated = upsert_by_name(Topping, schemas, db)
+    db.commit()
+    catalog_cache.invalidate(Topping)
+    logging.info('Toppings upserted, created: {}, updated: {}'.format(created, updated))
+    return created, updated
+
+
 def get_topping_by_id(topping_id: uuid.UUID, db: Session):
-    entity = db.query(Topping).filter(Topping.id == topping_id).first()
+    entity = catalog_cache.get(Topping, 'id', topping_id, db)
     if entity:
         logging.info('Topping retrieved with id {}'.format(topping_id))
     else:
@@ -23,36 +39,33 @@ def get_topping_by_id(topping_id: uuid.UUID, db: Session):
 
 
 def get_topping_by_name(topping_name: str, db: Session):
-    entity = db.query(Topping).filter(Topping.name == topping_name).first()
+    entity = catalog_cache.get(Topping, 'name', topping_name, db)
     return entity
 
 
 def get_all_toppings(db: Session):
-    entities = db.query(Topping).all()
-    logging.info('Retrieved all toppings, count: {}'.format(len(entities)))
-    if entities:
-        return_entities = []
-        for entity in entities:
-            list_item_entity = ToppingListItemSchema(
-                **{'id': entity.id, 'name': entity.name, 'price': entity.price, 'description': entity.description})
-            return_entities.append(list_item_entity)
-        return return_entities
-    return entities
-
-
-def update_topping(topping: Topping, changed_topping: ToppingCreateSchema, db: Session):
-    for key, value in changed_topping.dict().items():
-        setattr(topping, key, value)
-    db.commit()
+    # Plain rows of the listed columns, nothing is tracked in the session
+    rows = db.execute(select(*TOPPING_LIST_COLUMNS)).all()
+    logging.info('Retrieved all toppings, count: {}'.format(len(rows)))
+    return rows
+
+
+def update_topping(topping: Topping, changed_topping: ToppingCreateSchema, db: Session, version: Optional[int] = None):
+    def apply_changes():
+        for key, value in changed_topping.dict().items():
+            setattr(topping, key, value)
+
+    commit_if_unchanged(topping, apply_changes, db, version)
+    catalog_cache.invalidate(Topping)
     db.refresh(topping)
     return topping
 
 
-def delete_topping_by_id(topping_id: uuid.UUID, db: Session):
+def delete_topping_by_id(topping_id: uuid.UUID, db: Session, version: Optional[int] = None):
     entity = get_topping_by_id(topping_id, db)
     if entity:
-        db.delete(entity)
-        db.commit()
+        commit_if_unchanged(entity, lambda: db.delete(entity), db, version)
+        catalog_cache.invalidate(Topping)
         logging.info('Topping deleted with id {}'.format(topping_id))
     else:
         logging.warning('Attempted to delete topping with id {} but topping not found'.format(topping_id))
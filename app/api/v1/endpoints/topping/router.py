@@ -1,12 +1,17 @@
 import logging
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, Request, Response, status, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 import app.api.v1.endpoints.topping.crud as topping_crud
 from app.api.v1.endpoints.topping.schemas import ToppingSchema, ToppingCreateSchema, ToppingListItemSchema
-from app.database.connection import SessionLocal
+from app.api.v1.bulk import BulkUpsertSchema, bulk_payload
+from app.api.v1.catalog_etag import catalog_not_modified, get_if_match_version, get_row_etag
+from app.api.v1.row_json import rows_response
+from app.database.connection import ReadSessionLocal, SessionLocal
+from app.database.models import Topping
 
 WITH_ID_NOT_FOUND = 'Topping with id {} not found'
 
@@ -21,11 +26,22 @@ def get_db():
         db.close()
 
 
+def get_read_db(x_read_primary: bool = Header(False)):
+    db = SessionLocal() if x_read_primary else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @router.get('', response_model=List[ToppingListItemSchema], tags=['topping'])
-def get_all_toppings(db: Session = Depends(get_db)):
+def get_all_toppings(request: Request, response: Response, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve all toppings')
+    not_modified = catalog_not_modified(Topping, request, response, db)
+    if not_modified:
+        return not_modified
     toppings = topping_crud.get_all_toppings(db)
-    return toppings
+    return rows_response(toppings, response)
 
 
 @router.post('', response_model=ToppingSchema, status_code=status.HTTP_201_CREATED, tags=['topping'])
@@ -40,17 +56,31 @@ def create_topping(topping: ToppingCreateSchema, request: Request, db: Session =
     return new_topping
 
 
+@router.post('/bulk', response_model=BulkUpsertSchema, tags=['topping'])
+def upsert_toppings(
+        toppings: List[ToppingCreateSchema] = Depends(bulk_payload(ToppingCreateSchema)),
+        db: Session = Depends(get_db),
+):
+    logging.info('Received request to upsert {} toppings'.format(len(toppings)))
+    created, updated = topping_crud.upsert_toppings(toppings, db)
+    return BulkUpsertSchema(created=created, updated=updated)
+
+
 @router.put('/{topping_id}', response_model=ToppingSchema, tags=['topping'])
 def update_topping(topping_id: uuid.UUID, changed_topping: ToppingCreateSchema,
-                   request: Request, response: Response, db: Session = Depends(get_db)):
+                   request: Request, response: Response, if_match: Optional[str] = Header(None),
+                   db: Session = Depends(get_db)):
     logging.info('PUT request to update topping_id {} with payload: {}'.format(topping_id, changed_topping))
     topping_found = topping_crud.get_topping_by_id(topping_id, db)
     updated_topping = None
     if topping_found:
         if topping_found.name == changed_topping.name:
-            topping_crud.update_topping(topping_found, changed_topping, db)
+            try:
+                topping_crud.update_topping(topping_found, changed_topping, db, get_if_match_version(if_match))
+            except StaleDataError:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
             logging.info('Topping with id {} updated successfully'.format(topping_id))
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+            return Response(status_code=status.HTTP_204_NO_CONTENT, headers={'ETag': get_row_etag(topping_found)})
         else:
             topping_name_found = topping_crud.get_topping_by_name(changed_topping.name, db)
             if topping_name_found:
@@ -69,22 +99,26 @@ def update_topping(topping_id: uuid.UUID, changed_topping: ToppingCreateSchema,
 
 
 @router.get('/{topping_id}', response_model=ToppingSchema, tags=['topping'])
-def get_topping(topping_id: uuid.UUID, response: Response, db: Session = Depends(get_db)):
+def get_topping(topping_id: uuid.UUID, response: Response, db: Session = Depends(get_read_db)):
     logging.info('GET request to retrieve topping with id {}'.format(topping_id))
     topping = topping_crud.get_topping_by_id(topping_id, db)
     if not topping:
         logging.warning(WITH_ID_NOT_FOUND.format(topping_id))
         raise HTTPException(status_code=404)
+    response.headers['ETag'] = get_row_etag(topping)
     return topping
 
 
 @router.delete('/{topping_id}', response_model=None, tags=['topping'])
-def delete_topping(topping_id: uuid.UUID, db: Session = Depends(get_db)):
+def delete_topping(topping_id: uuid.UUID, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     logging.info('DELETE request to delete topping with id {}'.format(topping_id))
     topping = topping_crud.get_topping_by_id(topping_id, db)
     if not topping:
         logging.warning(WITH_ID_NOT_FOUND.format(topping_id))
         raise HTTPException(status_code=404, detail='Item not found')
-    topping_crud.delete_topping_by_id(topping_id, db)
+    try:
+        topping_crud.delete_topping_by_id(topping_id, db, get_if_match_version(if_match))
+    except StaleDataError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Changed since it was read')
     logging.info('Topping with id {} deleted successfully'.format(topping_id))
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,7 @@
 import logging
 import uuid
 from sqlalchemy.orm import Session
+from app.api.v1.endpoints.order.crud import ORDER_SCHEMA_OPTIONS
 from app.api.v1.endpoints.user.schemas import UserCreateSchema
 from app.database.models import Order, User
 
@@ -51,15 +52,17 @@ def delete_user_by_id(user_id: uuid.UUID, db: Session):
 
 
 def get_order_history_of_user(user_id: uuid.UUID, db: Session):
-    entities = db.query(Order).filter(Order.user_id == user_id).filter(Order.order_status == 'COMPLETED').all()
+    entities = db.query(Order).options(*ORDER_SCHEMA_OPTIONS) \
+        .filter(Order.user_id == user_id).filter(Order.order_status == 'COMPLETED').all()
     return entities
 
 
 def get_open_orders_of_user(user_id: uuid.UUID, db: Session):
-    entities = db.query(Order).filter(Order.user_id == user_id).filter(Order.order_status != 'COMPLETED').all()
+    entities = db.query(Order).options(*ORDER_SCHEMA_OPTIONS) \
+        .filter(Order.user_id == user_id).filter(Order.order_status != 'COMPLETED').all()
     return entities
 
 
 def get_all_not_completed_orders(db: Session):
-    entities = db.query(Order).filter(Order.order_status != 'COMPLETED').all()
+    entities = db.query(Order).options(*ORDER_SCHEMA_OPTIONS).filter(Order.order_status != 'COMPLETED').all()
     return entities
@@ -0,0 +1,284 @@
+import datetime
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database.connection import SessionLocal
+from app.database.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+# Set on responses that were replayed instead of running the endpoint
+IDEMPOTENT_REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Seconds a key replays its response, expire_idempotency_keys deletes the keys after that
+IDEMPOTENCY_KEY_RETENTION = float(os.environ.get('IDEMPOTENCY_KEY_RETENTION', '86400'))
+# Seconds until the key of a request that never finished, e.g. because its worker died, can be claimed again.
+# Only a request that committed nothing is taken over, and a request taken over can no longer commit.
+IDEMPOTENCY_KEY_CLAIM_TIMEOUT = float(os.environ.get('IDEMPOTENCY_KEY_CLAIM_TIMEOUT', '60'))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '4096'))
+# Keys deleted by one sweep
+IDEMPOTENCY_KEY_SWEEP_SIZE = int(os.environ.get('IDEMPOTENCY_KEY_SWEEP_SIZE', '1000'))
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    # None while the first request with the key is still running
+    status_code: Optional[int]
+    content_type: Optional[str]
+    body: Optional[bytes]
+    # True once the request committed changes, it is never run again then
+    applied: bool = False
+
+
+class IdempotencyKeyTakenOverError(Exception):
+    def __init__(self, key: str):
+        self.key = key
+        self.message = 'A retry with this Idempotency-Key took the request over'
+        super().__init__(self.message)
+
+
+# Key and claim of the request the endpoint runs for, seen by every commit of the endpoint
+running_claim: ContextVar[Optional[Tuple[str, uuid.UUID]]] = ContextVar('running_claim', default=None)
+
+
+@event.listens_for(Session, 'before_commit')
+def mark_key_applied(session: Session):
+    """Marks the claimed key as applied in the transaction that commits the endpoint's changes.
+
+    A retry takes over only keys that are not applied, so the changes of a request are committed at most once.
+    If a retry took the key over already, the commit is refused.
+    """
+    claim = running_claim.get()
+    if claim is None or session.in_nested_transaction():
+        return
+    key, token = claim
+    marked = session.execute(update(IdempotencyKey)
+                             .where(IdempotencyKey.key == key, IdempotencyKey.claim == token)
+                             .values(applied=True)
+                             .execution_options(synchronize_session=False)).rowcount
+    if not marked:
+        raise IdempotencyKeyTakenOverError(key)
+
+
+class IdempotencyCache:
+    """LRU cache of finished responses in front of the idempotency_key table.
+
+    A finished response never changes until its key expires, so a replay served by the same process
+    needs no query. Entries expire together with their key.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, stored: StoredResponse, ttl: float):
+        with self._lock:
+            self._entries[key] = (stored, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+
+
+def idempotent(endpoint):
+    # Marks an endpoint of a router with route_class=IdempotentRoute to honour the Idempotency-Key header
+    endpoint.idempotent = True
+    return endpoint
+
+
+class IdempotentRoute(APIRoute):
+    """Replays the stored response of a request whose Idempotency-Key was seen before, without running the endpoint.
+
+    The key is claimed before the endpoint runs and marked applied by the endpoint's first commit. A 2xx response is
+    stored with it, any other outcome frees the key again if nothing was committed, the client may retry then.
+    A retry that arrives while the first request is still running, or after it committed without a response to
+    replay, gets a 409, a key sent with a different request a 422.
+    """
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+        if not getattr(self.endpoint, 'idempotent', False):
+            return route_handler
+
+        async def idempotent_route_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            if key is None:
+                return await route_handler(request)
+            if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Invalid Idempotency-Key')
+
+            fingerprint = get_fingerprint(request, await request.body())
+            claim, stored = await run_in_threadpool(claim_or_get_response, key, fingerprint)
+            if claim is None:
+                return replay_response(stored, fingerprint)
+
+            running = running_claim.set((key, claim))
+            try:
+                response = await route_handler(request)
+            except Exception as error:
+                running_claim.reset(running)
+                if isinstance(error, IdempotencyKeyTakenOverError):
+                    # Nothing of this request was committed, the retry holding the key answers the client
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error.message)
+                await run_in_threadpool(finish_request, key, claim, None)
+                raise
+            running_claim.reset(running)
+            if status.HTTP_200_OK <= response.status_code < status.HTTP_300_MULTIPLE_CHOICES:
+                await run_in_threadpool(finish_request, key, claim, StoredResponse(
+                    fingerprint, response.status_code, response.headers.get('content-type'), response.body))
+            else:
+                await run_in_threadpool(finish_request, key, claim, None)
+            return response
+
+        return idempotent_route_handler
+
+
+def get_fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256('{} {}?{}\n'.format(request.method, request.url.path, request.url.query).encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def replay_response(stored: StoredResponse, fingerprint: str) -> Response:
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail='Idempotency-Key was used for a different request')
+    if stored.status_code is None and stored.applied:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail='A request with this Idempotency-Key was applied, its response is not available')
+    if stored.status_code is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail='A request with this Idempotency-Key is in progress')
+    return Response(content=stored.body, status_code=stored.status_code, media_type=stored.content_type,
+                    headers={IDEMPOTENT_REPLAYED_HEADER: 'true'})
+
+
+def claim_or_get_response(key: str, fingerprint: str) -> Tuple[Optional[uuid.UUID], Optional[StoredResponse]]:
+    # Returns the claim if the request claimed the key and has to run, otherwise what the key holds
+    stored = idempotency_cache.get(key)
+    if stored is not None:
+        return None, stored
+
+    db = SessionLocal()
+    try:
+        claim = claim_key(key, fingerprint, db)
+        if claim is not None:
+            db.commit()
+            return claim, None
+        found = get_stored_response(key, db)
+    finally:
+        db.close()
+    if found is None:
+        # Freed by the first request in the meantime, the client retries
+        return None, StoredResponse(fingerprint, None, None, None)
+    stored, remaining = found
+    if stored.status_code is not None:
+        idempotency_cache.put(key, stored, remaining)
+    return None, stored
+
+
+def finish_request(key: str, claim: uuid.UUID, stored: Optional[StoredResponse]):
+    # Stores the response of the claimed key, or frees the key if there is nothing to replay.
+    # Does nothing if a retry took the key over.
+    db = SessionLocal()
+    try:
+        if stored is None:
+            release_key(key, claim, db)
+        else:
+            stored = stored if store_response(key, claim, stored, db) else None
+        db.commit()
+    finally:
+        db.close()
+    if stored is not None:
+        idempotency_cache.put(key, stored, IDEMPOTENCY_KEY_RETENTION)
+
+
+def get_retention_start():
+    # Computed by the database, so every process expires the keys at the same time
+    return func.now() - datetime.timedelta(seconds=IDEMPOTENCY_KEY_RETENTION)
+
+
+def claim_key(key: str, fingerprint: str, db: Session) -> Optional[uuid.UUID]:
+    # Inserts the key as running and returns its new claim, an expired key or one whose request never finished
+    # without committing anything is taken over.
+    # Committed by the caller, the claim has to be visible to concurrent retries before the endpoint runs.
+    table = IdempotencyKey.__table__
+    statement = insert(table).values(key=key, fingerprint=fingerprint, claim=uuid.uuid4())
+    return db.execute(statement.on_conflict_do_update(
+        index_elements=['key'],
+        set_={'fingerprint': statement.excluded.fingerprint, 'claim': statement.excluded.claim, 'applied': False,
+              'status_code': None, 'content_type': None, 'body': None, 'created_at': func.now()},
+        where=or_(table.c.created_at < get_retention_start(),
+                  and_(table.c.status_code.is_(None), table.c.applied.is_(False),
+                       table.c.created_at < func.now() - datetime.timedelta(seconds=IDEMPOTENCY_KEY_CLAIM_TIMEOUT))))
+        .returning(table.c.claim)).scalar()
+
+
+def get_stored_response(key: str, db: Session):
+    # The stored response of an unexpired key with the seconds it is kept for
+    row = db.execute(select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.content_type,
+                            IdempotencyKey.body, IdempotencyKey.applied,
+                            func.extract('epoch', IdempotencyKey.created_at - get_retention_start()))
+                     .where(IdempotencyKey.key == key, IdempotencyKey.created_at >= get_retention_start())).first()
+    if row is None:
+        return None
+    return StoredResponse(*row[:5]), float(row[5])
+
+
+def store_response(key: str, claim: uuid.UUID, stored: StoredResponse, db: Session) -> bool:
+    # False if the claim was taken over. Committed by the caller.
+    return db.execute(update(IdempotencyKey)
+                      .where(IdempotencyKey.key == key, IdempotencyKey.claim == claim)
+                      .values(status_code=stored.status_code, content_type=stored.content_type, body=stored.body)
+                      .execution_options(synchronize_session=False)).rowcount > 0
+
+
+def release_key(key: str, claim: uuid.UUID, db: Session):
+    # A key whose request committed changes is kept, a retry must not apply them again. Committed by the caller.
+    db.execute(delete(IdempotencyKey)
+               .where(IdempotencyKey.key == key, IdempotencyKey.claim == claim,
+                      IdempotencyKey.status_code.is_(None), IdempotencyKey.applied.is_(False))
+               .execution_options(synchronize_session=False))
+
+
+def expire_keys(db: Session, limit: int = IDEMPOTENCY_KEY_SWEEP_SIZE) -> int:
+    # Deletes up to limit keys past the retention with one DELETE, oldest first. Committed by the caller.
+    expired = select(IdempotencyKey.key) \
+        .where(IdempotencyKey.created_at < get_retention_start()) \
+        .order_by(IdempotencyKey.created_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True)
+    return db.execute(delete(IdempotencyKey)
+                      .where(IdempotencyKey.key.in_(expired))
+                      .execution_options(synchronize_session=False)).rowcount
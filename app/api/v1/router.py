@@ -7,9 +7,27 @@ from app.api.v1.endpoints.pizza_type.router import router as pizza_type_router
 from app.api.v1.endpoints.topping.router import router as topping_router
 from app.api.v1.endpoints.user.router import router as user_router
 from app.api.v1.endpoints.sauce.router import router as sauce_router
+from app.api.v1.endpoints.metrics.router import router as metrics_router
+from app.api.v1.endpoints.menu.router import router as menu_router
+from app.api.v1.endpoints.stock.router import router as stock_router
+from app.api.v1.endpoints.beverage.async_router import router as beverage_async_router
+from app.api.v1.endpoints.dough.async_router import router as dough_async_router
+from app.api.v1.endpoints.pizza_type.async_router import router as pizza_type_async_router
+from app.api.v1.endpoints.topping.async_router import router as topping_async_router
+from app.api.v1.endpoints.sauce.async_router import router as sauce_async_router
+from app.database.connection import DATABASE_ASYNC
 
 router = APIRouter()
 
+if DATABASE_ASYNC:
+    # Routes are matched in order, so the async read routes shadow their sync counterparts.
+    # Everything else, writes included, keeps being served by the sync routers below.
+    router.include_router(pizza_type_async_router, prefix='/pizza-types')
+    router.include_router(topping_async_router, prefix='/toppings')
+    router.include_router(dough_async_router, prefix='/doughs')
+    router.include_router(beverage_async_router, prefix='/beverages')
+    router.include_router(sauce_async_router, prefix='/sauces')
+
 router.include_router(pizza_type_router, prefix='/pizza-types')
 router.include_router(topping_router, prefix='/toppings')
 router.include_router(dough_router, prefix='/doughs')
@@ -17,3 +35,6 @@ router.include_router(order_router, prefix='/order')
 router.include_router(user_router, prefix='/users')
 router.include_router(beverage_router, prefix='/beverages')
 router.include_router(sauce_router, prefix='/sauces')
+router.include_router(metrics_router, prefix='/metrics')
+router.include_router(menu_router, prefix='/menu')
+router.include_router(stock_router, prefix='/stock')
@@ -0,0 +1,23 @@
+import decimal
+import json
+import uuid
+
+from fastapi import Response
+
+
+def encode_column_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError('Cannot encode {} as JSON'.format(type(value).__name__))
+
+
+def encode_rows(rows) -> bytes:
+    # The columns come typed from the database, so rows are encoded as they are without validating them again
+    return json.dumps([row._asdict() for row in rows], default=encode_column_value).encode()
+
+
+def rows_response(rows, response: Response) -> Response:
+    # Headers set on the injected response, like the ETag, are not applied to a returned response by FastAPI
+    return Response(content=encode_rows(rows), media_type='application/json', headers=response.headers)
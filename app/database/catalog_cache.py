@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.database.table_version import get_transaction_table_version
+
+CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', '1024'))
+# Seconds an entry is kept at most, even if its table was not written
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '60'))
+
+# Never cached, stock, its stripes and its version are always loaded from the database
+UNCACHED_COLUMNS = {'stock', 'striped_stock', 'version'}
+
+
+class CatalogCache:
+    """Read through LRU cache for catalog lookups by id or name.
+
+    Entries are detached copies without stock, stored with the version of their table they were read at. An entry
+    is only served while the table version seen by the session's transaction is the same, so writes of any
+    process, deletes included, turn it into a miss. A hit is merged into the session without a query, the stock
+    of the merged entity is loaded from the database on first access.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model, column: str, value, db: Session):
+        key = (model, column, value)
+        version = get_transaction_table_version(model, db)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] == version and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                snapshot = entry[0]
+            else:
+                self.misses += 1
+                snapshot = None
+        if snapshot is not None:
+            return db.merge(snapshot, load=False)
+
+        entity = db.query(model).filter(getattr(model, column) == value).first()
+        if entity is not None:
+            self._put(model, version, entity)
+        return entity
+
+    def invalidate(self, model):
+        # Entries of the model are outdated by the write anyway, dropping them frees their slots
+        with self._lock:
+            for key in [key for key in self._entries if key[0] is model]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _put(self, model, version: int, entity):
+        # Read after the version, so the entity is at least as new as the version it is stored with
+        snapshot = model(**{attribute.key: getattr(entity, attribute.key)
+                            for attribute in inspect(model).column_attrs
+                            if attribute.key not in UNCACHED_COLUMNS})
+        make_transient_to_detached(snapshot)
+        expires = time.monotonic() + self.ttl
+
+        with self._lock:
+            for key in ((model, 'id', snapshot.id), (model, 'name', snapshot.name)):
+                self._entries[key] = (snapshot, version, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+catalog_cache = CatalogCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
@@ -1,13 +1,94 @@
 import os
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 
-DATABASE_URL = 'postgresql://' \
-               + os.environ['DATABASE_USERNAME'] + ':' \
-               + os.environ['DATABASE_PASSWORD'] + '@' \
-               + os.environ['DATABASE_HOST'] + '/' \
-               + os.environ['DATABASE_NAME']
-db_engine = create_engine(DATABASE_URL)
+from app.database.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
+
+
+def get_database_url(host: str, port: str):
+    return 'postgresql://' \
+        + os.environ['DATABASE_USERNAME'] + ':' \
+        + os.environ['DATABASE_PASSWORD'] + '@' \
+        + host + ':' \
+        + port + '/' \
+        + os.environ['DATABASE_NAME']
+
+
+DATABASE_URL = get_database_url(os.environ['DATABASE_HOST'], os.environ.get('DATABASE_PORT', '5432'))
+
+# Every engine of a process gets its own pool with these settings
+POOL_OPTIONS = {
+    'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', '5')),
+    'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', '10')),
+    'pool_timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '30')),
+    # Connections older than this are replaced before use, -1 keeps them forever
+    'pool_recycle': int(os.environ.get('DATABASE_POOL_RECYCLE', '1800')),
+    'pool_pre_ping': os.environ.get('DATABASE_POOL_PRE_PING', 'true').lower() == 'true',
+}
+
+db_engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+
+class RoutingSession(Session):
+    """Reads from the replica, while flushes and INSERT/UPDATE/DELETE statements always go to the primary."""
+
+    def __init__(self, primary, replica=None, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replica = replica or primary
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            return self.primary
+        return self.replica
+
+
+# The replica is optional, without DATABASE_REPLICA_HOST read only sessions use the primary
+if os.environ.get('DATABASE_REPLICA_HOST') is not None:
+    replica_db_engine = create_engine(
+        get_database_url(os.environ['DATABASE_REPLICA_HOST'],
+                         os.environ.get('DATABASE_REPLICA_PORT', os.environ.get('DATABASE_PORT', '5432'))),
+        poolclass=TimedQueuePool, **POOL_OPTIONS)
+else:
+    replica_db_engine = None
+
+# Used by the read only GET routes, a request sending 'X-Read-Primary: true' reads its own writes from the primary
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False,
+                                primary=db_engine, replica=replica_db_engine)
+
+# The async stack serves the catalog reads with async route handlers, see app/api/v1/router.py
+DATABASE_ASYNC = os.environ.get('DATABASE_ASYNC', 'false').lower() == 'true'
+ASYNC_DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+
+def create_async_db_engine(**kwargs):
+    # asyncpg is only loaded once an async engine is created
+    options = {'poolclass': TimedAsyncAdaptedQueuePool, **POOL_OPTIONS, **kwargs}
+    return create_async_engine(ASYNC_DATABASE_URL, **options)
+
+
+async_db_engine = create_async_db_engine() if DATABASE_ASYNC else None
+
+# Attributes are not expired on commit, reloading them would need an await
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_db_engine)
+
+
+async def get_async_db():
+    # Dependency of the async routers, one session per request
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def recreate_pools_after_fork():
+    # Called in every forked worker: the inherited pools hold the sockets of the parent, they are replaced
+    # without closing those sockets, which still belong to the parent
+    for engine in (db_engine, replica_db_engine):
+        if engine is not None:
+            engine.dispose(close=False)
+    if async_db_engine is not None:
+        async_db_engine.sync_engine.dispose(close=False)
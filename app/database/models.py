@@ -1,11 +1,14 @@
 import datetime
 import decimal
 import enum
+import os
 import uuid
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy import CheckConstraint, ForeignKey, Integer, Numeric, DateTime, String
-from sqlalchemy.orm import relationship, mapped_column, Mapped, DeclarativeBase
+from sqlalchemy import BigInteger, CheckConstraint, ForeignKey, Index, Integer, Numeric, DateTime, String, delete, \
+    event, inspect, select, tuple_
+from sqlalchemy.orm import relationship, mapped_column, Mapped, DeclarativeBase, Session, column_property
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 
 IN_STOCK = 'stock >= 0'
@@ -39,8 +42,12 @@ class Sauce(Base):
     name: Mapped[str] = mapped_column(nullable=False, unique=True)
     description: Mapped[str] = mapped_column(String(255), nullable=False, default='')
     price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
-    spiciness: Mapped[SauceSpiciness] = mapped_column(default=SauceSpiciness.LEVEL1, nullable=False)
+    spiciness: Mapped[SauceSpiciness] = mapped_column(default=SauceSpiciness.LEVEL1, nullable=False, index=True)
     stock: Mapped[int] = mapped_column(CheckConstraint(IN_STOCK), nullable=False)
+    # Bumped by every UPDATE, a flush of an outdated entity raises StaleDataError instead of overwriting the row
+    version: Mapped[int] = mapped_column(nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return (
@@ -114,6 +121,9 @@ class Topping(Base):
     price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     description: Mapped[str] = mapped_column(nullable=False, default='')
     stock: Mapped[int] = mapped_column(CheckConstraint(IN_STOCK), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return "Topping(id='%s', name='%s', price='%s', description='%s', stock='%s')" \
@@ -128,6 +138,9 @@ class Dough(Base):
     price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     description: Mapped[str] = mapped_column(nullable=False, default='')
     stock: Mapped[int] = mapped_column(CheckConstraint(IN_STOCK), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return "Dough(id='%s', name='%s', price='%s', description='%s', stock='%s')" \
@@ -161,6 +174,19 @@ class Order(Base):
     user: Mapped['User'] = relationship(back_populates='customer_orders')
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('user.id'), nullable=False)
     order_status: Mapped[OrderStatus] = mapped_column(default=OrderStatus.TRANSMITTED, nullable=False)
+    # Running totals, maintained by every mutation in order crud
+    total_price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False, default=0)
+    pizza_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    beverage_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    # Stock of the items is held until then, NULL once the order is confirmed, see stock_reservation_crud
+    reserved_until: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), index=True,
+                                                                        nullable=True)
+
+    # Keyset pagination of order lists, see order crud get_page_of_orders
+    __table_args__ = (
+        Index('ix_customer_order_order_datetime_id', 'order_datetime', 'id'),
+        Index('ix_customer_order_order_status_order_datetime_id', 'order_status', 'order_datetime', 'id'),
+    )
 
     def __repr__(self):
         return "Order(id='%s', order_datetime='%s' beverages='%s', pizzas='%s', user='%s', \
@@ -175,10 +201,12 @@ class Pizza(Base):
     pizza_type_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('pizza_type.id'), nullable=False)
     pizza_type: Mapped['PizzaType'] = relationship()
     order_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('customer_order.id'), nullable=True)
+    # Price of the pizza type when the pizza was added, later price changes leave the order total alone
+    unit_price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
 
     def __repr__(self):
-        return "Pizza(id='%s', pizza_type_id='%s', order_id='%s')" \
-            % (self.id, self.pizza_type_id, self.order_id)
+        return "Pizza(id='%s', pizza_type_id='%s', order_id='%s', unit_price='%s')" \
+            % (self.id, self.pizza_type_id, self.order_id, self.unit_price)
 
 
 class Beverage(Base):
@@ -189,6 +217,9 @@ class Beverage(Base):
     price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     description: Mapped[str] = mapped_column(nullable=False, default='')
     stock: Mapped[int] = mapped_column(CheckConstraint(IN_STOCK), nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return "Beverage(id='%s', name='%s', price='%s', description='%s', stock='%s')" \
@@ -202,10 +233,75 @@ class OrderBeverageQuantity(Base):
     beverage_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('beverage.id'), primary_key=True)
     beverage: Mapped['Beverage'] = relationship()
     quantity: Mapped[int] = mapped_column(CheckConstraint('quantity > 0'), nullable=False)
+    # Price of the beverage when it was added to the order
+    unit_price: Mapped[decimal.Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+
+    def __repr__(self):
+        return "OrderBeverageQuantity(order_id='%s', beverage_id='%s', quantity='%s', unit_price='%s')" \
+            % (self.order_id, self.beverage_id, self.quantity, self.unit_price)
+
+
+class StockReservation(Base):
+    __tablename__ = 'stock_reservation'
+
+    order_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('customer_order.id', ondelete='CASCADE'),
+                                                primary_key=True)
+    # Table of the ingredient model (dough, topping, sauces, beverage)
+    ingredient_table: Mapped[str] = mapped_column(primary_key=True)
+    ingredient_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    quantity: Mapped[int] = mapped_column(CheckConstraint(greater_zero), nullable=False)
 
     def __repr__(self):
-        return "OrderBeverageQuantity(order_id='%s', beverage_id='%s', quantity='%s')" \
-            % (self.order_id, self.beverage_id, self.quantity)
+        return "StockReservation(order_id='%s', ingredient_table='%s', ingredient_id='%s', quantity='%s')" \
+            % (self.order_id, self.ingredient_table, self.ingredient_id, self.quantity)
+
+
+class StockStripe(Base):
+    __tablename__ = 'stock_stripe'
+
+    # Table of the ingredient model (dough, topping, sauces, beverage)
+    ingredient_table: Mapped[str] = mapped_column(primary_key=True)
+    ingredient_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    stripe: Mapped[int] = mapped_column(primary_key=True)
+    stock: Mapped[int] = mapped_column(CheckConstraint(IN_STOCK), nullable=False)
+
+    def __repr__(self):
+        return "StockStripe(ingredient_table='%s', ingredient_id='%s', stripe='%s', stock='%s')" \
+            % (self.ingredient_table, self.ingredient_id, self.stripe, self.stock)
+
+
+class TableVersion(Base):
+    __tablename__ = 'table_version'
+
+    # Bumped by a trigger on every statement that changes what the catalog shows of the table, stock writes do not
+    # count. Read by every process, so ETags and cached entries agree across processes, see table_version.py.
+    table_name: Mapped[str] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default='0')
+
+    def __repr__(self):
+        return "TableVersion(table_name='%s', version='%s')" % (self.table_name, self.version)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_key'
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    # Hash of method, path and body, a key only replays the request it was first sent with
+    fingerprint: Mapped[str] = mapped_column(nullable=False)
+    # Token of the request that holds the key, a request taken over by a retry can no longer commit
+    claim: Mapped[uuid.UUID] = mapped_column(nullable=False, default=uuid.uuid4)
+    # Set by the first commit of the request, a request whose changes were committed is never run again
+    applied: Mapped[bool] = mapped_column(nullable=False, server_default='false')
+    # NULL while the first request with the key is still running
+    status_code: Mapped[Optional[int]] = mapped_column(nullable=True)
+    content_type: Mapped[Optional[str]] = mapped_column(nullable=True)
+    body: Mapped[Optional[bytes]] = mapped_column(nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
+                                                          index=True, nullable=False)
+
+    def __repr__(self):
+        return "IdempotencyKey(key='%s', fingerprint='%s', applied='%s', status_code='%s', created_at='%s')" \
+            % (self.key, self.fingerprint, self.applied, self.status_code, self.created_at)
 
 
 class Address(Base):
@@ -228,3 +324,60 @@ class Address(Base):
                " first_name='%s', last_name='%s')" \
             % (self.id, self.post_code, self.street, self.country, self.house_number,
                self.town, self.first_name, self.last_name)
+
+
+# Striped stock: the stock of a hot ingredient is split between its own row and its stripes, see stock_stripes.
+# Stripes per ingredient, 0 turns striping off. Reads and the stock engine only see the stripes with striping on,
+# so without it loading an ingredient costs no stripe subquery. Run rebalance_stock_stripes with 0 stripes before
+# turning striping off, it gives the stock of the stripes back to the rows.
+STOCK_STRIPES = int(os.environ.get('STOCK_STRIPES', '0'))
+
+STRIPED_MODELS = (Dough, Topping, Sauce, Beverage)
+
+
+def map_striped_stock():
+    # The ORM shows the sum of the row and its stripes as stock, writing stock through the ORM sets it on the row
+    # and drops the stripes
+    for striped_model in STRIPED_MODELS:
+        if striped_stock_is_mapped(striped_model):
+            continue
+        striped_model.striped_stock = column_property(
+            select(func.coalesce(func.sum(StockStripe.stock), 0))
+            .where(StockStripe.ingredient_table == striped_model.__tablename__,
+                   StockStripe.ingredient_id == striped_model.id)
+            .scalar_subquery())
+        event.listen(striped_model, 'load', add_striped_stock)
+        event.listen(striped_model, 'refresh', add_striped_stock)
+
+
+def striped_stock_is_mapped(model) -> bool:
+    return 'striped_stock' in model.__mapper__.attrs
+
+
+def get_stock_column(model):
+    # The stock of an ingredient in a query, the same the ORM loads
+    return model.stock + model.striped_stock if striped_stock_is_mapped(model) else model.stock
+
+
+def add_striped_stock(target, context, attrs=None):
+    # Only if stock and its stripes were loaded together, a partial refresh must not add the stripes twice
+    loaded = inspect(target).dict
+    if (attrs is None or {'stock', 'striped_stock'} <= set(attrs)) and 'stock' in loaded and 'striped_stock' in loaded:
+        if loaded['striped_stock']:
+            set_committed_value(target, 'stock', loaded['stock'] + loaded['striped_stock'])
+
+
+if STOCK_STRIPES:
+    map_striped_stock()
+
+
+@event.listens_for(Session, 'before_flush')
+def drop_stripes_of_written_stock(session, flush_context, instances):
+    # Stripes of deleted ingredients are dropped by the next rebalance
+    stripes = [(type(entity).__tablename__, entity.id)
+               for entity in session.dirty
+               if isinstance(entity, STRIPED_MODELS) and inspect(entity).attrs.stock.history.has_changes()]
+    if stripes:
+        session.execute(delete(StockStripe)
+                        .where(tuple_(StockStripe.ingredient_table, StockStripe.ingredient_id).in_(stripes))
+                        .execution_options(synchronize_session=False))
@@ -0,0 +1,75 @@
+import contextvars
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolWaitStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+
+# Seconds the current checkout spent opening new connections, None outside of a checkout.
+# A context variable, so that the greenlets of the async pool do not share it.
+_connect_seconds: contextvars.ContextVar = contextvars.ContextVar('connect_seconds', default=None)
+
+
+class TimedPoolMixin:
+    """Measures how long every checkout waits until the pool has a free connection.
+
+    Opening a new connection and the pre-ping of a pooled one are not counted, so the wait only grows
+    when the pool is exhausted, not when the database is slow to connect.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        if _connect_seconds.get() is not None:
+            # QueuePool retries by calling _do_get again, only the outermost call is measured
+            return super()._do_get()
+        connect_seconds = [0.0]
+        token = _connect_seconds.set(connect_seconds)
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start - connect_seconds[0], timed_out=True)
+            raise
+        finally:
+            _connect_seconds.reset(token)
+        self.wait_stats.record(time.perf_counter() - start - connect_seconds[0])
+        return connection
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            connect_seconds = _connect_seconds.get()
+            if connect_seconds is not None:
+                connect_seconds[0] += time.perf_counter() - start
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,56 @@
+from typing import Sequence, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.models import (
+    Beverage,
+    Dough,
+    PizzaType,
+    PizzaTypeSauceQuantity,
+    PizzaTypeToppingQuantity,
+    Sauce,
+    TableVersion,
+    Topping,
+)
+
+# Tables of the in-process caches, their versions are read together once per transaction
+CACHED_MODELS = (PizzaType, Dough, Topping, Sauce, Beverage, PizzaTypeToppingQuantity, PizzaTypeSauceQuantity)
+_TRANSACTION_VERSIONS = 'table_versions'
+
+
+def select_table_versions(models: Sequence):
+    return select(TableVersion.table_name, TableVersion.version) \
+        .where(TableVersion.table_name.in_([model.__tablename__ for model in models]))
+
+
+def get_table_versions(models: Sequence, db: Session) -> Tuple[int, ...]:
+    # One query for all models, a table that was never written has version 0
+    versions = dict(db.execute(select_table_versions(models)).all())
+    return tuple(versions.get(model.__tablename__, 0) for model in models)
+
+
+async def get_table_versions_async(models: Sequence, db: AsyncSession) -> Tuple[int, ...]:
+    versions = dict((await db.execute(select_table_versions(models))).all())
+    return tuple(versions.get(model.__tablename__, 0) for model in models)
+
+
+def get_transaction_table_version(model, db: Session) -> int:
+    """The version of the model's table as seen by the current transaction of db.
+
+    The first call of a transaction reads the versions of all cached tables, so the cache lookups of a request
+    cost one query together. An entry read at this version is current for the transaction.
+    """
+    versions = db.info.get(_TRANSACTION_VERSIONS)
+    if versions is None:
+        versions = dict(zip(CACHED_MODELS, get_table_versions(CACHED_MODELS, db)))
+        db.info[_TRANSACTION_VERSIONS] = versions
+    return versions[model]
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def drop_transaction_table_versions(session, transaction):
+    # The next transaction may see writes committed in the meantime
+    if transaction.parent is None:
+        session.info.pop(_TRANSACTION_VERSIONS, None)
@@ -0,0 +1,43 @@
+from typing import Iterable, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import delete, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.database.models import StockStripe
+
+# Keeps every multi-row INSERT well below the 65535 bind parameters Postgres accepts per statement
+UPSERT_CHUNK_SIZE = 1000
+
+
+def upsert_by_name(model, schemas: Iterable[BaseModel], db: Session) -> Tuple[int, int]:
+    """Inserts or updates catalog rows keyed on their unique name and returns (created, updated).
+
+    Nothing is committed here. Of several rows with the same name only the last one is written,
+    Postgres refuses to update a row twice in one statement.
+    """
+    rows = list({schema.name: schema.dict() for schema in schemas}.values())
+    created = updated = 0
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        # A Core statement on the table, the ORM cannot return the system column xmax
+        statement = insert(model.__table__).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        values = {column: statement.excluded[column] for column in rows[0] if column != 'name'}
+        version = model.__mapper__.version_id_col
+        if version is not None:
+            values[version.name] = version + 1
+        statement = statement.on_conflict_do_update(index_elements=['name'], set_=values)
+        # xmax is only set on rows that existed before, so it tells inserts and updates apart
+        updated_ids = []
+        for row_id, inserted in db.execute(statement.returning(model.__table__.c.id, literal_column('xmax = 0'))):
+            if inserted:
+                created += 1
+            else:
+                updated_ids.append(row_id)
+        updated += len(updated_ids)
+        if updated_ids and 'stock' in rows[0]:
+            # The written stock replaces the stock of the stripes, like a stock written through the ORM
+            db.execute(delete(StockStripe)
+                       .where(StockStripe.ingredient_table == model.__tablename__,
+                              StockStripe.ingredient_id.in_(updated_ids)))
+    return created, updated
@@ -0,0 +1,24 @@
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+
+
+def commit_if_unchanged(entity, apply_changes: Callable[[], None], db: Session, version: Optional[int] = None):
+    """Applies absolute changes to a versioned entity and commits them unless its row changed in between.
+
+    The flush only writes the row while its version is still version, the one the client read, or without it the
+    version loaded here. Otherwise StaleDataError is raised after the rollback. Never retried, the changes were made
+    from the old row and would overwrite the other write, e.g. a stock decrement.
+    """
+    if version is None:
+        # Loaded now, an entity merged from the catalog cache would only load the current version at the flush
+        version = entity.version
+    set_committed_value(entity, 'version', version)
+    apply_changes()
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise
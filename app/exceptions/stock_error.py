@@ -0,0 +1,13 @@
+class OutOfStockError(Exception):
+
+    def __init__(self, message, shortages=None):
+        self.message = message
+        # (table name, ingredient id) of every ingredient that ran short
+        self.shortages = shortages or []
+
+
+class ReservationExpiredError(OutOfStockError):
+    # The holds of an unconfirmed order expired and their stock could not be taken again for its items
+
+    def __init__(self, shortages=None):
+        super().__init__('Reservation expired, the stock of the items already in the order is gone', shortages)
@@ -0,0 +1,34 @@
+"""Gunicorn settings of the production launcher, see infra/build_artifacts/docker-entrypoint.sh.
+
+    gunicorn --config app/gunicorn_conf.py app.main:app
+
+The app is imported once in the master before the workers are forked, so they share its memory pages.
+SIGHUP replaces all workers gracefully, SIGTERM stops them after the running requests.
+"""
+import multiprocessing
+import os
+
+from app.database.connection import recreate_pools_after_fork
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+# One worker per core by default
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+preload_app = os.environ.get('WEB_PRELOAD', 'true').lower() == 'true'
+
+# A worker is replaced after this many requests, the jitter keeps workers from restarting at the same time.
+# 0 turns recycling off.
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '1000'))
+
+# Seconds a worker has to finish its requests on restart or shutdown, and to answer the master at all
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.environ.get('WEB_TIMEOUT', '60'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+
+accesslog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    recreate_pools_after_fork()
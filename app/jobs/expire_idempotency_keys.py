@@ -0,0 +1,38 @@
+import argparse
+import logging
+import time
+
+import app.api.v1.idempotency as idempotency
+from app.database.connection import SessionLocal
+
+logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)  # NOSONAR
+
+
+def expire_idempotency_keys(batch_size: int = idempotency.IDEMPOTENCY_KEY_SWEEP_SIZE):
+    # One short transaction per batch, so the sweep never holds many keys at once
+    expired = 0
+    db = SessionLocal()
+    try:
+        while True:
+            deleted = idempotency.expire_keys(db, batch_size)
+            db.commit()
+            expired += deleted
+            if deleted < batch_size:
+                break
+        logging.info('Deleted {} expired idempotency keys'.format(expired))
+        return expired
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete the idempotency keys that are past their retention.')
+    parser.add_argument('--batch-size', type=int, default=idempotency.IDEMPOTENCY_KEY_SWEEP_SIZE,
+                        help='keys deleted per transaction')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='keep sweeping every INTERVAL seconds instead of sweeping once')
+    args = parser.parse_args()
+    expire_idempotency_keys(args.batch_size)
+    while args.interval > 0:
+        time.sleep(args.interval)
+        expire_idempotency_keys(args.batch_size)
@@ -0,0 +1,53 @@
+import argparse
+import logging
+import time
+from typing import Iterable
+
+from sqlalchemy import select
+
+import app.api.v1.endpoints.order.stock_logic.stock_stripes as stock_stripes
+from app.database.connection import SessionLocal
+
+logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)  # NOSONAR
+
+
+def rebalance_stock_stripes(tables: Iterable[str] = (), stripes: int = stock_stripes.STOCK_STRIPES):
+    # One transaction per ingredient, so the stripes of an ingredient are only locked while it is rebalanced
+    db = SessionLocal()
+    try:
+        for table in tables:
+            model = stock_stripes.STRIPED_TABLES[table]
+            for ingredient_id in db.scalars(select(model.id)).all():
+                stock_stripes.stripe_stock(model, ingredient_id, stripes, db)
+                db.commit()
+
+        dropped = stock_stripes.drop_stripes_of_deleted_ingredients(db)
+        db.commit()
+        rebalanced = 0
+        for model, ingredient_id in stock_stripes.get_striped_ingredients(db):
+            if stripes:
+                rebalanced += stock_stripes.rebalance_stripes(model, ingredient_id, db)
+            else:
+                # Striping is off, the engine only takes stock from the rows again
+                stock_stripes.unstripe_stock(model, ingredient_id, db)
+            db.commit()
+        logging.info('Rebalanced the stripes of {} ingredients, dropped {} stripes of deleted ingredients'
+                     .format(rebalanced, dropped))
+        return rebalanced
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spread the stock of striped ingredients evenly over their stripes.')
+    parser.add_argument('--table', action='append', default=[], choices=sorted(stock_stripes.STRIPED_TABLES),
+                        help='stripe every ingredient of the table, hot tables like dough first')
+    parser.add_argument('--stripes', type=int, default=stock_stripes.STOCK_STRIPES,
+                        help='stripes per ingredient, 0 gives the stock of all stripes back to the rows')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='keep rebalancing every INTERVAL seconds instead of rebalancing once')
+    args = parser.parse_args()
+    rebalance_stock_stripes(args.table, args.stripes)
+    while args.interval > 0:
+        time.sleep(args.interval)
+        rebalance_stock_stripes((), args.stripes)
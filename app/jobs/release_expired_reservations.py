@@ -0,0 +1,38 @@
+import argparse
+import logging
+import time
+
+import app.api.v1.endpoints.order.stock_logic.stock_reservation_crud as stock_reservation_crud
+from app.database.connection import SessionLocal
+
+logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)  # NOSONAR
+
+
+def release_expired_reservations(batch_size: int = stock_reservation_crud.STOCK_RESERVATION_SWEEP_SIZE):
+    # One transaction per batch, so the stock of a batch is available as soon as it is released
+    released = 0
+    db = SessionLocal()
+    try:
+        while True:
+            order_ids = stock_reservation_crud.release_expired_holds(db, batch_size)
+            db.commit()
+            released += len(order_ids)
+            if len(order_ids) < batch_size:
+                break
+        logging.info('Released the stock of {} orders with expired holds'.format(released))
+        return released
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Give back the stock held by unconfirmed orders that expired.')
+    parser.add_argument('--batch-size', type=int, default=stock_reservation_crud.STOCK_RESERVATION_SWEEP_SIZE,
+                        help='orders released per transaction')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='keep sweeping every INTERVAL seconds instead of sweeping once')
+    args = parser.parse_args()
+    release_expired_reservations(args.batch_size)
+    while args.interval > 0:
+        time.sleep(args.interval)
+        release_expired_reservations(args.batch_size)
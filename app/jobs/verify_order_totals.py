@@ -0,0 +1,37 @@
+import argparse
+import logging
+
+import app.api.v1.endpoints.order.crud as order_crud
+from app.database.connection import SessionLocal
+
+logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)  # NOSONAR
+
+
+def verify_order_totals(repair: bool = False):
+    db = SessionLocal()
+    try:
+        drifts = order_crud.get_drift_of_order_totals(db)
+        for drift in drifts:
+            logging.warning('Order {} drifted: total_price {} != {}, pizza_count {} != {},'
+                            ' beverage_count {} != {}'.format(drift.order_id,
+                                                              drift.total_price, drift.computed_total_price,
+                                                              drift.pizza_count, drift.computed_pizza_count,
+                                                              drift.beverage_count, drift.computed_beverage_count))
+        logging.info('Found {} orders with drifted totals'.format(len(drifts)))
+
+        if repair and drifts:
+            repaired = order_crud.update_totals_of_orders(db)
+            db.commit()
+            logging.info('Repaired totals of {} orders'.format(repaired))
+        return drifts
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute the stored order totals and report drift.')
+    parser.add_argument('--repair', action='store_true', help='overwrite drifted totals with the recomputed ones')
+    args = parser.parse_args()
+    order_drifts = verify_order_totals(args.repair)
+    # A non-zero exit code lets a scheduler flag unrepaired drift
+    raise SystemExit(1 if order_drifts and not args.repair else 0)
@@ -4,7 +4,10 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.v1.endpoints.order.router import NEXT_CURSOR_HEADER
+from app.api.v1.idempotency import IDEMPOTENT_REPLAYED_HEADER
 from app.api.v1.router import router as api_v1_router
+from app.database.connection import async_db_engine
 
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.DEBUG)  # NOSONAR
 
@@ -37,6 +40,18 @@ tags_metadata = [
         'name': 'sauce',
         'description': 'Operations with sauces. ',
     },
+    {
+        'name': 'metrics',
+        'description': 'Runtime metrics of the service. ',
+    },
+    {
+        'name': 'menu',
+        'description': 'The whole catalog in one response. ',
+    },
+    {
+        'name': 'stock',
+        'description': 'Bulk changes of the ingredient and beverage stock. ',
+    },
 ]
 
 app = FastAPI(openapi_tags=tags_metadata)
@@ -52,9 +67,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
-    expose_headers=[],
+    expose_headers=[NEXT_CURSOR_HEADER, 'ETag', IDEMPOTENT_REPLAYED_HEADER],
 )
 
+
+@app.on_event('shutdown')
+async def dispose_async_db_engine():
+    if async_db_engine is not None:
+        await async_db_engine.dispose()
+
+
 # This function routes to version 1 of the REST API /v1/..
 app.include_router(
     api_v1_router,
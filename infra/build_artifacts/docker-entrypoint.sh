@@ -4,7 +4,8 @@ set -e
 
 if [ -z "${1-}" ];
 then
-cmd="uvicorn --host 0.0.0.0 app.main:app"
+# Worker count, recycling and restarts are configured with the WEB_* variables of app/gunicorn_conf.py
+cmd="gunicorn --config app/gunicorn_conf.py app.main:app"
 else	cmd="$@"
 fi
 exec $cmd
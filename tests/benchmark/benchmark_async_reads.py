@@ -0,0 +1,81 @@
+"""Compare the throughput of the sync and the async catalog reads under a slow database.
+
+Every simulated request sleeps in Postgres for --latency seconds and then lists all doughs.
+Sync requests run in the anyio threadpool like sync FastAPI routes, async requests run on the event loop.
+
+    python tests/benchmark/benchmark_async_reads.py --requests 1000 --concurrency 200 --pool-size 80
+"""
+import argparse
+import asyncio
+import time
+
+import anyio
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import app.api.v1.endpoints.dough.async_crud as dough_async_crud
+import app.api.v1.endpoints.dough.crud as dough_crud
+from app.database.connection import DATABASE_URL, create_async_db_engine
+
+
+async def run_sync_requests(args):
+    engine = create_engine(DATABASE_URL, pool_size=args.pool_size, max_overflow=0)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def handle_request():
+        with session_local() as db:
+            db.execute(select(func.pg_sleep(args.latency)))
+            dough_crud.get_all_doughs(db)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    print('threadpool size {}'.format(anyio.to_thread.current_default_thread_limiter().total_tokens))
+
+    async def request():
+        async with semaphore:
+            # Same path as a sync route: one threadpool thread per request
+            await anyio.to_thread.run_sync(handle_request)
+
+    try:
+        return await measure(request, args.requests)
+    finally:
+        engine.dispose()
+
+
+async def run_async_requests(args):
+    engine = create_async_db_engine(pool_size=args.pool_size, max_overflow=0)
+    session_local = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def request():
+        async with semaphore, session_local() as db:
+            await db.execute(select(func.pg_sleep(args.latency)))
+            await dough_async_crud.get_all_doughs(db)
+
+    try:
+        return await measure(request, args.requests)
+    finally:
+        await engine.dispose()
+
+
+async def measure(request, number_of_requests: int):
+    start = time.perf_counter()
+    await asyncio.gather(*[request() for _ in range(number_of_requests)])
+    return number_of_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=200, help='requests in flight at the same time')
+    parser.add_argument('--pool-size', type=int, default=80, help='connections of each engine')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds every request waits on Postgres')
+    args = parser.parse_args()
+
+    print('pool size {}, concurrency {}, latency {}s'.format(args.pool_size, args.concurrency, args.latency))
+    print('sync:  {:8.1f} requests/s'.format(asyncio.run(run_sync_requests(args))))
+    print('async: {:8.1f} requests/s'.format(asyncio.run(run_async_requests(args))))
+
+
+if __name__ == '__main__':
+    main()
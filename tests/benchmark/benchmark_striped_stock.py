@@ -0,0 +1,76 @@
+"""Compare the throughput of stock decrements on one dough row and on striped dough stock.
+
+Every simulated order takes one dough and keeps its transaction open for --latency seconds, like the
+rest of the add pizza path does. Without stripes the orders queue on the lock of the dough row.
+
+    python tests/benchmark/benchmark_striped_stock.py --orders 400 --concurrency 32 --stripes 1 8 32
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import sessionmaker
+
+import app.api.v1.endpoints.order.stock_logic.stock_stripes as stock_stripes
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas, new_stock_deltas
+from app.database.connection import DATABASE_URL
+from app.database.models import Dough, StockStripe, map_striped_stock
+
+
+def run_orders(session_local, dough_id: uuid.UUID, args):
+    def order():
+        with session_local() as db:
+            deltas = new_stock_deltas()
+            deltas[Dough][dough_id] -= 1
+            apply_stock_deltas(deltas, db)
+            db.execute(select(func.pg_sleep(args.latency)))
+            db.commit()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        for future in [executor.submit(order) for _ in range(args.orders)]:
+            future.result()
+    return args.orders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32, help='orders in flight at the same time')
+    parser.add_argument('--stripes', type=int, nargs='+', default=[1, 8, 32], help='1 runs without stripes')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds every order keeps its transaction')
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL, pool_size=args.concurrency, max_overflow=0)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    print('orders {}, concurrency {}, latency {}s'.format(args.orders, args.concurrency, args.latency))
+    try:
+        for stripes in args.stripes:
+            with session_local() as db:
+                dough = Dough(name='benchmark_striped_dough_{}'.format(uuid.uuid4()), price=1, stock=args.orders)
+                db.add(dough)
+                db.flush()
+                if stripes > 1:
+                    stock_stripes.stripe_stock(Dough, dough.id, stripes, db)
+                    stock_stripes.rebalance_stripes(Dough, dough.id, db)
+                db.commit()
+                dough_id = dough.id
+
+            stock_stripes.STOCK_STRIPES = stripes if stripes > 1 else 0
+            if stock_stripes.STOCK_STRIPES:
+                map_striped_stock()
+            throughput = run_orders(session_local, dough_id, args)
+            print('{:3} stripes: {:8.1f} orders/s'.format(stripes, throughput))
+
+            with session_local() as db:
+                db.execute(delete(StockStripe).where(StockStripe.ingredient_id == dough_id))
+                db.execute(delete(Dough).where(Dough.id == dough_id))
+                db.commit()
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
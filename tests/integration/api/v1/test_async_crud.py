@@ -0,0 +1,46 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.api.v1.endpoints.dough.async_crud as dough_async_crud
+import app.api.v1.endpoints.dough.crud as dough_crud
+from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
+from app.database.connection import SessionLocal, create_async_db_engine
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def test_dough_async_read(db):
+    # Arrange
+    new_dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_async_dough', price=1.5, description='description', stock=3), db)
+
+    async def read_doughs():
+        engine = create_async_db_engine()
+        try:
+            async with AsyncSession(engine) as async_db:
+                return (await dough_async_crud.get_dough_by_id(new_dough.id, async_db),
+                        await dough_async_crud.get_dough_by_id(uuid.uuid4(), async_db),
+                        await dough_async_crud.get_all_doughs(async_db))
+        finally:
+            await engine.dispose()
+
+    # Act
+    dough, missing_dough, all_doughs = asyncio.run(read_doughs())
+
+    # Assert: The async stack reads what the sync stack wrote
+    assert dough.name == 'test_async_dough'
+    assert dough.stock == 3
+    assert missing_dough is None
+    assert new_dough.id in [entity.id for entity in all_doughs]
+
+    dough_crud.delete_dough_by_id(new_dough.id, db)
@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import delete, event
+
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas, new_stock_deltas
+from app.database.catalog_cache import CatalogCache, catalog_cache
+from app.database.connection import SessionLocal, db_engine
+from app.database.models import Beverage, Dough
+
+import app.api.v1.endpoints.beverage.crud as beverage_crud
+from app.api.v1.endpoints.beverage.schemas import BeverageCreateSchema
+
+import app.api.v1.endpoints.dough.crud as dough_crud
+from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def test_catalog_cache(db):
+    # Arrange
+    new_beverage_schema = BeverageCreateSchema(
+        name='test_cache_beverage', price=2.0, description='description', stock=5)
+    new_beverage = beverage_crud.create_beverage(new_beverage_schema, db)
+    beverage_crud.get_beverage_by_id(new_beverage.id, db)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Act: Look up the beverage by id and name in a fresh session
+    hits_before = catalog_cache.hits
+    cached_db = SessionLocal()
+    event.listen(db_engine, 'before_cursor_execute', count_statement)
+    try:
+        beverage = beverage_crud.get_beverage_by_id(new_beverage.id, cached_db)
+        assert beverage_crud.get_beverage_by_name('test_cache_beverage', cached_db) is beverage
+        statements_of_lookups = len(statements)
+        # Stock is changed in another session after the beverage was cached
+        deltas = new_stock_deltas()
+        deltas[Beverage][new_beverage.id] -= 2
+        apply_stock_deltas(deltas, db)
+        db.commit()
+        stock = beverage.stock
+    finally:
+        event.remove(db_engine, 'before_cursor_execute', count_statement)
+        cached_db.close()
+
+    # Assert: The lookups were served from the cache after reading the table versions, the stock from the database
+    assert catalog_cache.hits == hits_before + 2
+    assert statements_of_lookups == 1
+    assert beverage.name == 'test_cache_beverage'
+    assert stock == 3
+
+    # Act: Update the price
+    beverage_crud.update_beverage(new_beverage, new_beverage_schema.copy(update={'price': 2.5}), db)
+
+    # Assert: The cached beverage was invalidated
+    with SessionLocal() as other_db:
+        assert beverage_crud.get_beverage_by_id(new_beverage.id, other_db).price == 2.5
+
+    # Act + Assert: A deleted beverage is not served from the cache
+    beverage_crud.delete_beverage_by_id(new_beverage.id, db)
+    with SessionLocal() as other_db:
+        assert beverage_crud.get_beverage_by_id(new_beverage.id, other_db) is None
+
+
+def test_catalog_cache_write_of_other_process(db):
+    # Arrange: A beverage cached by this process
+    new_beverage = beverage_crud.create_beverage(BeverageCreateSchema(
+        name='test_cache_deleted_beverage', price=2.0, description='description', stock=5), db)
+    with SessionLocal() as other_db:
+        beverage_crud.get_beverage_by_id(new_beverage.id, other_db)
+
+    # Act: Another process deletes it, this process's cache is not invalidated
+    db.execute(delete(Beverage).where(Beverage.id == new_beverage.id))
+    db.commit()
+
+    # Assert: The write bumped the table version, the entry is a miss and the beverage is not found
+    misses_before = catalog_cache.misses
+    with SessionLocal() as other_db:
+        assert beverage_crud.get_beverage_by_id(new_beverage.id, other_db) is None
+    assert catalog_cache.misses == misses_before + 1
+
+
+def test_catalog_cache_eviction(db):
+    # Arrange: One id and one name entry per dough fit
+    cache = CatalogCache(max_size=2, ttl=60)
+    new_doughs = [dough_crud.create_dough(
+        DoughCreateSchema(name='test_cache_dough_{}'.format(index), price=1.5, description='description', stock=1),
+        db) for index in range(2)]
+
+    # Act: Cache both doughs, the first one is least recently used
+    cache.get(Dough, 'id', new_doughs[0].id, db)
+    cache.get(Dough, 'id', new_doughs[1].id, db)
+    cache.get(Dough, 'id', new_doughs[1].id, db)
+    cache.get(Dough, 'id', new_doughs[0].id, db)
+
+    # Assert
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    for dough in new_doughs:
+        dough_crud.delete_dough_by_id(dough.id, db)
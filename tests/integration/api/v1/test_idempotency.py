@@ -0,0 +1,135 @@
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import func, select, update
+
+import app.api.v1.idempotency as idempotency
+from app.api.v1.idempotency import IdempotencyCache, StoredResponse
+from app.database.connection import SessionLocal
+from app.database.models import IdempotencyKey
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def age_key(key, seconds, db):
+    db.execute(update(IdempotencyKey)
+               .where(IdempotencyKey.key == key)
+               .values(created_at=func.now() - datetime.timedelta(seconds=seconds)))
+    db.commit()
+
+
+def test_idempotency_key_lifecycle(db):
+    # Arrange
+    key = 'test_idempotency_{}'.format(uuid.uuid4())
+    stored = StoredResponse('fingerprint', 201, 'application/json', b'{"id": 1}')
+
+    # Act: Claim the key, a second claim waits for the first request
+    claim = idempotency.claim_key(key, 'fingerprint', db)
+    assert claim is not None
+    db.commit()
+    assert idempotency.claim_key(key, 'fingerprint', db) is None
+    running, _ = idempotency.get_stored_response(key, db)
+    assert running == StoredResponse('fingerprint', None, None, None)
+
+    # Act: A failed request frees its key, the retry claims it again
+    idempotency.release_key(key, claim, db)
+    db.commit()
+    assert idempotency.get_stored_response(key, db) is None
+    claim = idempotency.claim_key(key, 'fingerprint', db)
+    db.commit()
+
+    # Assert: The stored response is kept for the retention and cannot be claimed over
+    assert idempotency.store_response(key, claim, stored, db)
+    db.commit()
+    found, remaining = idempotency.get_stored_response(key, db)
+    assert found == stored
+    assert 0 < remaining <= idempotency.IDEMPOTENCY_KEY_RETENTION
+    idempotency.release_key(key, claim, db)
+    assert idempotency.claim_key(key, 'other', db) is None
+    db.commit()
+
+    # Assert: Expired keys are gone for lookups, deleted in bulk and claimed anew
+    age_key(key, idempotency.IDEMPOTENCY_KEY_RETENTION + 1, db)
+    assert idempotency.get_stored_response(key, db) is None
+    assert idempotency.expire_keys(db) >= 1
+    db.commit()
+    assert db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key)) is None
+    claim = idempotency.claim_key(key, 'other', db)
+    db.commit()
+
+    # Assert: A request that never finished gives its key up after the claim timeout, its claim is void then
+    assert idempotency.claim_key(key, 'fingerprint', db) is None
+    age_key(key, idempotency.IDEMPOTENCY_KEY_CLAIM_TIMEOUT + 1, db)
+    retry_claim = idempotency.claim_key(key, 'fingerprint', db)
+    assert retry_claim not in (None, claim)
+    db.commit()
+    assert not idempotency.store_response(key, claim, stored, db)
+    idempotency.release_key(key, claim, db)
+    db.commit()
+    assert idempotency.get_stored_response(key, db) is not None
+    idempotency.release_key(key, retry_claim, db)
+    db.commit()
+
+
+def test_idempotency_key_applied(db):
+    # Arrange
+    key = 'test_idempotency_{}'.format(uuid.uuid4())
+    claim = idempotency.claim_key(key, 'fingerprint', db)
+    db.commit()
+
+    # Act: A commit of the endpoint marks the key in the same transaction
+    running = idempotency.running_claim.set((key, claim))
+    try:
+        db.commit()
+    finally:
+        idempotency.running_claim.reset(running)
+
+    # Assert: The failed request keeps its key, a retry after the claim timeout does not run it again
+    idempotency.release_key(key, claim, db)
+    db.commit()
+    applied, _ = idempotency.get_stored_response(key, db)
+    assert applied == StoredResponse('fingerprint', None, None, None, True)
+    age_key(key, idempotency.IDEMPOTENCY_KEY_CLAIM_TIMEOUT + 1, db)
+    assert idempotency.claim_key(key, 'fingerprint', db) is None
+    db.commit()
+
+    # Assert: A request taken over by a retry cannot commit its changes
+    age_key(key, idempotency.IDEMPOTENCY_KEY_RETENTION + 1, db)
+    retry_claim = idempotency.claim_key(key, 'fingerprint', db)
+    db.commit()
+    running = idempotency.running_claim.set((key, claim))
+    try:
+        with pytest.raises(idempotency.IdempotencyKeyTakenOverError):
+            db.commit()
+    finally:
+        idempotency.running_claim.reset(running)
+    db.rollback()
+    idempotency.release_key(key, retry_claim, db)
+    db.commit()
+    assert idempotency.get_stored_response(key, db) is None
+
+
+def test_idempotency_cache():
+    # Arrange
+    cache = IdempotencyCache(max_size=2)
+    stored = StoredResponse('fingerprint', 200, 'application/json', b'{}')
+
+    # Act
+    cache.put('a', stored, 60)
+    cache.put('b', stored, 60)
+    cache.get('a')
+    cache.put('c', stored, 60)
+
+    # Assert: The least recently used entry is evicted and expired entries are not served
+    assert cache.get('a') == stored
+    assert cache.get('b') is None
+    cache.put('d', stored, -1)
+    assert cache.get('d') is None
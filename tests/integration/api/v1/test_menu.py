@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from sqlalchemy import event
+
+import app.api.v1.endpoints.menu.crud as menu_crud
+from app.database.connection import SessionLocal, db_engine
+from app.database.models import SauceSpiciness
+
+import app.api.v1.endpoints.dough.crud as dough_crud
+from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
+
+import app.api.v1.endpoints.topping.crud as topping_crud
+from app.api.v1.endpoints.topping.schemas import ToppingCreateSchema
+
+import app.api.v1.endpoints.sauce.crud as sauce_crud
+from app.api.v1.endpoints.sauce.schemas import SauceCreateSchema
+
+import app.api.v1.endpoints.pizza_type.crud as pizza_type_crud
+from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeCreateSchema, PizzaTypeSauceQuantityCreateSchema, \
+    PizzaTypeToppingQuantityCreateSchema
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def count_statements_of_menu(db):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine, 'before_cursor_execute', count_statement)
+    try:
+        etag, body = menu_crud.get_menu(db)
+    finally:
+        event.remove(db_engine, 'before_cursor_execute', count_statement)
+    return len(statements), etag, json.loads(body)
+
+
+def test_menu(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_menu_dough', price=1.5, description='description', stock=5), db)
+    topping = topping_crud.create_topping(
+        ToppingCreateSchema(name='test_menu_topping', price=0.5, description='description', stock=4), db)
+    sauce = sauce_crud.create_sauce(
+        SauceCreateSchema(name='test_menu_sauce', price=0.5, description='description', stock=3,
+                          spiciness=SauceSpiciness.LEVEL1), db)
+    pizza_types = [pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_menu_pizza_{}'.format(index), price=4.5, description='description',
+                              dough_id=dough.id), db) for index in range(3)]
+    for pizza_type in pizza_types:
+        pizza_type_crud.create_topping_quantity(
+            pizza_type, PizzaTypeToppingQuantityCreateSchema(topping_id=topping.id, quantity=2), db)
+        pizza_type_crud.create_sauce_quantity(
+            pizza_type, PizzaTypeSauceQuantityCreateSchema(sauce_id=sauce.id, quantity=1), db)
+
+    # Act
+    statements_of_build, etag, menu = count_statements_of_menu(db)
+    statements_of_hit, cached_etag, _ = count_statements_of_menu(db)
+
+    # Assert: One query for the table versions and one per table no matter how many pizza types there are,
+    # then served from the cache after reading the versions
+    assert statements_of_build == 5
+    assert statements_of_hit == 1
+    assert cached_etag == etag
+    menu_pizza_types = [item for item in menu['pizza_types'] if item['name'].startswith('test_menu_pizza_')]
+    assert [item['name'] for item in menu_pizza_types] == ['test_menu_pizza_{}'.format(index) for index in range(3)]
+    for item in menu_pizza_types:
+        assert item['dough']['name'] == 'test_menu_dough'
+        assert [(topping_item['name'], topping_item['quantity']) for topping_item in item['toppings']] \
+            == [('test_menu_topping', 2)]
+        assert [(sauce_item['name'], sauce_item['quantity']) for sauce_item in item['sauces']] \
+            == [('test_menu_sauce', 1)]
+        assert 'stock' not in item['dough']
+
+    # Act: Change the price of the topping
+    topping_crud.update_topping(
+        topping, ToppingCreateSchema(name='test_menu_topping', price=0.75, description='description', stock=4), db)
+    statements_of_rebuild, new_etag, menu = count_statements_of_menu(db)
+
+    # Assert: The menu was rebuilt with the new price
+    assert statements_of_rebuild == 5
+    assert new_etag != etag
+    menu_pizza_type = next(item for item in menu['pizza_types'] if item['name'] == 'test_menu_pizza_0')
+    assert menu_pizza_type['toppings'][0]['price'] == 0.75
+
+    for pizza_type in pizza_types:
+        pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
+    topping_crud.delete_topping_by_id(topping.id, db)
+    sauce_crud.delete_sauce_by_id(sauce.id, db)
@@ -1,8 +1,12 @@
+from decimal import Decimal
+
 import pytest
+from sqlalchemy import event, update
 
 import app.api.v1.endpoints.order.crud as order_crud
-from app.api.v1.endpoints.order.schemas import OrderCreateSchema
-from app.database.connection import SessionLocal
+from app.api.v1.endpoints.order.schemas import OrderCreateSchema, OrderSchema, OrderStatus
+from app.database.connection import SessionLocal, db_engine
+from app.database.models import Beverage
 
 import app.api.v1.endpoints.order.address.crud as address_crud
 from app.api.v1.endpoints.order.address.schemas import AddressCreateSchema
@@ -16,6 +20,12 @@ from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeCreateSchema
 import app.api.v1.endpoints.dough.crud as dough_crud
 from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
 
+import app.api.v1.endpoints.beverage.crud as beverage_crud
+from app.api.v1.endpoints.beverage.schemas import BeverageCreateSchema
+
+from app.api.v1.endpoints.order.schemas import OrderBeverageQuantityCreateSchema
+from app.exceptions.stock_error import OutOfStockError
+
 
 @pytest.fixture(scope='module')
 def db():
@@ -99,6 +109,31 @@ def test_order_create_read_delete(db):
     assert order_crud.get_pizza_by_id(all_pizzas[0].id, db)
     assert len(all_pizzas_before) + 1 == len(all_pizzas)
 
+    # Assert: Price of order is the price of the pizza
+    prices = order_crud.get_prices_of_orders(db, order_ids=[created_order_id])
+    assert [(price.order_id, price.price) for price in prices] == [(created_order_id, Decimal('1.50'))]
+    # Assert: Prices of all orders come in pages
+    first_page = order_crud.get_prices_of_orders(db, limit=1)
+    assert len(first_page) == 1
+    assert first_page[0].order_id not in [price.order_id for price in order_crud.get_prices_of_orders(
+        db, after=(first_page[0].order_datetime, first_page[0].id))]
+
+    # Assert: Stored totals match the recomputed ones
+    read_order = order_crud.get_order_by_id(created_order_id, db)
+    assert read_order.total_price == Decimal('1.50')
+    assert read_order.pizza_count == 1
+    assert created_order_id not in [drift.order_id for drift in order_crud.get_drift_of_order_totals(db)]
+
+    # Act: Let the stored total drift and repair it
+    order_crud.change_totals_of_order(created_order_id, db, price=Decimal('1.00'))
+    db.commit()
+    assert created_order_id in [drift.order_id for drift in order_crud.get_drift_of_order_totals(db)]
+    order_crud.update_totals_of_orders(db, order_ids=[created_order_id])
+    db.commit()
+
+    # Assert: Drift was repaired
+    assert order_crud.get_order_by_id(created_order_id, db).total_price == Decimal('1.50')
+
     # Act: Delete order
     order_crud.delete_order_by_id(created_order_id, db)
 
@@ -116,3 +151,197 @@ def test_order_create_read_delete(db):
     user_crud.delete_user_by_id(new_user.id, db)
     pizza_type_crud.delete_pizza_type_by_id(new_pizza_type.id, db)
     dough_crud.delete_dough_by_id(new_dough_id, db)
+
+
+def test_order_copy(db):
+    # Arrange
+    new_address_schema = AddressCreateSchema(
+        street='Test',
+        post_code='Test',
+        house_number=1,
+        country='Test',
+        town='Test',
+        first_name='Test',
+        last_name='Test',
+    )
+    new_user = user_crud.create_user(UserCreateSchema(username='TestCopy'), db)
+    new_order_schema = OrderCreateSchema(
+        user_id=new_user.id,
+        address=new_address_schema,
+    )
+    new_dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_copy_dough', price=1.5, description='description', stock=3), db)
+    new_pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_copy_pizza', price=4.5, description='description', dough_id=new_dough.id),
+        db)
+    new_beverage = beverage_crud.create_beverage(
+        BeverageCreateSchema(name='test_copy_beverage', price=2.0, description='description', stock=5), db)
+
+    source_order = order_crud.create_order(new_order_schema, db)
+    order_crud.add_pizza_to_order(source_order, new_pizza_type, db)
+    order_crud.add_pizza_to_order(source_order, new_pizza_type, db)
+    order_crud.create_beverage_quantity(
+        source_order, OrderBeverageQuantityCreateSchema(beverage_id=new_beverage.id, quantity=3), db)
+    number_of_orders_before = len(order_crud.get_all_orders(db))
+
+    # Act: Copy order
+    copied_order = order_crud.copy_order(new_order_schema, source_order, db)
+
+    # Assert: Items were copied and the stock was reduced once per item
+    assert len(order_crud.get_all_pizzas_of_order(copied_order, db)) == 2
+    assert order_crud.get_beverage_quantity_by_id(copied_order.id, new_beverage.id, db).quantity == 3
+    assert dough_crud.get_dough_by_id(new_dough.id, db).stock == 1
+    assert beverage_crud.get_beverage_by_id(new_beverage.id, db).stock == 2
+    assert len(order_crud.get_all_orders(db)) == number_of_orders_before + 1
+    assert copied_order.total_price == Decimal('15.00')
+    assert copied_order.pizza_count == 2
+    assert copied_order.beverage_count == 3
+
+    # Act + Assert: Copy order without enough stock left
+    with pytest.raises(OutOfStockError):
+        order_crud.copy_order(new_order_schema, source_order, db)
+
+    # Assert: Nothing was stored and the stock is unchanged
+    assert len(order_crud.get_all_orders(db)) == number_of_orders_before + 1
+    assert dough_crud.get_dough_by_id(new_dough.id, db).stock == 1
+    assert beverage_crud.get_beverage_by_id(new_beverage.id, db).stock == 2
+
+    # Act: Change the prices, then remove items of the source order
+    pizza_type_crud.update_pizza_type(new_pizza_type, PizzaTypeCreateSchema(
+        name='test_copy_pizza', price=9.0, description='description', dough_id=new_dough.id), db)
+    db.execute(update(Beverage).where(Beverage.id == new_beverage.id).values(price=Decimal('7.00')))
+    db.commit()
+    order_crud.delete_pizza_from_order(source_order, order_crud.get_all_pizzas_of_order(source_order, db)[0].id, db)
+    order_crud.delete_beverage_from_order(source_order.id, new_beverage.id, db)
+
+    # Assert: Items leave the total at the price they were added at, old orders do not drift
+    assert order_crud.get_order_by_id(source_order.id, db).total_price == Decimal('4.50')
+    drifted = [drift.order_id for drift in order_crud.get_drift_of_order_totals(db)]
+    assert source_order.id not in drifted and copied_order.id not in drifted
+
+    order_crud.delete_order_by_id(copied_order.id, db)
+    order_crud.delete_order_by_id(source_order.id, db)
+    user_crud.delete_user_by_id(new_user.id, db)
+    pizza_type_crud.delete_pizza_type_by_id(new_pizza_type.id, db)
+    dough_crud.delete_dough_by_id(new_dough.id, db)
+    beverage_crud.delete_beverage_by_id(new_beverage.id, db)
+
+
+def test_order_pagination(db):
+    # Arrange
+    new_user = user_crud.create_user(UserCreateSchema(username='TestPagination'), db)
+    new_order_schema = OrderCreateSchema(
+        user_id=new_user.id,
+        address=AddressCreateSchema(street='Test', post_code='Test', house_number=1, country='Test', town='Test',
+                                    first_name='Test', last_name='Test'),
+    )
+    new_order_ids = [order_crud.create_order(new_order_schema, db).id for _ in range(3)]
+
+    # Act: Walk through all orders with a page size of 2
+    read_order_ids = []
+    after = None
+    while True:
+        page = order_crud.get_all_orders(db, limit=2, after=after)
+        read_order_ids += [order.id for order in page]
+        if len(page) < 2:
+            break
+        after = order_crud.decode_order_cursor(order_crud.encode_order_cursor(page[-1]))
+
+    # Assert: Every order is read exactly once, in creation order
+    assert len(read_order_ids) == len(set(read_order_ids)) == len(order_crud.get_all_orders(db))
+    assert [order_id for order_id in read_order_ids if order_id in new_order_ids] == new_order_ids
+
+    for order_id in new_order_ids:
+        order_crud.delete_order_by_id(order_id, db)
+    user_crud.delete_user_by_id(new_user.id, db)
+
+
+def test_order_list_query_count(db):
+    # Arrange
+    new_user = user_crud.create_user(UserCreateSchema(username='TestQueryCount'), db)
+    new_order_schema = OrderCreateSchema(
+        user_id=new_user.id,
+        address=AddressCreateSchema(street='Test', post_code='Test', house_number=1, country='Test', town='Test',
+                                    first_name='Test', last_name='Test'),
+    )
+    new_order_ids = []
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def count_statements_of_listing():
+        # A fresh session, so nothing is served from the identity map
+        list_db = SessionLocal()
+        statements.clear()
+        event.listen(db_engine, 'before_cursor_execute', count_statement)
+        try:
+            orders = user_crud.get_open_orders_of_user(new_user.id, list_db)
+            assert len([OrderSchema.from_orm(order) for order in orders]) == len(new_order_ids)
+            orders = order_crud.get_all_orders(list_db, limit=len(new_order_ids))
+            [OrderSchema.from_orm(order) for order in orders]
+        finally:
+            event.remove(db_engine, 'before_cursor_execute', count_statement)
+            list_db.close()
+        return len(statements)
+
+    # Act: List and serialize 2 and then 6 orders
+    new_order_ids += [order_crud.create_order(new_order_schema, db).id for _ in range(2)]
+    statements_for_2_orders = count_statements_of_listing()
+    new_order_ids += [order_crud.create_order(new_order_schema, db).id for _ in range(4)]
+    statements_for_6_orders = count_statements_of_listing()
+
+    # Assert: The number of statements does not grow with the number of orders
+    assert statements_for_2_orders == statements_for_6_orders
+
+    for order_id in new_order_ids:
+        order_crud.delete_order_by_id(order_id, db)
+    user_crud.delete_user_by_id(new_user.id, db)
+
+
+def test_order_export(db):
+    # Arrange
+    new_user = user_crud.create_user(UserCreateSchema(username='TestExport'), db)
+    new_order_schema = OrderCreateSchema(
+        user_id=new_user.id,
+        address=AddressCreateSchema(street='Test', post_code='Test', house_number=1, country='Test', town='Test',
+                                    first_name='Test', last_name='Test'),
+    )
+    new_dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_export_dough', price=1.5, description='description', stock=3), db)
+    new_pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_export_pizza', price=4.5, description='description', dough_id=new_dough.id),
+        db)
+    new_beverage = beverage_crud.create_beverage(
+        BeverageCreateSchema(name='test_export_beverage', price=2.0, description='description', stock=5), db)
+    new_orders = [order_crud.create_order(new_order_schema, db) for _ in range(3)]
+    order_crud.add_pizzas_to_order(new_orders[0], [(new_pizza_type, 2)], db)
+    order_crud.create_beverage_quantity(
+        new_orders[0], OrderBeverageQuantityCreateSchema(beverage_id=new_beverage.id, quantity=3), db)
+    order_crud.update_order_status(new_orders[2], OrderStatus.COMPLETED, db)
+
+    # Act: Export all orders since the first new one, two orders per chunk
+    rows = list(order_crud.stream_orders_for_export(db, start=new_orders[0].order_datetime,
+                                                    with_items=True, with_prices=True, chunk_size=2))
+
+    # Assert: Every new order is exported once, in creation order, with its items and price
+    assert [row['id'] for row in rows] == [str(order.id) for order in new_orders]
+    assert rows[0]['price'] == '15.00'
+    assert rows[0]['pizzas'] == {str(new_pizza_type.id): 2}
+    assert rows[0]['beverages'] == {str(new_beverage.id): 3}
+    assert rows[1]['pizzas'] == rows[1]['beverages'] == {}
+
+    # Act + Assert: Filter by status and end of the date range
+    rows = list(order_crud.stream_orders_for_export(db, status=OrderStatus.COMPLETED,
+                                                    start=new_orders[0].order_datetime))
+    assert [row['id'] for row in rows] == [str(new_orders[2].id)]
+    assert 'pizzas' not in rows[0] and 'price' not in rows[0]
+    assert not list(order_crud.stream_orders_for_export(db, end=new_orders[0].order_datetime,
+                                                        start=new_orders[0].order_datetime))
+
+    for order in new_orders:
+        order_crud.delete_order_by_id(order.id, db)
+    user_crud.delete_user_by_id(new_user.id, db)
+    pizza_type_crud.delete_pizza_type_by_id(new_pizza_type.id, db)
+    dough_crud.delete_dough_by_id(new_dough.id, db)
+    beverage_crud.delete_beverage_by_id(new_beverage.id, db)
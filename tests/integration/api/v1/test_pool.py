@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from sqlalchemy import exc, text
+
+from app.api.v1.endpoints.metrics.router import get_pool_metrics
+from app.database.connection import db_engine, recreate_pools_after_fork
+from app.database.pool import TimedQueuePool
+
+
+def test_pool_metrics():
+    # Arrange
+    waits_before = db_engine.pool.wait_stats.count
+
+    # Act: Hold one connection while reading the metrics
+    with db_engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+        metrics = get_pool_metrics()[0]
+
+    # Assert
+    assert metrics.engine == 'sync'
+    assert metrics.checked_out >= 1
+    assert metrics.waits == waits_before + 1
+    assert metrics.wait_seconds_max >= metrics.wait_seconds_average >= 0
+    assert get_pool_metrics()[0].checked_out == metrics.checked_out - 1
+
+
+def test_pool_wait_leaves_out_connects():
+    # Arrange: A pool whose connections take long to open
+    def slow_connect():
+        time.sleep(0.2)
+        return db_engine.pool._creator()
+
+    pool = TimedQueuePool(slow_connect, pool_size=1, max_overflow=0, timeout=0.1)
+
+    # Act: Open the first connection, then wait in vain for a second one
+    connection = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    connection.close()
+    pool.dispose()
+
+    # Assert: The slow connect is no wait, the timeout is
+    assert pool.wait_stats.count == 2
+    assert pool.wait_stats.timeouts == 1
+    assert pool.wait_stats.total_seconds < 0.2
+
+
+def test_recreate_pools_after_fork():
+    # Arrange: A connection checked out of the inherited pool
+    inherited_pool = db_engine.pool
+    connection = db_engine.connect()
+
+    # Act
+    recreate_pools_after_fork()
+
+    # Assert: A fresh timed pool, the inherited connection was not closed
+    assert db_engine.pool is not inherited_pool
+    assert isinstance(db_engine.pool, TimedQueuePool)
+    assert db_engine.pool.checkedout() == 0
+    assert connection.execute(text('SELECT 1')).scalar() == 1
+    connection.close()
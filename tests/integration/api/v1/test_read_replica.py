@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, event, select
+
+from app.database.connection import DATABASE_URL, RoutingSession, db_engine
+from app.database.models import Dough
+
+
+def test_routing_session():
+    # Arrange: A second engine on the same database stands in for the replica
+    replica_engine = create_engine(DATABASE_URL)
+    db = RoutingSession(primary=db_engine, replica=replica_engine)
+    statements = {db_engine: [], replica_engine: []}
+
+    def record_statement(engine):
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements[engine].append(statement.split()[0])
+        return record
+
+    listeners = [(engine, record_statement(engine)) for engine in statements]
+    for engine, listener in listeners:
+        event.listen(engine, 'before_cursor_execute', listener)
+
+    try:
+        # Act: Write and then read a dough
+        dough = Dough(name='test_replica_dough', price=1.5, description='description', stock=1)
+        db.add(dough)
+        db.commit()
+        read_dough = db.scalar(select(Dough).where(Dough.name == 'test_replica_dough'))
+        db.delete(read_dough)
+        db.commit()
+    finally:
+        for engine, listener in listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+        db.close()
+        replica_engine.dispose()
+
+    # Assert: The flushes went to the primary and the read to the replica
+    assert read_dough.id == dough.id
+    assert statements[db_engine] == ['INSERT', 'DELETE']
+    assert statements[replica_engine] == ['SELECT']
+
+    # Assert: Without a replica everything uses the primary
+    assert RoutingSession(primary=db_engine).get_bind(clause=select(Dough)) is db_engine
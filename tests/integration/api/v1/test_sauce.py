@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 import app.api.v1.endpoints.sauce.crud as sauce_crud
@@ -68,3 +70,32 @@ def test_sauce_create_read_delete(db):
     # Assert: Correct sauce was deleted from database
     deleted_sauce = sauce_crud.get_sauce_by_id(created_sauce_id, db)
     assert deleted_sauce is None
+
+
+def test_sauces_grouped_by_spiciness(db):
+    # Arrange
+    sauce_schema = SauceCreateSchema(name='test_grouped_sauce', price=1.0, description='description',
+                                     spiciness=SauceSpiciness.LEVEL3, stock=10)
+    sauce = sauce_crud.create_sauce(sauce_schema, db)
+
+    # Act
+    etag, body = sauce_crud.get_sauces_grouped_by_spiciness(db)
+    cached_etag, cached_body = sauce_crud.get_sauces_grouped_by_spiciness(db)
+    groups = json.loads(body)
+
+    # Assert: Every level is listed, the second call is served from the cache
+    assert set(groups) == {'0', '1', '2', '3'}
+    assert 'test_grouped_sauce' in [item['name'] for item in groups['3']]
+    assert (cached_etag, cached_body) == (etag, body)
+
+    # Act: Change the spiciness
+    sauce_crud.update_sauce(sauce, sauce_schema.copy(update={'spiciness': SauceSpiciness.LEVEL0}), db)
+    new_etag, body = sauce_crud.get_sauces_grouped_by_spiciness(db)
+    groups = json.loads(body)
+
+    # Assert: The write invalidated the groups
+    assert new_etag != etag
+    assert 'test_grouped_sauce' in [item['name'] for item in groups['0']]
+    assert 'test_grouped_sauce' not in [item['name'] for item in groups['3']]
+
+    sauce_crud.delete_sauce_by_id(sauce.id, db)
@@ -0,0 +1,507 @@
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm.exc import StaleDataError
+
+import app.api.v1.endpoints.order.stock_logic.stock_ingredients_crud as stock_ingredients_crud
+import app.api.v1.endpoints.order.stock_logic.stock_reservation_crud as stock_reservation_crud
+import app.api.v1.endpoints.order.stock_logic.stock_stripes as stock_stripes
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas, new_stock_deltas
+from app.api.v1.endpoints.pizza_type.recipe import get_recipe_of_pizza_type
+import app.api.v1.endpoints.stock.crud as stock_crud
+from app.api.v1.endpoints.stock.schemas import StockDeltaSchema, StockDeltasSchema
+from app.database.connection import SessionLocal, db_engine
+from app.database.versioning import commit_if_unchanged
+from app.database.models import Beverage, Dough, Order, OrderStatus, PizzaTypeSauceQuantity, Sauce, SauceSpiciness, \
+    StockReservation, StockStripe, Topping, map_striped_stock
+from app.exceptions.stock_error import OutOfStockError, ReservationExpiredError
+
+import app.api.v1.endpoints.beverage.crud as beverage_crud
+from app.api.v1.endpoints.beverage.schemas import BeverageCreateSchema
+
+import app.api.v1.endpoints.dough.crud as dough_crud
+from app.api.v1.endpoints.dough.schemas import DoughCreateSchema
+
+import app.api.v1.endpoints.topping.crud as topping_crud
+from app.api.v1.endpoints.topping.schemas import ToppingCreateSchema
+
+import app.api.v1.endpoints.sauce.crud as sauce_crud
+from app.api.v1.endpoints.sauce.schemas import SauceCreateSchema
+
+import app.api.v1.endpoints.order.crud as order_crud
+from app.api.v1.endpoints.order.schemas import OrderBeverageQuantityCreateSchema, OrderCreateSchema
+from app.api.v1.endpoints.order.address.schemas import AddressCreateSchema
+
+import app.api.v1.endpoints.user.crud as user_crud
+from app.api.v1.endpoints.user.schemas import UserCreateSchema
+
+import app.api.v1.endpoints.pizza_type.crud as pizza_type_crud
+from app.api.v1.endpoints.pizza_type.schemas import PizzaTypeCreateSchema, PizzaTypeSauceQuantityCreateSchema, \
+    PizzaTypeToppingQuantityCreateSchema
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def create_order(username: str, db):
+    user = user_crud.create_user(UserCreateSchema(username=username), db)
+    address = AddressCreateSchema(street='Test', post_code='Test', house_number=1, country='Test', town='Test',
+                                  first_name='Test', last_name='Test')
+    return order_crud.create_order(OrderCreateSchema(user_id=user.id, address=address), db)
+
+
+def get_holds(order_id, db):
+    return dict(db.execute(select(StockReservation.ingredient_id, StockReservation.quantity)
+                           .where(StockReservation.order_id == order_id)).all())
+
+
+def expire_holds(order_id, db):
+    db.execute(update(Order)
+               .where(Order.id == order_id)
+               .values(reserved_until=func.now() - datetime.timedelta(seconds=1)))
+    db.commit()
+
+
+def test_stock_deltas(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_stock_dough', price=1.5, description='description', stock=2), db)
+    topping = topping_crud.create_topping(
+        ToppingCreateSchema(name='test_stock_topping', price=0.5, description='description', stock=5), db)
+    beverage = beverage_crud.create_beverage(
+        BeverageCreateSchema(name='test_stock_beverage', price=2.0, description='description', stock=1), db)
+
+    # Act: Reduce stock of both tables
+    deltas = new_stock_deltas()
+    deltas[Dough][dough.id] -= 2
+    deltas[Topping][topping.id] -= 3
+    apply_stock_deltas(deltas, db)
+    db.commit()
+
+    # Assert: Stock was reduced
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 0
+    assert topping_crud.get_topping_by_id(topping.id, db).stock == 2
+
+    # Act: Reduce stock of one ingredient below zero
+    deltas = new_stock_deltas()
+    deltas[Dough][dough.id] += 1
+    deltas[Topping][topping.id] -= 3
+    with pytest.raises(OutOfStockError) as error:
+        apply_stock_deltas(deltas, db)
+    db.rollback()
+
+    # Assert: The short ingredient is reported and nothing was changed
+    assert error.value.shortages == [('topping', topping.id)]
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 0
+    assert topping_crud.get_topping_by_id(topping.id, db).stock == 2
+
+    # Act + Assert: Beverage stock can not get smaller than zero
+    for delta in (-2, -1):
+        deltas = new_stock_deltas()
+        deltas[Beverage][beverage.id] += delta
+        try:
+            apply_stock_deltas(deltas, db)
+        except OutOfStockError:
+            db.rollback()
+        db.commit()
+    assert beverage_crud.get_beverage_by_id(beverage.id, db).stock == 0
+
+    # Act + Assert: Stock of an unknown beverage is never changed, neither up nor down
+    for delta in (1, -1):
+        deltas = new_stock_deltas()
+        deltas[Beverage][uuid.uuid4()] += delta
+        with pytest.raises(OutOfStockError):
+            apply_stock_deltas(deltas, db)
+        db.rollback()
+
+    dough_crud.delete_dough_by_id(dough.id, db)
+    topping_crud.delete_topping_by_id(topping.id, db)
+    beverage_crud.delete_beverage_by_id(beverage.id, db)
+
+
+def test_recipe_of_pizza_type(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_recipe_dough', price=1.5, description='description', stock=5), db)
+    toppings = [topping_crud.create_topping(
+        ToppingCreateSchema(name='test_recipe_topping_{}'.format(index), price=0.5, description='description',
+                            stock=4), db) for index in range(2)]
+    sauce = sauce_crud.create_sauce(
+        SauceCreateSchema(name='test_recipe_sauce', price=0.5, description='description', stock=3,
+                          spiciness=SauceSpiciness.LEVEL1), db)
+    pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_recipe_pizza', price=4.5, description='description', dough_id=dough.id), db)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Act + Assert: The recipe is rebuilt whenever a topping or sauce quantity is added
+    assert get_recipe_of_pizza_type(pizza_type.id, db) == ((Dough, dough.id, 1),)
+    for topping in toppings:
+        pizza_type_crud.create_topping_quantity(
+            pizza_type, PizzaTypeToppingQuantityCreateSchema(topping_id=topping.id, quantity=2), db)
+    pizza_type_crud.create_sauce_quantity(
+        pizza_type, PizzaTypeSauceQuantityCreateSchema(sauce_id=sauce.id, quantity=3), db)
+    assert set(get_recipe_of_pizza_type(pizza_type.id, db)) == {
+        (Dough, dough.id, 1), (Topping, toppings[0].id, 2), (Topping, toppings[1].id, 2), (Sauce, sauce.id, 3)}
+
+    # Act: Reduce the stock with the compiled recipe
+    assert stock_ingredients_crud.get_producible_counts_of_pizza_types(db)[pizza_type.id] == 1
+    event.listen(db_engine, 'before_cursor_execute', count_statement)
+    try:
+        apply_stock_deltas(stock_ingredients_crud.get_stock_deltas_of_pizza_type(pizza_type, -1, db), db)
+        db.commit()
+    finally:
+        event.remove(db_engine, 'before_cursor_execute', count_statement)
+
+    # Assert: One query per ingredient table, no matter how many ingredients there are
+    assert len(statements) == 3
+    assert topping_crud.get_topping_by_id(toppings[0].id, db).stock == 2
+    assert sauce_crud.get_sauce_by_id(sauce.id, db).stock == 0
+    assert stock_ingredients_crud.get_producible_counts_of_pizza_types(db)[pizza_type.id] == 0
+
+    # Act: Another process takes the sauce off the recipe, the recipe cache of this process is not invalidated
+    db.commit()
+    db.execute(delete(PizzaTypeSauceQuantity).where(PizzaTypeSauceQuantity.pizza_type_id == pizza_type.id))
+    db.commit()
+
+    # Assert: The write outdated the cached recipe, the pizza type can be made again
+    assert (Sauce, sauce.id, 3) not in get_recipe_of_pizza_type(pizza_type.id, db)
+    assert stock_ingredients_crud.get_producible_counts_of_pizza_types(db)[pizza_type.id] == 1
+
+    pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
+    for topping in toppings:
+        topping_crud.delete_topping_by_id(topping.id, db)
+    sauce_crud.delete_sauce_by_id(sauce.id, db)
+
+
+def test_producible_counts_of_pizza_types(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_producible_dough', price=1.5, description='description', stock=5), db)
+    topping = topping_crud.create_topping(
+        ToppingCreateSchema(name='test_producible_topping', price=0.5, description='description', stock=7), db)
+    sauce = sauce_crud.create_sauce(
+        SauceCreateSchema(name='test_producible_sauce', price=0.5, description='description', stock=4,
+                          spiciness=SauceSpiciness.LEVEL1), db)
+    plain_pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_producible_plain', price=3.5, description='description', dough_id=dough.id),
+        db)
+    pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_producible_pizza', price=4.5, description='description', dough_id=dough.id),
+        db)
+    pizza_type_crud.create_topping_quantity(
+        pizza_type, PizzaTypeToppingQuantityCreateSchema(topping_id=topping.id, quantity=2), db)
+    pizza_type_crud.create_sauce_quantity(
+        pizza_type, PizzaTypeSauceQuantityCreateSchema(sauce_id=sauce.id, quantity=1), db)
+
+    # Act
+    counts = stock_ingredients_crud.get_producible_counts_of_pizza_types(db)
+
+    # Assert: The plain pizza is limited by the dough, the other one by its topping (7 // 2)
+    assert counts[plain_pizza_type.id] == 5
+    assert counts[pizza_type.id] == 3
+
+    # Act: Bake two pizzas
+    apply_stock_deltas(stock_ingredients_crud.get_stock_deltas_of_pizza_types({pizza_type.id: 2}, db), db)
+    db.commit()
+    counts = stock_ingredients_crud.get_producible_counts_of_pizza_types(db)
+
+    # Assert: The counts follow the stock, 3 toppings are left for one more pizza
+    assert counts[plain_pizza_type.id] == 3
+    assert counts[pizza_type.id] == 1
+
+    pizza_type_crud.delete_pizza_type_by_id(plain_pizza_type.id, db)
+    pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
+    topping_crud.delete_topping_by_id(topping.id, db)
+    sauce_crud.delete_sauce_by_id(sauce.id, db)
+
+
+def test_change_stock_of_ingredients(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_bulk_stock_dough', price=1.5, description='description', stock=5), db)
+    beverage = beverage_crud.create_beverage(
+        BeverageCreateSchema(name='test_bulk_stock_beverage', price=2.0, description='description', stock=3), db)
+    unknown_id = uuid.uuid4()
+    more_dough = [StockDeltaSchema(id=dough.id, delta=10)]
+
+    # Act + Assert: All changes are applied at once
+    assert stock_crud.change_stock_of_ingredients(StockDeltasSchema(
+        doughs=more_dough, beverages=[StockDeltaSchema(id=beverage.id, delta=-1)]), db) == []
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 15
+    assert beverage_crud.get_beverage_by_id(beverage.id, db).stock == 2
+
+    # Act + Assert: Nothing is changed if one stock would drop below zero
+    with pytest.raises(OutOfStockError):
+        stock_crud.change_stock_of_ingredients(StockDeltasSchema(
+            doughs=more_dough, beverages=[StockDeltaSchema(id=beverage.id, delta=-3)]), db)
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 15
+
+    # Act + Assert: Nothing is changed if one ingredient is unknown
+    assert stock_crud.change_stock_of_ingredients(StockDeltasSchema(
+        doughs=more_dough, toppings=[StockDeltaSchema(id=unknown_id, delta=1)]), db) == [('topping', unknown_id)]
+    assert stock_crud.change_stock_of_ingredients(StockDeltasSchema(
+        doughs=more_dough, sauces=[StockDeltaSchema(id=unknown_id, delta=-1)]), db) == [('sauces', unknown_id)]
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 15
+
+    dough_crud.delete_dough_by_id(dough.id, db)
+    beverage_crud.delete_beverage_by_id(beverage.id, db)
+
+
+def test_stale_write_is_refused(db):
+    # Arrange: A client reads the topping through the catalog cache, then an order takes stock out
+    topping_schema = ToppingCreateSchema(name='test_stale_topping', price=1.0, description='description', stock=10)
+    topping = topping_crud.create_topping(topping_schema, db)
+    stale_db = SessionLocal()
+    read_version = topping_crud.get_topping_by_id(topping.id, stale_db).version
+    stale_db.commit()
+    deltas = new_stock_deltas()
+    deltas[Topping][topping.id] -= 2
+    apply_stock_deltas(deltas, db)
+    db.commit()
+
+    try:
+        # Act + Assert: The absolute write of the client is refused, even though the entity is a cache hit that
+        # would only load the current version at the flush
+        cached_topping = topping_crud.get_topping_by_id(topping.id, stale_db)
+        with pytest.raises(StaleDataError):
+            topping_crud.update_topping(cached_topping, topping_schema.copy(update={'price': 1.5}), stale_db,
+                                        read_version)
+
+        # Act + Assert: So is a write from an entity loaded before the decrement, it is not retried
+        stale_topping = stale_db.get(Topping, topping.id)
+        stale_topping.stock = 10
+        apply_stock_deltas(deltas, db)
+        db.commit()
+        with pytest.raises(StaleDataError):
+            commit_if_unchanged(stale_topping, lambda: setattr(stale_topping, 'price', 1.5), stale_db)
+
+        # Act: The client reads the row again and writes with the current version
+        current_topping = topping_crud.get_topping_by_id(topping.id, stale_db)
+        assert current_topping.stock == 6
+        topping_crud.update_topping(current_topping, topping_schema.copy(update={'price': 1.5}), stale_db,
+                                    current_topping.version)
+    finally:
+        stale_db.close()
+
+    # Assert: Only the write that saw both decrements was applied
+    db.refresh(topping)
+    assert topping.stock == 10
+    assert topping.price == 1.5
+    assert topping.version == 4
+
+    topping_crud.delete_topping_by_id(topping.id, db)
+
+
+def test_stock_holds_of_order(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_hold_dough', price=1.5, description='description', stock=5), db)
+    beverage = beverage_crud.create_beverage(
+        BeverageCreateSchema(name='test_hold_beverage', price=2.0, description='description', stock=5), db)
+    pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_hold_pizza', price=4.5, description='description', dough_id=dough.id), db)
+    order = create_order('TestHold', db)
+    assert order.reserved_until is not None
+
+    # Act: Add two pizzas and a beverage
+    for _ in range(2):
+        stock_reservation_crud.hold_stock_of_pizza(order.id, pizza_type, db)
+        order_crud.add_pizza_to_order(order, pizza_type, db)
+    assert stock_reservation_crud.change_stock_of_beverage_in_order(order.id, beverage.id, -2, db)
+    order_crud.create_beverage_quantity(
+        order, OrderBeverageQuantityCreateSchema(beverage_id=beverage.id, quantity=2), db)
+
+    # Assert: The stock is taken and held by the order
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 3
+    assert beverage_crud.get_beverage_by_id(beverage.id, db).stock == 3
+    assert get_holds(order.id, db) == {dough.id: 2, beverage.id: 2}
+
+    # Act: Remove one pizza
+    pizza = order_crud.get_all_pizzas_of_order(order, db)[0]
+    stock_reservation_crud.release_stock_of_pizza(order.id, pizza_type, db)
+    order_crud.delete_pizza_from_order(order, pizza.id, db)
+
+    # Assert: Its stock is given back
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 4
+    assert get_holds(order.id, db) == {dough.id: 1, beverage.id: 2}
+
+    # Act: Confirm the order
+    order_crud.update_order_status(order, OrderStatus.PREPARING, db)
+
+    # Assert: The stock stays taken without holds, the sweeper leaves the order alone
+    assert get_holds(order.id, db) == {}
+    assert order_crud.get_order_by_id(order.id, db).reserved_until is None
+    assert order.id not in stock_reservation_crud.release_expired_holds(db)
+    db.commit()
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 4
+    assert beverage_crud.get_beverage_by_id(beverage.id, db).stock == 3
+
+    # Act: Delete the confirmed order
+    user_id = order.user_id
+    stock_reservation_crud.release_stock_of_order(order.id, db)
+    order_crud.delete_order_by_id(order.id, db)
+
+    # Assert: The stock of all items is given back
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 5
+    assert beverage_crud.get_beverage_by_id(beverage.id, db).stock == 5
+
+    user_crud.delete_user_by_id(user_id, db)
+    pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
+    beverage_crud.delete_beverage_by_id(beverage.id, db)
+
+
+def test_expired_holds_are_released(db):
+    # Arrange
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_expired_hold_dough', price=1.5, description='description', stock=2), db)
+    pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_expired_hold_pizza', price=4.5, description='description',
+                              dough_id=dough.id), db)
+    order = create_order('TestExpiredHold', db)
+    stock_reservation_crud.hold_stock_of_pizza(order.id, pizza_type, db)
+    order_crud.add_pizza_to_order(order, pizza_type, db)
+
+    # Act: Sweep before and after the holds expired
+    assert order.id not in stock_reservation_crud.release_expired_holds(db)
+    db.commit()
+    expire_holds(order.id, db)
+    assert order.id in stock_reservation_crud.release_expired_holds(db)
+    db.commit()
+
+    # Assert: The stock is available again
+    assert get_holds(order.id, db) == {}
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 2
+
+    # Act: Add another pizza to the expired order
+    stock_reservation_crud.hold_stock_of_pizza(order.id, pizza_type, db)
+    order_crud.add_pizza_to_order(order, pizza_type, db)
+
+    # Assert: The stock of the first pizza is taken again together with the new one
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 0
+    assert get_holds(order.id, db) == {dough.id: 2}
+
+    # Act: Let the holds expire again and sell the dough to somebody else
+    expire_holds(order.id, db)
+    assert order.id in stock_reservation_crud.release_expired_holds(db)
+    deltas = new_stock_deltas()
+    deltas[Dough][dough.id] -= 1
+    apply_stock_deltas(deltas, db)
+    db.commit()
+
+    # Act + Assert: A pizza can not be added, the stock of the pizzas already in the order is gone. Nothing is taken.
+    with pytest.raises(ReservationExpiredError):
+        stock_reservation_crud.hold_stock_of_pizza(order.id, pizza_type, db)
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 1
+    assert get_holds(order.id, db) == {}
+
+    # Act + Assert: The order can not be confirmed without its stock
+    with pytest.raises(ReservationExpiredError):
+        order_crud.update_order_status(order, OrderStatus.PREPARING, db)
+    order = order_crud.get_order_by_id(order.id, db)
+    assert order.order_status == OrderStatus.TRANSMITTED
+    assert order.reserved_until is not None
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 1
+
+    # Act: Delete the expired order
+    user_id = order.user_id
+    stock_reservation_crud.release_stock_of_order(order.id, db)
+    order_crud.delete_order_by_id(order.id, db)
+
+    # Assert: Nothing is given back twice
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 1
+
+    user_crud.delete_user_by_id(user_id, db)
+    pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
+
+
+def get_stripes(dough_id, db):
+    return db.scalars(select(StockStripe.stock)
+                      .where(StockStripe.ingredient_id == dough_id)
+                      .order_by(StockStripe.stripe)).all()
+
+
+def take_dough(dough_id, amount, db):
+    deltas = new_stock_deltas()
+    deltas[Dough][dough_id] -= amount
+    apply_stock_deltas(deltas, db)
+    db.commit()
+
+
+def test_striped_stock(db, monkeypatch):
+    # Arrange: Turn striping on and split the stock of a dough into 4 stripes
+    monkeypatch.setattr(stock_stripes, 'STOCK_STRIPES', 4)
+    map_striped_stock()
+    dough = dough_crud.create_dough(
+        DoughCreateSchema(name='test_striped_dough', price=1.5, description='description', stock=10), db)
+    pizza_type = pizza_type_crud.create_pizza_type(
+        PizzaTypeCreateSchema(name='test_striped_pizza', price=4.5, description='description', dough_id=dough.id),
+        db)
+    stock_stripes.stripe_stock(Dough, dough.id, 4, db)
+    assert stock_stripes.rebalance_stripes(Dough, dough.id, db)
+    db.commit()
+
+    # Assert: The stock moved into the stripes, reads still see all of it
+    assert get_stripes(dough.id, db) == [3, 3, 2, 2]
+    assert db.scalar(select(Dough.stock).where(Dough.id == dough.id)) == 0
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 10
+    assert stock_ingredients_crud.get_producible_counts_of_pizza_types(db)[pizza_type.id] == 10
+
+    # Act: Take stock that fits into one stripe, then more than any stripe holds
+    take_dough(dough.id, 2, db)
+    stripes = get_stripes(dough.id, db)
+    assert [before - after for before, after in zip([3, 3, 2, 2], stripes) if before != after] == [2]
+    take_dough(dough.id, 7, db)
+
+    # Assert: The row was left alone, the stripes together gave the stock
+    assert sum(get_stripes(dough.id, db)) == 1
+    assert db.scalar(select(Dough.stock).where(Dough.id == dough.id)) == 0
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 1
+
+    # Act + Assert: Nothing is taken if all stripes together have too little
+    with pytest.raises(OutOfStockError):
+        take_dough(dough.id, 2, db)
+    db.rollback()
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 1
+
+    # Act: Give stock back and rebalance
+    take_dough(dough.id, -7, db)
+    assert stock_stripes.rebalance_stripes(Dough, dough.id, db)
+    db.commit()
+    assert get_stripes(dough.id, db) == [2, 2, 2, 2]
+
+    # Act: Write the stock through the ORM
+    dough_crud.update_dough(dough_crud.get_dough_by_id(dough.id, db),
+                            DoughCreateSchema(name='test_striped_dough', price=1.5, description='description',
+                                              stock=5), db)
+
+    # Assert: The written stock replaces the stripes
+    assert get_stripes(dough.id, db) == []
+    assert dough_crud.get_dough_by_id(dough.id, db).stock == 5
+
+    # Act: Stripe again and turn striping off
+    stock_stripes.stripe_stock(Dough, dough.id, 2, db)
+    stock_stripes.rebalance_stripes(Dough, dough.id, db)
+    stock_stripes.unstripe_stock(Dough, dough.id, db)
+    db.commit()
+
+    # Assert: The row holds all of the stock again
+    assert get_stripes(dough.id, db) == []
+    assert db.scalar(select(Dough.stock).where(Dough.id == dough.id)) == 5
+
+    pizza_type_crud.delete_pizza_type_by_id(pizza_type.id, db)
+    dough_crud.delete_dough_by_id(dough.id, db)
@@ -0,0 +1,51 @@
+import pytest
+
+from app.api.v1.catalog_etag import get_catalog_etag
+from app.api.v1.endpoints.order.stock_logic.stock_engine import apply_stock_deltas, new_stock_deltas
+from app.database.connection import SessionLocal
+from app.database.models import Beverage, Dough
+from app.database.table_version import get_table_versions
+
+import app.api.v1.endpoints.beverage.crud as beverage_crud
+from app.api.v1.endpoints.beverage.schemas import BeverageCreateSchema
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def test_table_versions(db):
+    # Arrange
+    beverage_schema = BeverageCreateSchema(
+        name='test_table_version_beverage', price=2.0, description='description', stock=5)
+    beverage = beverage_crud.create_beverage(beverage_schema, db)
+    versions = get_table_versions((Beverage, Dough), db)
+    etag = get_catalog_etag(Beverage, db)
+
+    # Act: Stock changes of orders are not shown by the catalog
+    deltas = new_stock_deltas()
+    deltas[Beverage][beverage.id] -= 1
+    apply_stock_deltas(deltas, db)
+    db.commit()
+
+    # Assert
+    assert get_table_versions((Beverage, Dough), db) == versions
+    with SessionLocal() as other_db:
+        assert get_catalog_etag(Beverage, other_db) == etag
+
+    # Act: Change the price
+    beverage_crud.update_beverage(beverage, beverage_schema.copy(update={'price': 2.5}), db)
+
+    # Assert: Only the version of the beverage table was bumped, every session sees the new ETag
+    new_versions = get_table_versions((Beverage, Dough), db)
+    assert new_versions[0] > versions[0]
+    assert new_versions[1] == versions[1]
+    with SessionLocal() as other_db:
+        assert get_catalog_etag(Beverage, other_db) != etag
+
+    beverage_crud.delete_beverage_by_id(beverage.id, db)
@@ -1,7 +1,7 @@
 import pytest
 
 import app.api.v1.endpoints.topping.crud as topping_crud
-from app.api.v1.endpoints.topping.schemas import ToppingCreateSchema
+from app.api.v1.endpoints.topping.schemas import ToppingCreateSchema, ToppingListItemSchema
 from app.database.connection import SessionLocal
 
 
@@ -46,3 +46,44 @@ def test_topping_create_read_delete(db):
     # Assert: Correct topping was deleted from database
     deleted_topping = topping_crud.get_topping_by_id(created_topping_id, db)
     assert deleted_topping is None
+
+
+def test_topping_upsert(db):
+    # Arrange
+    existing_topping = topping_crud.create_topping(
+        ToppingCreateSchema(name='test_upsert_topping_0', price=1.0, description='description', stock=5), db)
+    toppings = [ToppingCreateSchema(name='test_upsert_topping_{}'.format(index), price=2.0,
+                                    description='upserted', stock=10) for index in range(3)]
+
+    # Act
+    created, updated = topping_crud.upsert_toppings(toppings, db)
+
+    # Assert: The existing topping was updated in place, the others were created
+    assert (created, updated) == (2, 1)
+    db.refresh(existing_topping)
+    assert existing_topping.price == 2
+    assert existing_topping.stock == 10
+    assert topping_crud.get_topping_by_name('test_upsert_topping_2', db).description == 'upserted'
+
+    for index in range(3):
+        topping_crud.delete_topping_by_id(topping_crud.get_topping_by_name(
+            'test_upsert_topping_{}'.format(index), db).id, db)
+
+
+def test_topping_list_is_not_tracked(db):
+    # Arrange
+    topping = topping_crud.create_topping(
+        ToppingCreateSchema(name='test_list_topping', price=1.0, description='description', stock=5), db)
+
+    # Act
+    with SessionLocal() as list_db:
+        rows = topping_crud.get_all_toppings(list_db)
+        tracked = len(list_db.identity_map)
+
+    # Assert: Plain rows, which the response model reads like entities
+    assert tracked == 0
+    row = next(row for row in rows if row.id == topping.id)
+    assert ToppingListItemSchema.from_orm(row).dict() == {
+        'id': topping.id, 'name': 'test_list_topping', 'price': 1.0, 'description': 'description'}
+
+    topping_crud.delete_topping_by_id(topping.id, db)
@@ -1,5 +1,6 @@
 import uuid
 import enum
+from decimal import Decimal
 
 from datetime import datetime
 
@@ -8,7 +9,7 @@ from app.api.v1.endpoints.order.schemas import OrderSchema, OrderBaseSchema, Ord
     OrderUpdateOrderStatusSchema
 from app.api.v1.endpoints.order.schemas import PizzaBaseSchema, PizzaCreateSchema,\
     PizzaSchema, PizzaWithoutPizzaTypeSchema, JoinedPizzaPizzaTypeSchema,\
-    OrderBeverageQuantityBaseSchema, OrderBeverageQuantityCreateSchema
+    OrderBeverageQuantityBaseSchema, OrderBeverageQuantityCreateSchema, OrderPriceSchema, OrderPriceListItemSchema
 
 
 # Enum for OrderStatus
@@ -134,3 +135,11 @@ def test_order_beverage_quantity_create_schema(order_beverage_quantity_dict):
     schema = OrderBeverageQuantityCreateSchema(**order_beverage_quantity_dict)
     assert schema.quantity == order_beverage_quantity_dict['quantity']
     assert schema.beverage_id == order_beverage_quantity_dict['beverage_id']
+
+
+def test_order_price_schema():
+    order_id = uuid.uuid4()
+    schema = OrderPriceListItemSchema(order_id=order_id, price=Decimal('10.10'))
+    assert schema.order_id == order_id
+    assert schema.price == Decimal('10.10')
+    assert isinstance(OrderPriceSchema(price=Decimal('0.30')).price, Decimal)
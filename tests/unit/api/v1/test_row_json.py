@@ -0,0 +1,18 @@
+import decimal
+import json
+import uuid
+from collections import namedtuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.v1.endpoints.sauce.schemas import SauceListItemSchema, SauceSpiciness
+from app.api.v1.row_json import encode_rows
+
+SauceRow = namedtuple('SauceRow', ['id', 'name', 'description', 'price', 'spiciness'])
+
+
+def test_encode_rows():
+    rows = [SauceRow(uuid.uuid4(), 'Tomato', 'Italian quality', decimal.Decimal('1.50'), SauceSpiciness.LEVEL2)]
+
+    # Same JSON as the response model would return
+    assert json.loads(encode_rows(rows)) == jsonable_encoder([SauceListItemSchema.from_orm(row) for row in rows])